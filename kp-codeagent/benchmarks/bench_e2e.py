@@ -0,0 +1,255 @@
+"""Benchmark: end-to-end agent latency against the bundled mock LLM server.
+
+Drives ``CodeAgent.run`` and ``modify_file_interactive`` on a synthetic
+project, with the model replaced by ``kp_codeagent.mock_server`` (scripted
+answers, fixed time to first token and token rate), so the figures measure
+the agent itself: startup, context building, time to first token on top of
+the server's, stream throughput and applying the changes. Each figure is
+checked against a regression threshold; the exit status is 1 if one fails.
+
+    python benchmarks/bench_e2e.py [--files 300] [--ttft 0.2] [--tps 200]
+        [--backend ollama|groq|all] [--threshold context=2.0] [--no-check]
+"""
+
+import argparse
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from rich.console import Console
+from rich.prompt import Confirm
+
+from kp_codeagent import file_handler
+from kp_codeagent.mock_server import MockLLMServer
+
+# Seconds unless noted; "overhead" figures exclude the mock server's own delay
+THRESHOLDS = {
+    "import": 0.5,
+    "agent_init": 0.5,
+    "context": 2.0,
+    "ttft_overhead": 0.15,
+    "throughput_ratio": 0.8,  # minimum share of the server's tokens/s
+    "apply": 0.25,
+    "modify_overhead": 0.5,
+}
+# Figures that must stay above their threshold rather than below
+MINIMUMS = {"throughput_ratio"}
+
+TASK = "add a greet function with input validation to the greeting module"
+
+
+def make_project(root: Path, count: int):
+    """A tree of small Python modules, a few levels deep."""
+    rng = random.Random(7)
+    words = ["user", "order", "invoice", "report", "cache", "config", "parser", "greeting"]
+    for i in range(count):
+        package = root / f"pkg_{i % 8}" / f"sub_{i % 3}"
+        package.mkdir(parents=True, exist_ok=True)
+        name = f"{rng.choice(words)}_{i}"
+        body = "".join(
+            f"def {name}_{j}(value):\n"
+            f"    \"\"\"Handle {rng.choice(words)} values.\"\"\"\n"
+            f"    return value * {j}\n\n"
+            for j in range(10)
+        )
+        (package / f"{name}.py").write_text(body, encoding="utf-8")
+    (root / "main.py").write_text("from pkg_0.sub_0 import *\n", encoding="utf-8")
+
+
+def import_time() -> float:
+    """Wall time of a fresh interpreter importing the CLI."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import kp_codeagent.cli"], check=True)
+    return time.perf_counter() - start
+
+
+class Probe:
+    """Wraps an agent's client and steps to time them."""
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.streams = []
+        self.steps = {}
+        generate = agent.client.generate
+
+        def timed_generate(*args, **kwargs):
+            start = time.perf_counter()
+            stream = generate(*args, **kwargs)
+
+            def wrapped():
+                first = None
+                chunks = 0
+                for chunk in stream:
+                    if first is None:
+                        first = time.perf_counter()
+                    chunks += 1
+                    yield chunk
+                end = time.perf_counter()
+                self.streams.append({
+                    "ttft": (first or end) - start,
+                    "chunks": chunks,
+                    "stream_seconds": end - (first or end),
+                })
+            return wrapped()
+
+        agent.client.generate = timed_generate
+        for step in ("analyze_context", "_process_implementation"):
+            self._time_step(step)
+
+    def _time_step(self, name):
+        method = getattr(self.agent, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.steps[name] = time.perf_counter() - start
+
+        setattr(self.agent, name, timed)
+
+
+def bench_backend(backend: str, server: MockLLMServer, args) -> dict:
+    from kp_codeagent.agent import CodeAgent
+
+    model = "codellama:7b" if backend == "ollama" else "llama-3.3-70b-versatile"
+    output = Console(file=io.StringIO())
+
+    start = time.perf_counter()
+    agent = CodeAgent(backend=backend, model=model, use_cache=False, output=output)
+    agent_init = time.perf_counter() - start
+
+    probe = Probe(agent)
+    start = time.perf_counter()
+    if not agent.run(TASK):
+        raise RuntimeError(f"{backend}: agent run failed:\n{output.file.getvalue()[-2000:]}")
+    run_seconds = time.perf_counter() - start
+
+    streamed = [s for s in probe.streams if s["chunks"] > 1]
+    ttft = sum(s["ttft"] for s in probe.streams) / len(probe.streams)
+    chunks = sum(s["chunks"] - 1 for s in streamed)
+    stream_seconds = sum(s["stream_seconds"] for s in streamed)
+    throughput = chunks / stream_seconds if stream_seconds else float("inf")
+
+    modify_start = time.perf_counter()
+    agent.modify_file_interactive(Path("greeting.py"), "add a punctuation parameter")
+    modify_seconds = time.perf_counter() - modify_start
+    modify_stream = server_stream_seconds(server, probe.streams[-1]["chunks"])
+
+    return {
+        "agent_init": agent_init,
+        "context": probe.steps["analyze_context"],
+        "ttft": ttft,
+        "ttft_overhead": ttft - args.ttft,
+        "throughput": throughput,
+        "throughput_ratio": throughput / args.tps if args.tps else 1.0,
+        "apply": probe.steps["_process_implementation"],
+        "run": run_seconds,
+        "modify": modify_seconds,
+        "modify_overhead": modify_seconds - modify_stream,
+    }
+
+
+def server_stream_seconds(server: MockLLMServer, chunks: int) -> float:
+    """Seconds the mock server itself takes to stream ``chunks`` tokens."""
+    interval = 1.0 / server.tokens_per_second if server.tokens_per_second else 0.0
+    return server.ttft + max(0, chunks - 1) * interval
+
+
+def check(results: dict, thresholds: dict) -> list:
+    failures = []
+    for name, limit in thresholds.items():
+        value = results.get(name)
+        if value is None:
+            continue
+        failed = value < limit if name in MINIMUMS else value > limit
+        if failed:
+            failures.append(name)
+    return failures
+
+
+def print_report(backend: str, results: dict, thresholds: dict, failures: list):
+    print(f"\n{backend}")
+    for name, value in results.items():
+        unit = " tokens/s" if name == "throughput" else ("" if name.endswith("ratio") else "s")
+        limit = thresholds.get(name)
+        if limit is None:
+            verdict = ""
+        else:
+            bound = ">=" if name in MINIMUMS else "<="
+            verdict = f"  ({bound} {limit:g}) " + ("FAIL" if name in failures else "ok")
+        print(f"  {name:<18} {value:>10.3f}{unit}{verdict}")
+
+
+def parse_thresholds(values) -> dict:
+    thresholds = dict(THRESHOLDS)
+    for value in values or []:
+        name, _, limit = value.partition("=")
+        thresholds[name] = float(limit)
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=300,
+                        help="Python files in the synthetic project")
+    parser.add_argument("--ttft", type=float, default=0.2,
+                        help="Mock server time to first token (s)")
+    parser.add_argument("--tps", type=float, default=200, help="Mock server tokens per second")
+    parser.add_argument("--backend", choices=["ollama", "groq", "all"], default="all")
+    parser.add_argument("--threshold", action="append", help="Override a threshold, e.g. context=3")
+    parser.add_argument("--no-check", action="store_true", help="Report only, never fail")
+    args = parser.parse_args()
+    thresholds = parse_thresholds(args.threshold)
+
+    backends = ["ollama", "groq"] if args.backend == "all" else [args.backend]
+    if "groq" in backends:
+        try:
+            import groq  # noqa: F401
+        except ImportError:
+            print("groq is not installed; skipping the OpenAI-compatible protocol")
+            backends.remove("groq")
+
+    # Non-interactive: every proposed file change is accepted, quietly
+    Confirm.ask = classmethod(lambda cls, *args, **kwargs: True)
+    file_handler.console = Console(file=io.StringIO())
+
+    startup = {"import": import_time()}
+    failures = check(startup, thresholds)
+    print_report("startup", startup, thresholds, failures)
+
+    with MockLLMServer(ttft=args.ttft, tokens_per_second=args.tps) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        make_project(Path(tmp), args.files)
+        os.environ.update({
+            "OLLAMA_URL": server.url,
+            "GROQ_BASE_URL": server.url,
+            "KP_RATE_LIMIT": "0",
+            "KP_FAILOVER": "0",
+        })
+
+        for backend in backends:
+            # CodeAgent hands any API key in the environment to the backend
+            for name in ("GROQ_API_KEY", "OPENAI_API_KEY"):
+                os.environ.pop(name, None)
+            if backend == "groq":
+                os.environ["GROQ_API_KEY"] = "gsk_mock"
+
+            results = bench_backend(backend, server, args)
+            backend_failures = check(results, thresholds)
+            print_report(backend, results, thresholds, backend_failures)
+            failures += [f"{backend}.{name}" for name in backend_failures]
+
+    if failures and not args.no_check:
+        print(f"\nRegressions: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
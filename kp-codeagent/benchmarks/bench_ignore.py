@@ -0,0 +1,75 @@
+"""Microbenchmark: per-path cost of ignore matching as the rule count grows.
+
+Compares the compiled matcher in ``kp_codeagent.ignore`` with the original
+substring loop that ``should_ignore_file`` used before it.
+
+    python benchmarks/bench_ignore.py
+"""
+
+import random
+import time
+
+from kp_codeagent.ignore import DEFAULT_IGNORES, IgnoreRuleSet
+
+PATH_COUNT = 20000
+RULE_COUNTS = [10, 100, 1000, 5000]
+
+
+def legacy_should_ignore(file_str, patterns):
+    """The pre-compiled-matcher implementation, kept here for comparison."""
+    for pattern in DEFAULT_IGNORES + patterns:
+        if pattern in file_str or file_str.endswith(pattern.replace('*', '')):
+            return True
+    return False
+
+
+def make_patterns(count, rng):
+    """A realistic mix of names, extensions, anchored paths and globs."""
+    patterns = []
+    for i in range(count):
+        kind = i % 10
+        if kind < 4:
+            patterns.append(f"generated_{i}")
+        elif kind < 7:
+            patterns.append(f"*.ext{i}")
+        elif kind < 9:
+            patterns.append(f"/build/out_{i}/")
+        else:
+            patterns.append(f"logs/**/trace_{i}_*.txt")
+    rng.shuffle(patterns)
+    return patterns
+
+
+def make_paths(count, rng):
+    dirs = ["src", "src/app", "src/app/models", "tests", "docs", "lib/vendor"]
+    names = ["main.py", "models.py", "rebuild.py", "index.js", "README.md", "data.json"]
+    return [f"{rng.choice(dirs)}/{i}_{rng.choice(names)}" for i in range(count)]
+
+
+def time_per_path(func, paths):
+    start = time.perf_counter()
+    for path in paths:
+        func(path)
+    return (time.perf_counter() - start) / len(paths) * 1e9
+
+
+def main():
+    rng = random.Random(42)
+    paths = make_paths(PATH_COUNT, rng)
+
+    print(f"{'rules':>7} {'compiled ns/path':>18} {'substring ns/path':>19}")
+    for count in RULE_COUNTS:
+        patterns = make_patterns(count, rng)
+        rules = IgnoreRuleSet(DEFAULT_IGNORES + patterns)
+
+        compiled = time_per_path(
+            lambda p, rules=rules: rules.match(p, p.rsplit('/', 1)[-1], False), paths
+        )
+        legacy = time_per_path(
+            lambda p, patterns=patterns: legacy_should_ignore(p, patterns), paths[:2000]
+        )
+        print(f"{count:>7} {compiled:>18.0f} {legacy:>19.0f}")
+
+
+if __name__ == "__main__":
+    main()
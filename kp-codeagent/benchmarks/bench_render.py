@@ -0,0 +1,87 @@
+"""Benchmark: rendering throughput for a fast token stream.
+
+Feeds a synthetic model response through the original per-token
+``console.print(chunk, end="")`` loop and through StreamRenderer, on a
+terminal console and on a plain (piped) one, and reports tokens/s.
+Output goes to an in-memory buffer, so only rendering cost is measured.
+
+The stream first arrives all at once (the best case for batching), then
+paced like a fast cloud backend, where CPU time per token is what matters.
+
+    python benchmarks/bench_render.py [token_count]
+"""
+
+import io
+import random
+import sys
+import time
+
+from rich.console import Console
+
+from kp_codeagent.render import StreamRenderer
+
+WORDS = [
+    "def", "return", "self", "value", "if", "else", "for", "in", "range", "(", ")", ":",
+    "\n", "    ", "result", "=", "[", "]", "items", ".", "append", "#", "parse", "config",
+]
+
+
+def make_stream(count: int):
+    rng = random.Random(3)
+    return [rng.choice(WORDS) + ("" if rng.random() < 0.3 else " ") for _ in range(count)]
+
+
+def legacy(console: Console, tokens):
+    text = ""
+    for chunk in tokens:
+        console.print(chunk, end="")
+        text += chunk
+    return text
+
+
+def buffered(console: Console, tokens):
+    return StreamRenderer(console).stream(tokens)
+
+
+def paced(tokens, rate: int):
+    """Yield tokens at roughly ``rate`` tokens per second."""
+    start = time.perf_counter()
+    for i, token in enumerate(tokens):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        yield token
+
+
+def run_paced(label: str, func, tokens, rate: int):
+    console = Console(file=io.StringIO(), force_terminal=True, width=100)
+    start = time.process_time()
+    func(console, paced(tokens, rate))
+    cpu = time.process_time() - start
+    print(f"{label:<32} {cpu / len(tokens) * 1e6:>8.1f} µs CPU/token at {rate} tokens/s")
+
+
+def run(label: str, func, terminal: bool, tokens):
+    console = Console(file=io.StringIO(), force_terminal=terminal, width=100)
+    start = time.perf_counter()
+    func(console, tokens)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {len(tokens) / elapsed:>12,.0f} tokens/s  ({elapsed:.3f}s)")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    tokens = make_stream(count)
+
+    run("per-token print, terminal", legacy, True, tokens)
+    run("StreamRenderer, terminal", buffered, True, tokens)
+    run("per-token print, no tty", legacy, False, tokens)
+    run("StreamRenderer, no tty", buffered, False, tokens)
+
+    sample = tokens[:2000]
+    run_paced("per-token print, paced", legacy, sample, 1000)
+    run_paced("StreamRenderer, paced", buffered, sample, 1000)
+
+
+if __name__ == "__main__":
+    main()
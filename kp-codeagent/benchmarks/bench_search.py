@@ -0,0 +1,88 @@
+"""Benchmark: BM25 query latency over a synthetic repository.
+
+Builds a temporary tree of small source files, indexes it once and then
+times ranking queries, which only read postings and never file contents.
+
+    python benchmarks/bench_search.py [file_count]
+"""
+
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from kp_codeagent.search_index import SearchIndex
+
+COMMON = [
+    "user", "session", "token", "parse", "config", "invoice", "order", "cart",
+    "payment", "render", "template", "cache", "query", "model", "view", "route",
+    "handler", "client", "server", "socket", "stream", "buffer", "retry", "timeout",
+]
+
+QUERIES = [
+    "add retry with timeout to the payment client",
+    "parse_config should cache the loaded template",
+    "agrega validación de sesión al usuario",
+    "UserService render invoice",
+]
+
+
+def make_vocabulary(rng: random.Random, size: int = 5000):
+    """Common domain words plus a long tail of project-specific names."""
+    syllables = ["ka", "lo", "mi", "ren", "tor", "vex", "qui", "zan", "pol", "der", "ish", "un"]
+    tail = {"".join(rng.choices(syllables, k=3)) for _ in range(size * 2)}
+    return COMMON + sorted(tail)[:size - len(COMMON)]
+
+
+def make_tree(root: Path, count: int, rng: random.Random):
+    vocabulary = make_vocabulary(rng)
+    # Zipf-like weights: a few words are everywhere, most are rare
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    files = []
+
+    for i in range(count):
+        directory = root / f"pkg{i % 200}" / f"mod{i % 7}"
+        directory.mkdir(parents=True, exist_ok=True)
+        words = rng.choices(vocabulary, weights=weights, k=12)
+        path = directory / f"{words[0]}_{words[1]}_{i}.py"
+        body = "\n".join(
+            f"    def {a}_{b}(self, {c}):\n        return {c}.{d}()"
+            for a, b, c, d in zip(words[0::4], words[1::4], words[2::4], words[3::4])
+        )
+        path.write_text(f"class {words[0].title()}{words[1].title()}{i}:\n{body}\n")
+        files.append(path)
+    return files
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    rng = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        start = time.perf_counter()
+        files = make_tree(root, count, rng)
+        print(f"created {count} files in {time.perf_counter() - start:.1f}s")
+
+        index = SearchIndex(root)
+        start = time.perf_counter()
+        index.update(files)
+        print(f"initial index build: {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        stats = index.update(files)
+        print(f"no-op update ({stats['indexed']} re-read): {time.perf_counter() - start:.2f}s")
+
+        for query in QUERIES:
+            start = time.perf_counter()
+            for _ in range(10):
+                results = index.search(query, limit=10)
+            elapsed = (time.perf_counter() - start) / 10 * 1000
+            print(f"{elapsed:7.1f} ms  {query!r} -> {results[0][0].name if results else '-'}")
+
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Benchmark: one scandir pass vs the original two-walk context scan.
+
+Builds a synthetic tree (100k files by default) and compares the tree and
+candidate-file scan that ContextBuilder used to do (a Path.iterdir() walk
+for the tree plus an os.walk() for relevance, stat'ing every entry several
+times) with the scandir walker, both cold and with a saved file index.
+
+File-system calls are counted by wrapping the os functions Python uses
+(DirEntry.stat() included), so the counts are exact for this process.
+
+    python benchmarks/bench_walk.py [file_count]
+"""
+
+import builtins
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from kp_codeagent.file_index import FileIndex
+from kp_codeagent.utils import is_binary_file, should_ignore_file
+
+EXTENSIONS = ['.py', '.js', '.ts', '.json', '.md']
+
+
+class CountingEntry:
+    """DirEntry proxy that counts stat() calls."""
+
+    def __init__(self, entry, calls: Counter):
+        self._entry = entry
+        self._calls = calls
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, *, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, *, follow_symlinks=True):
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self._entry.is_symlink()
+
+    def stat(self, *, follow_symlinks=True):
+        self._calls["stat"] += 1
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+
+class CountingScandir:
+    def __init__(self, it, calls: Counter):
+        self._it = it
+        self._calls = calls
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._it.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return CountingEntry(next(self._it), self._calls)
+
+    def close(self):
+        self._it.close()
+
+
+@contextmanager
+def count_calls():
+    """Count stat, directory listing and open calls made inside the block."""
+    calls = Counter()
+    originals = {
+        "stat": os.stat, "lstat": os.lstat, "listdir": os.listdir,
+        "scandir": os.scandir, "open": builtins.open,
+    }
+
+    def counted(kind, func):
+        def wrapper(*args, **kwargs):
+            calls[kind] += 1
+            return func(*args, **kwargs)
+        return wrapper
+
+    os.stat = counted("stat", originals["stat"])
+    os.lstat = counted("stat", originals["lstat"])
+    os.listdir = counted("list", originals["listdir"])
+    os.scandir = lambda path=".": CountingScandir(
+        counted("list", originals["scandir"])(path), calls
+    )
+    builtins.open = counted("open", originals["open"])
+    try:
+        yield calls
+    finally:
+        os.stat = originals["stat"]
+        os.lstat = originals["lstat"]
+        os.listdir = originals["listdir"]
+        os.scandir = originals["scandir"]
+        builtins.open = originals["open"]
+
+
+def make_tree(root: Path, count: int):
+    """20 packages x 10 modules x 10 submodules, files spread evenly."""
+    leaves = [
+        root / f"pkg{a}" / f"mod{b}" / f"sub{c}"
+        for a in range(20) for b in range(10) for c in range(10)
+    ]
+    for leaf in leaves:
+        leaf.mkdir(parents=True)
+    for i in range(count):
+        name = f"file_{i}{EXTENSIONS[i % len(EXTENSIONS)]}"
+        (leaves[i % len(leaves)] / name).write_text("x = 1\n")
+
+
+def legacy_scan(root: Path, max_depth: int = 3):
+    """The original build_file_tree + find_relevant_files traversal."""
+    tree_lines = [f"Project Root: {root.name}/"]
+
+    def add_tree_lines(directory: Path, prefix: str = "", depth: int = 0):
+        if depth >= max_depth:
+            return
+        items = sorted(directory.iterdir(), key=lambda x: (not x.is_dir(), x.name))
+        for i, item in enumerate(items):
+            if should_ignore_file(item, []):
+                continue
+            is_last = i == len(items) - 1
+            current_prefix = "└── " if is_last else "├── "
+            next_prefix = "    " if is_last else "│   "
+            if item.is_dir():
+                tree_lines.append(f"{prefix}{current_prefix}{item.name}/")
+                add_tree_lines(item, prefix + next_prefix, depth + 1)
+            else:
+                tree_lines.append(f"{prefix}{current_prefix}{item.name}")
+
+    add_tree_lines(root)
+
+    candidates = []
+    for dirpath, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if not should_ignore_file(Path(dirpath) / d, [])]
+        for name in files:
+            file_path = Path(dirpath) / name
+            if should_ignore_file(file_path, []) or is_binary_file(file_path):
+                continue
+            if any(name.endswith(ext) for ext in EXTENSIONS):
+                candidates.append(file_path)
+
+    return "\n".join(tree_lines), candidates
+
+
+def walker_scan(root: Path, persisted: bool):
+    index = FileIndex(root)
+    if persisted:
+        index.load()
+    index.refresh()
+    scan = index.walk()
+    candidates = [
+        path for path, _ in scan.files if any(path.name.endswith(ext) for ext in EXTENSIONS)
+    ]
+    return scan.tree, candidates
+
+
+def run(label: str, func, *args):
+    with count_calls() as calls:
+        start = time.perf_counter()
+        tree, candidates = func(*args)
+        elapsed = time.perf_counter() - start
+    total = sum(calls.values())
+    print(
+        f"{label:<22} {elapsed:7.2f}s  {total:>8} calls  "
+        f"(stat {calls['stat']}, list {calls['list']}, open {calls['open']})  "
+        f"{len(candidates)} files"
+    )
+    return tree, candidates
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        start = time.perf_counter()
+        make_tree(root, count)
+        print(f"created {count} files in {time.perf_counter() - start:.1f}s")
+
+        _, legacy_files = run("two walks (original)", legacy_scan, root)
+        _, walker_files = run("scandir walker, cold", walker_scan, root, False)
+
+        FileIndex(root).update()
+        run("scandir walker, index", walker_scan, root, True)
+
+        assert sorted(legacy_files) == sorted(walker_files)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,11 @@
 """Core agent orchestration logic for KP Code Agent."""
 
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any, List, Tuple
 from rich.console import Console
 from rich.panel import Panel
-from rich.markdown import Markdown
 
-from .ollama_client import OllamaClient
+from .errors import LLMError
 from .llm_client import UnifiedLLMClient
 from .context_builder import ContextBuilder
 from .file_handler import FileHandler
@@ -14,9 +13,14 @@ from .prompts import (
     get_system_prompt,
     TASK_PROMPT_TEMPLATE,
     PLAN_PROMPT_TEMPLATE,
+    IMPLEMENTATION_FOLLOWUP_TEMPLATE,
     FILE_MODIFICATION_TEMPLATE
 )
 from .i18n import get_i18n
+from .metrics import RunMetrics
+from .render import StreamRenderer
+from .response_cache import ResponseCache
+from .tokenizer import RESPONSE_TOKENS
 import os
 
 console = Console()
@@ -32,30 +36,71 @@ class CodeAgent:
         temperature: float = 0.7,
         verbose: bool = False,
         lang: str = None,
-        api_key: str = None
+        api_key: str = None,
+        use_cache: bool = True,
+        output: Console = None,
+        context_builder: ContextBuilder = None,
+        client: UnifiedLLMClient = None,
+        confirm: Callable[[str, bool], bool] = None
     ):
         # Determinar backend a usar
         backend = backend or os.getenv("KP_BACKEND", "auto")
 
-        # Usar cliente unificado que soporta múltiples backends
-        self.client = UnifiedLLMClient(
+        # Usar cliente unificado que soporta múltiples backends; the daemon
+        # passes in one it keeps between tasks
+        self.client = client or UnifiedLLMClient(
             backend=backend,
             model=model,
-            api_key=api_key or os.getenv("GROQ_API_KEY") or os.getenv("OPENAI_API_KEY")
+            api_key=api_key or os.getenv("GROQ_API_KEY") or os.getenv("OPENAI_API_KEY"),
+            cache=ResponseCache() if use_cache else None
         )
 
-        self.context_builder = ContextBuilder()
-        self.file_handler = FileHandler()
+        # Output goes to the terminal unless the caller captures it (batch mode)
+        self.console = output or console
+
+        self.tokenizer = self.client.tokenizer
+        if context_builder is not None:
+            # Reuse another builder's project scan, with this model's tokenizer
+            self.context_builder = context_builder.fork(self.tokenizer)
+        else:
+            self.context_builder = ContextBuilder(tokenizer=self.tokenizer)
+        self.file_handler = FileHandler(output=self.console, confirm=confirm)
         self.temperature = temperature
         self.verbose = verbose
         self.i18n = get_i18n(lang)
         self.lang = self.i18n.lang
         self.system_prompt = get_system_prompt(self.lang)
 
+        # Ollama context of the plan call, continued by the implementation
+        self._plan_context: Optional[List[int]] = None
+        # Prompt evaluation counts and timings reported by the backend
+        self.prefill_stats: List[Dict[str, Any]] = []
+        # Phase timings and per-request figures (--metrics-out)
+        self.metrics = RunMetrics()
+        self.metrics.info.update(backend=self.client.backend.name, model=self.client.backend.model)
+
+    def prompt_budget(self, template: str, **fields: str) -> int:
+        """
+        Tokens left for project context in a prompt: the model's window minus
+        the answer, the system prompt and the template filled with ``fields``.
+        Capped by KP_MAX_CONTEXT_TOKENS when set.
+        """
+        fixed = (
+            self.tokenizer.count(self.system_prompt)
+            + self.tokenizer.count(template.format(**fields))
+        )
+        budget = self.client.context_window - RESPONSE_TOKENS - fixed
+
+        max_context = os.getenv("KP_MAX_CONTEXT_TOKENS")
+        if max_context and max_context.isdigit():
+            budget = min(budget, int(max_context))
+
+        return max(0, budget)
+
     def receive_task(self, task: str) -> Dict[str, Any]:
         """Parse and validate the user's coding task."""
         task_label = self.i18n.t('agent.task_label')
-        console.print(Panel(
+        self.console.print(Panel(
             f"[bold cyan]{task_label}[/bold cyan] {task}",
             title="KP Code Agent",
             border_style="cyan"
@@ -66,15 +111,27 @@ class CodeAgent:
             "status": "received"
         }
 
-    def analyze_context(self) -> Dict[str, str]:
+    def analyze_context(self, task: str = "") -> Dict[str, str]:
         """Scan current directory for relevant files and context."""
-        with console.status("[bold yellow]Analyzing project context...[/bold yellow]"):
-            file_tree, code_snippets = self.context_builder.build_context("")
+        # The plan and implementation prompts share the same context, which
+        # must fit in both
+        self.context_builder.max_tokens = min(
+            self.prompt_budget(template, user_task=task, file_tree="", code_snippets="")
+            for template in (TASK_PROMPT_TEMPLATE, PLAN_PROMPT_TEMPLATE)
+        )
+
+        with self.metrics.phase("analyze_context"), \
+                self.console.status("[bold yellow]Analyzing project context...[/bold yellow]"):
+            file_tree, code_snippets = self.context_builder.build_context(task)
+        self.metrics.context = {
+            step: round(value, 4) if isinstance(value, float) else value
+            for step, value in self.context_builder.timings.items()
+        }
 
         if self.verbose:
-            console.print("\n[dim]Project Structure:[/dim]")
-            console.print(file_tree[:500])
-            console.print("\n[dim]Found relevant code files[/dim]")
+            self.console.print("\n[dim]Project Structure:[/dim]")
+            self.console.print(file_tree[:500])
+            self.console.print("\n[dim]Found relevant code files[/dim]")
 
         return {
             "file_tree": file_tree,
@@ -83,31 +140,103 @@ class CodeAgent:
 
     def plan_solution(self, task: str, context: Dict[str, str]) -> str:
         """Ask CodeLlama to create a step-by-step plan."""
-        console.print("\n[bold yellow]📋 Creando plan de implementación...[/bold yellow]")
-        console.print("[dim]⏳ Esperando respuesta del modelo IA (esto puede tardar 10-30 segundos)...[/dim]\n")
+        self.console.print("\n[bold yellow]📋 Creando plan de implementación...[/bold yellow]")
+        self.console.print(
+            "[dim]⏳ Esperando respuesta del modelo IA "
+            "(esto puede tardar 10-30 segundos)...[/dim]\n"
+        )
+
+        # Same context as the implementation prompt, so both share a prefix;
+        # analyze_context already sized it, this only guards other callers
+        budget = self.prompt_budget(
+            PLAN_PROMPT_TEMPLATE, user_task=task, file_tree="", code_snippets=""
+        )
+        file_tree = self.tokenizer.truncate(context['file_tree'], budget)
+        code_snippets = self.tokenizer.truncate(
+            context['code_snippets'], budget - self.tokenizer.count(file_tree)
+        )
 
         plan_prompt = PLAN_PROMPT_TEMPLATE.format(
             user_task=task,
-            context=f"{context['file_tree']}\n\n{context['code_snippets'][:1000]}"
+            file_tree=file_tree,
+            code_snippets=code_snippets
         )
 
-        plan = ""
-        for chunk in self.client.generate(
-            prompt=plan_prompt,
-            system=self.system_prompt,
-            temperature=self.temperature,
-            timeout=90
-        ):
-            console.print(chunk, end="")
-            plan += chunk
-
-        console.print("\n")
+        with self.metrics.phase("plan"):
+            plan = self._generate(
+                "plan",
+                prompt=plan_prompt,
+                system=self.system_prompt,
+                temperature=self.temperature,
+                timeout=90
+            )
+
+        self._plan_context = self.client.last_context
+        self._record_prefill("plan")
+
+        self.console.print("\n")
         return plan
 
+    def _generate(self, call: str, prompt: str, system: Optional[str], **kwargs: Any) -> str:
+        """Stream a model answer to the console, recording the request in the run metrics."""
+        stream = self.metrics.track_stream(
+            call,
+            self.client.generate(prompt=prompt, system=system, **kwargs),
+            prompt_tokens=self.tokenizer.count(system or "") + self.tokenizer.count(prompt),
+            last_response=lambda: self.client.last_response,
+            tokenizer=self.tokenizer
+        )
+        return StreamRenderer(self.console).stream(stream)
+
+    def _followup_prompt(self) -> Optional[str]:
+        """
+        Implementation prompt that continues the plan's Ollama context, so
+        only the new tokens are evaluated. None when there is no context to
+        continue or the continuation would not fit in the window.
+        """
+        if not self._plan_context:
+            return None
+
+        prompt = IMPLEMENTATION_FOLLOWUP_TEMPLATE
+        used = len(self._plan_context) + self.tokenizer.count(prompt) + RESPONSE_TOKENS
+        return prompt if used <= self.client.context_window else None
+
+    def _record_prefill(self, call: str, **extra: Any):
+        """Keep the prompt processing figures the backend reported for a call."""
+        response = self.client.last_response
+        if not response:
+            return
+
+        if "prompt_eval_duration" in response:
+            # Ollama: tokens actually evaluated, and how long it took
+            stats = {
+                "tokens": response.get("prompt_eval_count", 0),
+                "seconds": response["prompt_eval_duration"] / 1e9,
+            }
+        elif "prompt_tokens" in response:
+            # OpenAI-style usage: prompt tokens, of which cached
+            stats = {
+                "tokens": response["prompt_tokens"],
+                "cached": response.get("cached_tokens", 0),
+            }
+        else:
+            return
+
+        self.prefill_stats.append({"call": call, **stats, **extra})
+
     def execute_plan(self, task: str, context: Dict[str, str], plan: str) -> bool:
         """Implement the plan by generating code."""
-        console.print("\n[bold green]⚙️  Implementando solución...[/bold green]")
-        console.print("[dim]⏳ Generando código (esto puede tardar 15-45 segundos)...[/dim]\n")
+        implementation = self.generate_implementation(task, context, plan)
+
+        # Try to extract file operations from the response
+        # This is a simple implementation - could be enhanced with better parsing
+        with self.metrics.phase("apply"):
+            return self._process_implementation(implementation)
+
+    def generate_implementation(self, task: str, context: Dict[str, str], plan: str) -> str:
+        """Ask the model to implement the plan; returns its full response."""
+        self.console.print("\n[bold green]⚙️  Implementando solución...[/bold green]")
+        self.console.print("[dim]⏳ Generando código (esto puede tardar 15-45 segundos)...[/dim]\n")
 
         # Generate the full task prompt
         task_prompt = TASK_PROMPT_TEMPLATE.format(
@@ -116,67 +245,92 @@ class CodeAgent:
             code_snippets=context['code_snippets']
         )
 
+        # Continue the plan's conversation when the backend kept it
+        followup = self._followup_prompt()
+        if followup is not None:
+            prompt, system, reused = followup, None, self._plan_context
+        else:
+            prompt, system, reused = task_prompt, self.system_prompt, None
+
         # Get the implementation
-        implementation = ""
-        for chunk in self.client.generate(
-            prompt=task_prompt,
-            system=self.system_prompt,
-            temperature=self.temperature,
-            timeout=120
-        ):
-            console.print(chunk, end="")
-            implementation += chunk
-
-        console.print("\n")
+        with self.metrics.phase("implementation"):
+            implementation = self._generate(
+                "implementation",
+                prompt=prompt,
+                system=system,
+                temperature=self.temperature,
+                timeout=120,
+                context=reused
+            )
+
+        if reused:
+            self._record_prefill(
+                "implementation",
+                reused=len(reused),
+                full_tokens=(
+                    self.tokenizer.count(self.system_prompt) + self.tokenizer.count(task_prompt)
+                )
+            )
+        else:
+            self._record_prefill("implementation")
 
-        # Try to extract file operations from the response
-        # This is a simple implementation - could be enhanced with better parsing
-        return self._process_implementation(implementation)
+        self.console.print("\n")
+        return implementation
 
-    def _process_implementation(self, implementation: str) -> bool:
-        """Process the AI's implementation and apply file changes."""
+    @staticmethod
+    def extract_file_changes(implementation: str) -> List[Tuple[Path, str]]:
+        """(path, new content) for each code block in a response that names a file."""
         # Look for code blocks in the response
         import re
 
         # Pattern to find code blocks with file names
         # Example: ```python:filename.py or ```python\n# File: filename.py
         pattern = r'```(?:\w+)?(?::|\n#\s*File:\s*)([\w\./]+)\n(.*?)```'
-        matches = re.findall(pattern, implementation, re.DOTALL)
+        return [
+            (Path(file_path), content.strip())
+            for file_path, content in re.findall(pattern, implementation, re.DOTALL)
+        ]
+
+    def _process_implementation(self, implementation: str) -> bool:
+        """Process the AI's implementation and apply file changes."""
+        matches = self.extract_file_changes(implementation)
 
         if not matches:
-            console.print("[yellow]No file operations detected in response.[/yellow]")
-            console.print("[dim]You may need to manually create or modify files based on the suggestions above.[/dim]")
+            self.console.print("[yellow]No file operations detected in response.[/yellow]")
+            self.console.print(
+                "[dim]You may need to manually create or modify files "
+                "based on the suggestions above.[/dim]"
+            )
             return True
 
         success = True
         for file_path, content in matches:
-            file_path = Path(file_path)
-
             if file_path.exists():
                 # Modify existing file
-                if not self.file_handler.modify_file(file_path, content.strip()):
+                if not self.file_handler.modify_file(file_path, content):
                     success = False
             else:
                 # Create new file
-                if not self.file_handler.create_file(file_path, content.strip()):
+                if not self.file_handler.create_file(file_path, content):
                     success = False
 
         return success
 
     def verify_solution(self, task: str) -> bool:
         """Run basic checks on the solution."""
-        console.print("\n[bold blue]🔍 Verifying solution...[/bold blue]")
+        with self.metrics.phase("verify"):
+            self.console.print("\n[bold blue]🔍 Verifying solution...[/bold blue]")
 
-        # Basic verification - could be enhanced with actual testing
-        # For now, just check if files were created/modified successfully
-        console.print("[green]✓ Basic verification complete[/green]")
+            # Basic verification - could be enhanced with actual testing
+            # For now, just check if files were created/modified successfully
+            self.console.print("[green]✓ Basic verification complete[/green]")
 
         return True
 
     def present_results(self, success: bool):
         """Show results to the user."""
         if success:
-            console.print(Panel(
+            self.console.print(Panel(
                 "[bold green]✓ Task completed successfully![/bold green]\n\n"
                 "Files have been created/modified as shown above.\n"
                 "Review the changes and test your code.",
@@ -184,27 +338,117 @@ class CodeAgent:
                 border_style="green"
             ))
         else:
-            console.print(Panel(
+            self.console.print(Panel(
                 "[bold red]✗ Task completed with errors[/bold red]\n\n"
                 "Some file operations failed. Check the messages above.",
                 title="Completed with Errors",
                 border_style="red"
             ))
 
+    def prefill_saved(self) -> Optional[float]:
+        """
+        Estimated prompt evaluation seconds saved by continuing the plan's
+        context: tokens the full implementation prompt would have had to
+        evaluate, at the rate measured on the plan call.
+        """
+        calls = {stats['call']: stats for stats in self.prefill_stats}
+        plan, implementation = calls.get("plan"), calls.get("implementation")
+        if not plan or not implementation or "reused" not in implementation:
+            return None
+        if "seconds" not in plan or not plan['tokens']:
+            return None
+
+        rate = plan['seconds'] / plan['tokens']
+        skipped = max(0, implementation['full_tokens'] - implementation['tokens'])
+        return skipped * rate
+
+    def print_stats(self):
+        """
+        Show cache, prompt evaluation, retry, rate limit, connection and
+        timing figures (verbose mode).
+        """
+        cache = self.client.cache
+        if cache is not None:
+            self.console.print(
+                f"[dim]Response cache: {cache.hits} hits, {cache.misses} misses[/dim]"
+            )
+
+        for stats in self.prefill_stats:
+            line = f"Prompt eval ({stats['call']}): {stats['tokens']} tokens"
+            if "seconds" in stats:
+                line += f" in {stats['seconds']:.1f}s"
+            if "cached" in stats:
+                line += f", {stats['cached']} cached"
+            self.console.print(f"[dim]{line}[/dim]")
+
+        cached = [stats for stats in self.prefill_stats if "cached" in stats]
+        prompt_tokens = sum(stats['tokens'] for stats in cached)
+        if prompt_tokens:
+            hit_rate = sum(stats['cached'] for stats in cached) / prompt_tokens
+            self.console.print(f"[dim]Prompt cache hit rate: {hit_rate:.0%}[/dim]")
+
+        saved = self.prefill_saved()
+        if saved is not None:
+            self.console.print(
+                f"[dim]Reusing the plan's context saved ~{saved:.1f}s of prompt evaluation[/dim]"
+            )
+
+        router = self.client.backend
+        if any(router.stats.values()):
+            self.console.print(
+                f"[dim]Requests: {router.stats['retries']} retries, "
+                f"{router.stats['failovers']} failovers, {router.stats['hedges']} hedged "
+                f"({router.stats['hedge_wins']} won by the hedge)[/dim]"
+            )
+
+        for backend in router.backends:
+            limiter = getattr(backend, "rate_limiter", None)
+            if limiter is not None and limiter.waited:
+                self.console.print(
+                    f"[dim]Rate limit ({backend.name}): "
+                    f"waited {limiter.waited:.1f}s for capacity[/dim]"
+                )
+
+        transport = getattr(router.primary, "transport", None)
+        if transport is not None:
+            stats = transport.stats()
+            self.console.print(
+                f"[dim]HTTP: {stats['requests']} requests over "
+                f"{stats['connections']} connections ({stats['reused']} reused)[/dim]"
+            )
+
+        if self.metrics.phases:
+            phases = ", ".join(
+                f"{name} {seconds:.2f}s" for name, seconds in self.metrics.phases.items()
+            )
+            self.console.print(f"[dim]Phases: {phases}[/dim]")
+        for call in self.metrics.llm_calls:
+            if call["ttft"] is not None:
+                rate = ""
+                if call["tokens_per_second"]:
+                    rate = f", {call['tokens_per_second']:.0f} tokens/s"
+                self.console.print(
+                    f"[dim]Model ({call['call']}): first token after {call['ttft']:.2f}s{rate}, "
+                    f"{call['duration']:.1f}s in total[/dim]"
+                )
+
     def run(self, task: str) -> bool:
         """Execute the complete agent workflow."""
+        self.metrics.command = "run"
+        status = "error"
         try:
             # Check Ollama setup
-            is_ready, message = self.client.check_setup()
+            with self.metrics.phase("setup_check"):
+                is_ready, message = self.client.check_setup()
             if not is_ready:
-                console.print(f"[red]✗ {message}[/red]")
+                self.console.print(f"[red]✗ {message}[/red]")
                 return False
 
             # 1. Receive task
             self.receive_task(task)
 
             # 2. Analyze context
-            context = self.analyze_context()
+            context = self.analyze_context(task)
 
             # 3. Plan solution
             plan = self.plan_solution(task, context)
@@ -219,46 +463,93 @@ class CodeAgent:
             # 6. Present results
             self.present_results(success)
 
+            status = "success" if success else "failure"
+            if self.verbose:
+                self.print_stats()
+
             return success
 
         except KeyboardInterrupt:
-            console.print("\n[yellow]Task cancelled by user[/yellow]")
+            status = "cancelled"
+            self.console.print("\n[yellow]Task cancelled by user[/yellow]")
             return False
         except Exception as e:
-            console.print(f"\n[red]✗ Error: {e}[/red]")
+            self.console.print(f"\n[red]✗ Error: {e}[/red]")
             if self.verbose:
                 import traceback
-                console.print(traceback.format_exc())
+                self.console.print(traceback.format_exc())
             return False
+        finally:
+            self.metrics.finish(status)
 
     def modify_file_interactive(self, file_path: Path, modification_task: str):
         """Interactively modify a specific file."""
+        self.metrics.command = "modify"
+        status = "error"
+        try:
+            with self.metrics.phase("setup_check"):
+                is_ready, message = self.client.check_setup()
+            if not is_ready:
+                self.console.print(f"[red]✗ {message}[/red]")
+                return False
+
+            success = self._modify_file(file_path, modification_task)
+            status = "success" if success else "failure"
+            return success
+
+        except KeyboardInterrupt:
+            status = "cancelled"
+            self.console.print("\n[yellow]Task cancelled by user[/yellow]")
+            return False
+        except LLMError as e:
+            self.console.print(f"\n[red]✗ Error: {e}[/red]")
+            if self.verbose:
+                import traceback
+                self.console.print(traceback.format_exc())
+            return False
+        finally:
+            self.metrics.finish(status)
+
+    def _modify_file(self, file_path: Path, modification_task: str) -> bool:
+        """Rewrite a file with the model's answer; False if it was left as it was."""
         if not file_path.exists():
-            console.print(f"[red]File {file_path} does not exist![/red]")
+            self.console.print(f"[red]File {file_path} does not exist![/red]")
             return False
 
         current_content = self.file_handler.read_file(file_path)
         if current_content is None:
             return False
 
-        console.print(f"\n[bold]Modifying {file_path}...[/bold]\n")
+        # The answer replaces the whole file, so the model must see all of it
+        budget = self.prompt_budget(
+            FILE_MODIFICATION_TEMPLATE,
+            file_path=file_path, current_content="", modification_task=modification_task
+        )
+        tokens = self.tokenizer.count(current_content)
+        if tokens > budget:
+            self.console.print(
+                f"[red]✗ File too large to edit: {file_path} "
+                f"({tokens} tokens, {budget} fit in the model's context)[/red]"
+            )
+            return False
+
+        self.console.print(f"\n[bold]Modifying {file_path}...[/bold]\n")
 
         prompt = FILE_MODIFICATION_TEMPLATE.format(
             file_path=file_path,
-            current_content=current_content[:2000],  # Limit context
+            current_content=current_content,
             modification_task=modification_task
         )
 
-        new_content = ""
-        for chunk in self.client.generate(
-            prompt=prompt,
-            system=self.system_prompt,
-            temperature=self.temperature
-        ):
-            console.print(chunk, end="")
-            new_content += chunk
+        with self.metrics.phase("implementation"):
+            new_content = self._generate(
+                "modify",
+                prompt=prompt,
+                system=self.system_prompt,
+                temperature=self.temperature
+            )
 
-        console.print("\n")
+        self.console.print("\n")
 
         # Extract code from response if wrapped in code blocks
         import re
@@ -266,4 +557,5 @@ class CodeAgent:
         if code_match:
             new_content = code_match.group(1)
 
-        return self.file_handler.modify_file(file_path, new_content.strip())
+        with self.metrics.phase("apply"):
+            return self.file_handler.modify_file(file_path, new_content.strip())
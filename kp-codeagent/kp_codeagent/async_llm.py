@@ -0,0 +1,317 @@
+"""Asyncio-native LLM backends, with a blocking adapter for synchronous callers."""
+
+import asyncio
+import json
+import queue
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from .errors import LLMError, classify_error
+from .llm_client import (
+    GroqBackend,
+    LLMBackend,
+    OllamaBackend,
+    OpenAIBackend,
+    chat_messages,
+    chunk_text,
+    chunk_usage,
+    ollama_http_error,
+    usage_stats,
+)
+from .tokenizer import Tokenizer
+
+# Async HTTP and SDK clients are optional, like the sync ones
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+try:
+    import openai
+    HAS_OPENAI = True
+except ImportError:
+    HAS_OPENAI = False
+
+try:
+    from groq import AsyncGroq
+    HAS_GROQ = True
+except ImportError:
+    HAS_GROQ = False
+
+
+class AsyncLLMBackend(ABC):
+    """
+    Abstract base class for async LLM backends.
+
+    Each one wraps the synchronous backend that holds its configuration
+    (model, URL, API key, context window). ``generate`` is an async
+    generator: cancelling the task that iterates it, or closing it, stops
+    the request and releases its connection.
+    """
+
+    def __init__(self, backend: LLMBackend):
+        self.backend = backend
+        self.last_response: Optional[Dict[str, Any]] = None
+
+    @property
+    def name(self) -> str:
+        return self.backend.name
+
+    @property
+    def model(self) -> str:
+        return self.backend.model
+
+    @property
+    def supports_context(self) -> bool:
+        return self.backend.supports_context
+
+    @property
+    def context_window(self) -> int:
+        return self.backend.context_window
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        return self.backend.tokenizer
+
+    async def is_available(self) -> bool:
+        """Check if this backend is available (memoized like the sync check)."""
+        return await asyncio.to_thread(self.backend.is_available)
+
+    @abstractmethod
+    def generate(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+        timeout: int = 120,
+        context: Optional[List[int]] = None
+    ) -> AsyncIterator[str]:
+        """Generate text with streaming."""
+
+    async def aclose(self):
+        """Close the connections held by the backend."""
+
+
+class AsyncOllamaBackend(AsyncLLMBackend):
+    """Ollama over an ``httpx.AsyncClient`` keep-alive pool."""
+
+    def __init__(self, backend: OllamaBackend):
+        super().__init__(backend)
+        self._client = None
+
+    def _http(self) -> "httpx.AsyncClient":
+        # Bound to the running event loop, so created on first use
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.backend.base_url)
+        return self._client
+
+    async def generate(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+        timeout: int = 120,
+        context: Optional[List[int]] = None
+    ) -> AsyncIterator[str]:
+        """Generate using Ollama API."""
+        payload = self.backend.build_payload(prompt, system, temperature, context)
+
+        self.last_response = None
+        try:
+            async with self._http().stream(
+                "POST", "/api/generate", json=payload, timeout=timeout
+            ) as response:
+                if response.status_code >= 400:
+                    body = (await response.aread()).decode("utf-8", "replace")
+                    raise ollama_http_error(response.status_code, body, response.headers)
+
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if 'error' in data:
+                        raise LLMError(data['error'], self.name, kind="server")
+                    if 'response' in data:
+                        yield data['response']
+                    if data.get('done', False):
+                        self.last_response = data
+                        break
+        except Exception as e:
+            raise classify_error(e, self.name) from e
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class AsyncChatBackend(AsyncLLMBackend):
+    """OpenAI-compatible chat completions through an SDK's async client."""
+
+    def __init__(self, backend: LLMBackend, client: Any, request_options: Dict[str, Any] = None):
+        super().__init__(backend)
+        self.client = client
+        self.request_options = request_options or {}
+
+    async def generate(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+        timeout: int = 120,
+        context: Optional[List[int]] = None
+    ) -> AsyncIterator[str]:
+        """Generate using the chat completions API, within the key's rate limits."""
+        self.last_response = None
+        # The limiter may sleep and takes a file lock: keep it off the loop
+        estimate = await asyncio.to_thread(self.backend.throttle, prompt, system)
+        usage = None
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=chat_messages(prompt, system),
+                temperature=temperature,
+                stream=True,
+                timeout=timeout,
+                **self.request_options
+            )
+            self.backend.track_rate_limits(stream)
+            try:
+                async for chunk in stream:
+                    if chunk_usage(chunk):
+                        usage = self.last_response = usage_stats(chunk_usage(chunk))
+                    text = chunk_text(chunk)
+                    if text:
+                        yield text
+            finally:
+                await stream.close()
+        except Exception as e:
+            error = classify_error(e, self.name)
+            self.backend.track_rate_limits(e, error=error)
+            raise error from e
+
+        self.backend.track_rate_limits(None, estimate, usage)
+
+    async def aclose(self):
+        await self.client.close()
+
+
+def async_backend(backend: LLMBackend) -> AsyncLLMBackend:
+    """Async counterpart of a configured synchronous backend."""
+    if isinstance(backend, OllamaBackend) and HAS_HTTPX:
+        return AsyncOllamaBackend(backend)
+    if isinstance(backend, OpenAIBackend) and HAS_OPENAI:
+        client = openai.AsyncOpenAI(api_key=backend.api_key)
+        return AsyncChatBackend(backend, client, {"stream_options": {"include_usage": True}})
+    if isinstance(backend, GroqBackend) and HAS_GROQ:
+        return AsyncChatBackend(backend, AsyncGroq(api_key=backend.api_key))
+    raise ValueError(f"No async implementation available for the {backend.name} backend")
+
+
+class EventLoopThread:
+    """An event loop running in a daemon thread, for use from sync code."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="kp-async-llm", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, coro) -> "asyncio.Future":
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+_LOOP: Optional[EventLoopThread] = None
+_LOOP_LOCK = threading.Lock()
+
+
+def background_loop() -> EventLoopThread:
+    """Event loop shared by every sync adapter in the process."""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = EventLoopThread()
+        return _LOOP
+
+
+_DONE = object()
+
+
+class SyncBackend(LLMBackend):
+    """
+    Blocking ``LLMBackend`` view of an async backend, so ``CodeAgent`` and
+    ``UnifiedLLMClient`` work unchanged on top of it.
+
+    Streams run on a shared background event loop; closing the returned
+    iterator (or interrupting its consumer) cancels the request there.
+    """
+
+    def __init__(self, backend: AsyncLLMBackend, loop: EventLoopThread = None):
+        self.async_backend = backend
+        self._loop = loop or background_loop()
+
+    @property
+    def name(self) -> str:
+        return self.async_backend.name
+
+    @property
+    def model(self) -> str:
+        return self.async_backend.model
+
+    @property
+    def supports_context(self) -> bool:
+        return self.async_backend.supports_context
+
+    @property
+    def context_window(self) -> int:
+        return self.async_backend.context_window
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        return self.async_backend.tokenizer
+
+    @property
+    def last_response(self) -> Optional[Dict[str, Any]]:
+        return self.async_backend.last_response
+
+    @last_response.setter
+    def last_response(self, value: Optional[Dict[str, Any]]):
+        self.async_backend.last_response = value
+
+    def is_available(self) -> bool:
+        return self._loop.submit(self.async_backend.is_available()).result()
+
+    def generate(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+        timeout: int = 120,
+        context: Optional[List[int]] = None
+    ) -> Iterator[str]:
+        """Generate text with streaming, blocking between chunks."""
+        chunks: "queue.Queue" = queue.Queue()
+
+        async def pump():
+            try:
+                async for chunk in self.async_backend.generate(
+                    prompt, system, temperature, timeout, context=context
+                ):
+                    chunks.put(chunk)
+            finally:
+                chunks.put(_DONE)
+
+        future = self._loop.submit(pump())
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is _DONE:
+                    break
+                yield chunk
+            future.result()
+        finally:
+            if not future.done():
+                future.cancel()
@@ -0,0 +1,282 @@
+"""Run many tasks against one project scan, several at a time."""
+
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional
+
+from rich.console import Console
+
+if TYPE_CHECKING:
+    from .file_handler import FileHandler
+
+# The agent, context builder and backends are imported when a runner is
+# created: the CLI imports this module for its option defaults
+
+DEFAULT_JOBS = 4
+# A local Ollama server answers one request at a time anyway
+DEFAULT_BACKEND_CONCURRENCY = {"ollama": 1}
+
+# What to do with the files a task's response contains:
+#   none - only report them; new - create new files; all - create and modify
+APPLY_POLICIES = ("none", "new", "all")
+
+
+def load_tasks(path: Path) -> List[Dict[str, Any]]:
+    """
+    Read a JSONL task file. Each line is a task string or an object with a
+    "task" and optional "id", "backend" and "model"; blank lines and lines
+    starting with "#" are skipped.
+    """
+    tasks: List[Dict[str, Any]] = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON ({e})") from e
+
+            if isinstance(entry, str):
+                entry = {"task": entry}
+            if not isinstance(entry, dict) or not str(entry.get("task", "")).strip():
+                raise ValueError(
+                    f"{path}:{line_number}: expected a task string or an object with \"task\""
+                )
+
+            entry.setdefault("id", str(len(tasks) + 1))
+            tasks.append(entry)
+    return tasks
+
+
+def parse_concurrency(values: Iterable[str]) -> Dict[str, int]:
+    """Per-backend limits from "backend=N" strings, over the defaults."""
+    limits = dict(DEFAULT_BACKEND_CONCURRENCY)
+    for value in values:
+        name, sep, count = value.partition("=")
+        if not sep or not count.isdigit() or int(count) < 1:
+            raise ValueError(f"Invalid concurrency limit {value!r}, expected backend=N")
+        limits[name.strip()] = int(count)
+    return limits
+
+
+class BatchRunner:
+    """
+    Run a list of tasks through CodeAgent without prompting.
+
+    The project is scanned and indexed once; every task's agent forks that
+    ContextBuilder. Tasks run on ``jobs`` threads, with at most
+    ``concurrency[backend]`` model requests in flight per backend. Context
+    building takes turns on the shared indexes, file changes are applied one
+    task at a time under ``apply``, and a file changed by one task is not
+    overwritten by a later one (reported as a conflict).
+    """
+
+    def __init__(
+        self,
+        backend: str = "auto",
+        model: Optional[str] = None,
+        api_key: Optional[str] = None,
+        temperature: float = 0.7,
+        jobs: int = DEFAULT_JOBS,
+        concurrency: Optional[Dict[str, int]] = None,
+        apply: str = "none",
+        use_cache: bool = True,
+        root_dir: Optional[Path] = None
+    ):
+        if apply not in APPLY_POLICIES:
+            raise ValueError(f"Unknown apply policy: {apply}")
+
+        self.backend = backend
+        self.model = model
+        self.api_key = api_key
+        self.temperature = temperature
+        self.jobs = max(1, jobs)
+        if concurrency is None:
+            concurrency = dict(DEFAULT_BACKEND_CONCURRENCY)
+        self.concurrency = concurrency
+        self.apply = apply
+        self.use_cache = use_cache
+        self.root_dir = Path(root_dir or Path.cwd()).resolve()
+
+        from .context_builder import ContextBuilder
+
+        self.context_builder = ContextBuilder()
+        # Set by prepare() unless the policy writes nothing
+        self.file_handler: Optional["FileHandler"] = None
+        self._context_lock = threading.Lock()
+        self._apply_lock = threading.Lock()
+        self._semaphores: Dict[str, threading.Semaphore] = {}
+        self._semaphores_guard = threading.Lock()
+        self._written: Dict[Path, str] = {}
+
+    def prepare(self) -> Dict[str, float]:
+        """Scan the project and resolve "auto" once, before any task runs."""
+        timings = {}
+
+        start = time.perf_counter()
+        self.context_builder.scan_project()
+        timings["scan"] = time.perf_counter() - start
+
+        if self.backend == "auto":
+            from .llm_client import UnifiedLLMClient
+
+            start = time.perf_counter()
+            client = UnifiedLLMClient(
+                backend="auto", model=self.model, api_key=self.api_key, failover=False
+            )
+            self.backend = client.backend.name
+            timings["probe"] = time.perf_counter() - start
+
+        if self.apply != "none":
+            from .file_handler import FileHandler
+
+            self.file_handler = FileHandler()
+
+        return timings
+
+    def _semaphore(self, backend: str) -> threading.Semaphore:
+        with self._semaphores_guard:
+            semaphore = self._semaphores.get(backend)
+            if semaphore is None:
+                semaphore = threading.Semaphore(self.concurrency.get(backend, self.jobs))
+                self._semaphores[backend] = semaphore
+            return semaphore
+
+    def _apply_change(self, task_id: str, file_path: Path, content: str) -> Dict[str, Any]:
+        """Apply one file from a response under the policy; returns its report."""
+        report = {"path": str(file_path), "bytes": len(content.encode("utf-8"))}
+        target = (self.root_dir / file_path).resolve()
+
+        if target != self.root_dir and self.root_dir not in target.parents:
+            report["action"] = "rejected"
+            return report
+
+        exists = target.exists()
+        if self.file_handler is None or (exists and self.apply == "new"):
+            report["action"] = "proposed"
+            return report
+
+        with self._apply_lock:
+            if target in self._written:
+                report["action"] = "conflict"
+                report["changed_by"] = self._written[target]
+                return report
+
+            write = self.file_handler.modify_file if exists else self.file_handler.create_file
+            applied = write(target, content, force=True, show_preview=False)
+
+            if applied:
+                self._written[target] = task_id
+            report["action"] = ("modified" if exists else "created") if applied else "failed"
+        return report
+
+    def run_task(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one task to completion; never raises."""
+        task = str(entry["task"]).strip()
+        backend = entry.get("backend") or self.backend
+        result: Dict[str, Any] = {"id": str(entry["id"]), "task": task, "backend": backend}
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+
+        def timed(name: str, step: Callable[[], Any]) -> Any:
+            step_start = time.perf_counter()
+            try:
+                return step()
+            finally:
+                timings[name] = round(time.perf_counter() - step_start, 3)
+
+        from .agent import CodeAgent
+
+        try:
+            agent = CodeAgent(
+                backend=backend,
+                model=entry.get("model") or self.model,
+                api_key=self.api_key,
+                temperature=self.temperature,
+                use_cache=self.use_cache,
+                output=Console(file=io.StringIO()),
+                context_builder=self.context_builder
+            )
+            result["model"] = agent.client.backend.model
+
+            with self._context_lock:
+                context = timed("context", lambda: agent.analyze_context(task))
+
+            semaphore = self._semaphore(agent.client.backend.name)
+            timed("queued", semaphore.acquire)
+            try:
+                plan = timed("plan", lambda: agent.plan_solution(task, context))
+                implementation = timed(
+                    "implementation", lambda: agent.generate_implementation(task, context, plan)
+                )
+            finally:
+                semaphore.release()
+
+            changes = agent.extract_file_changes(implementation)
+            result["files"] = timed("apply", lambda: [
+                self._apply_change(result["id"], file_path, content)
+                for file_path, content in changes
+            ])
+            result["status"] = "ok" if changes else "no_changes"
+            if any(f["action"] in ("failed", "conflict", "rejected") for f in result["files"]):
+                result["status"] = "partial"
+            result["plan"] = plan
+            result["response"] = implementation
+        except Exception as e:
+            result["status"] = "error"
+            result["error"] = str(e)
+
+        timings["total"] = round(time.perf_counter() - start, 3)
+        result["timings"] = timings
+        return result
+
+    def run(
+        self,
+        tasks: List[Dict[str, Any]],
+        results_path: Path,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Run every task and append one JSON line per task to ``results_path``
+        as soon as it finishes, so an interrupted batch keeps its results.
+        """
+        results_path = Path(results_path)
+        results_path.parent.mkdir(parents=True, exist_ok=True)
+        results = []
+
+        with open(results_path, 'w', encoding='utf-8') as out, \
+                ThreadPoolExecutor(max_workers=min(self.jobs, len(tasks) or 1)) as executor:
+            futures = [executor.submit(self.run_task, entry) for entry in tasks]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                if on_result is not None:
+                    on_result(result)
+
+        return results
+
+
+def default_results_path(tasks_path: Path) -> Path:
+    """``tasks.jsonl`` -> ``tasks.results.jsonl`` next to it."""
+    tasks_path = Path(tasks_path)
+    return tasks_path.with_name(tasks_path.stem + ".results" + (tasks_path.suffix or ".jsonl"))
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Counts per status and the total model time of a batch."""
+    statuses: Dict[str, int] = {}
+    for result in results:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    model_seconds = sum(
+        result["timings"].get("plan", 0) + result["timings"].get("implementation", 0)
+        for result in results
+    )
+    return {"tasks": len(results), "statuses": statuses, "model_seconds": model_seconds}
@@ -0,0 +1,202 @@
+"""Split files into semantic chunks and pack the best ones into a token budget."""
+
+import math
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from .search_index import tokenize
+from .symbol_index import MAX_PARSE_BYTES, Symbol, parse_symbols
+
+# Definitions longer than this are split into their members and blocks
+MAX_CHUNK_LINES = 60
+# Consecutive blank-line blocks are merged up to this size
+BLOCK_LINES = 20
+# Weight resolution of the knapsack table
+PACK_UNITS = 2000
+
+
+class Chunk(NamedTuple):
+    """A region of a file, with its 1-based, inclusive line span."""
+    start: int
+    end: int
+    kind: str
+    name: str
+
+
+def _blocks(lines: Sequence[str], start: int, end: int) -> List[Chunk]:
+    """Split lines start..end into paragraphs at blank lines, merging small ones."""
+    paragraphs: List[List[int]] = []
+    for number in range(start, end + 1):
+        if lines[number - 1].strip():
+            if paragraphs and paragraphs[-1][1] == number - 1:
+                paragraphs[-1][1] = number
+            else:
+                paragraphs.append([number, number])
+
+    chunks: List[Chunk] = []
+    for first, last in paragraphs:
+        # Paragraphs too long for one chunk are cut into windows
+        for window in range(first, last + 1, MAX_CHUNK_LINES):
+            window_end = min(window + MAX_CHUNK_LINES - 1, last)
+            if chunks and window_end - chunks[-1].start < BLOCK_LINES:
+                chunks[-1] = chunks[-1]._replace(end=window_end)
+            else:
+                chunks.append(Chunk(window, window_end, "block", ""))
+
+    return chunks
+
+
+def _segment(lines: Sequence[str], start: int, end: int, symbols: List[Symbol]) -> List[Chunk]:
+    """Chunks covering lines start..end, one per outermost definition."""
+    inside = [s for s in symbols if start <= s.start and s.end <= end]
+    outer = [
+        s for s in inside
+        if not any(o is not s and o.start <= s.start and s.end <= o.end for o in inside)
+    ]
+    outer.sort(key=lambda s: s.start)
+
+    chunks: List[Chunk] = []
+    cursor = start
+    for symbol in outer:
+        if symbol.start < cursor:
+            continue
+        chunks.extend(_blocks(lines, cursor, symbol.start - 1))
+
+        members = [
+            s for s in inside
+            if s is not symbol and symbol.start <= s.start and s.end <= symbol.end
+        ]
+        if symbol.end - symbol.start < MAX_CHUNK_LINES or not members:
+            chunks.append(Chunk(symbol.start, symbol.end, symbol.kind, symbol.qualname))
+        else:
+            # Large class: its header and each member become separate chunks
+            for chunk in _segment(lines, symbol.start, symbol.end, members):
+                if chunk.kind == "block":
+                    chunk = chunk._replace(name=symbol.qualname)
+                chunks.append(chunk)
+
+        cursor = symbol.end + 1
+
+    chunks.extend(_blocks(lines, cursor, end))
+    return chunks
+
+
+def split_chunks(source: str, suffix: str) -> List[Chunk]:
+    """
+    Split a file into chunks covering every line.
+
+    Definitions (functions, classes, methods) come from the symbol parsers
+    (ast for Python); the code between them, and files in other languages,
+    is split into blocks at blank lines.
+    """
+    lines = source.splitlines()
+    if not lines:
+        return []
+
+    symbols = parse_symbols(source, suffix) if len(source) <= MAX_PARSE_BYTES else []
+    return _segment(lines, 1, len(lines), symbols)
+
+
+def chunk_score(
+    text: str,
+    term_weights: Dict[str, float],
+    avg_length: float = 200.0,
+    k1: float = 1.2,
+    b: float = 0.75
+) -> float:
+    """BM25-style relevance of a chunk's text to weighted query terms."""
+    counts = Counter(tokenize(text))
+    length = sum(counts.values())
+    if not length:
+        return 0.0
+
+    norm = k1 * (1 - b + b * length / avg_length)
+    return sum(
+        weight * counts[term] * (k1 + 1) / (counts[term] + norm)
+        for term, weight in term_weights.items() if counts[term]
+    )
+
+
+def pack(values: Sequence[float], weights: Sequence[int], capacity: int) -> List[int]:
+    """
+    0/1 knapsack: indices of the items with the highest total value whose
+    weights fit in capacity.
+
+    Weights are rounded up to PACK_UNITS steps of the capacity, so the table
+    stays small for any budget and the chosen items never exceed it.
+    """
+    if capacity <= 0:
+        return []
+
+    units = min(capacity, PACK_UNITS)
+    scaled = [math.ceil(weight * units / capacity) for weight in weights]
+    useful = [index for index, value in enumerate(values) if value > 0]
+    if sum(scaled[index] for index in useful) <= units:
+        return useful
+
+    best = [0.0] * (units + 1)
+    keep = []
+    # Shared by the items that can never be taken
+    skipped = bytes(units + 1)
+    for value, weight in zip(values, scaled):
+        taken = skipped
+        if value > 0 and weight <= units:
+            taken = bytearray(units + 1)
+            for room in range(units, weight - 1, -1):
+                candidate = best[room - weight] + value
+                if candidate > best[room]:
+                    best[room] = candidate
+                    taken[room] = 1
+        keep.append(taken)
+
+    chosen = []
+    room = units
+    for index in range(len(scaled) - 1, -1, -1):
+        if keep[index][room]:
+            chosen.append(index)
+            room -= scaled[index]
+
+    return sorted(chosen)
+
+
+def render_chunks(
+    file_path: Path,
+    lines: Sequence[str],
+    chunks: List[Chunk],
+    total_size: Optional[int] = None
+) -> str:
+    """
+    Render the selected chunks of a file (lines with their line endings) in
+    line order, with an elision marker wherever code was left out.
+    ``total_size`` is given when ``lines`` is only the start of the file.
+    """
+    parts = []
+    elided = False
+    cursor = 1
+
+    for chunk in sorted(chunks, key=lambda chunk: chunk.start) + [Chunk(len(lines) + 1, 0, "", "")]:
+        gap = lines[cursor - 1:chunk.start - 1]
+        if any(line.strip() for line in gap):
+            parts.append(elision_marker(cursor, chunk.start - 1))
+            elided = True
+        else:
+            parts.extend(gap)
+
+        text = "".join(lines[chunk.start - 1:chunk.end])
+        if text and not text.endswith("\n"):
+            text += "\n"
+        parts.append(text)
+        cursor = max(cursor, chunk.end + 1)
+
+    if total_size is not None:
+        parts.append(f"... (file continues, {total_size} bytes in total)\n")
+        elided = True
+
+    header = f"# File: {file_path} (excerpts)\n" if elided else f"# File: {file_path}\n"
+    return header + "".join(parts)
+
+
+def elision_marker(start: int, end: int) -> str:
+    """Line left in place of code that did not fit."""
+    return f"... (lines {start}-{end} omitted)\n"
@@ -2,15 +2,27 @@
 
 import click
 import os
+import time
+from datetime import datetime
 from pathlib import Path
 from rich.console import Console
 
-from .agent import CodeAgent
-from .ollama_client import OllamaClient
+from . import daemon
+from .batch import (
+    APPLY_POLICIES, DEFAULT_JOBS, BatchRunner, default_results_path, load_tasks,
+    parse_concurrency, summarize
+)
+from .file_index import FileIndex
+from .profiling import Profiler
+from .response_cache import ResponseCache
 from .i18n import get_i18n
 
 console = Console()
 
+# The agent and the Ollama client (with the backends, HTTP stack and SDKs
+# behind them) are imported by the commands that use them, so --help and
+# the index and cache commands start quickly
+
 
 @click.group(invoke_without_command=True)
 @click.pass_context
@@ -21,7 +33,21 @@ console = Console()
 @click.option('--api-key', help='API key for cloud backends (Groq/OpenAI)')
 @click.option('--temperature', '-t', default=0.7, help='Temperature for generation (default: 0.7)')
 @click.option('--verbose', '-v', is_flag=True, help='Enable verbose output')
-def cli(ctx, lang, backend, model, api_key, temperature, verbose):
+@click.option('--no-cache', is_flag=True, help='Always query the model, ignoring cached responses')
+@click.option('--ollama-url', envvar='OLLAMA_URL', help='Ollama server URL (default: http://localhost:11434)')
+@click.option('--metrics-out', envvar='KP_METRICS_OUT', type=click.Path(dir_okay=False),
+              help='Write phase timings and per-request figures of the run to this JSON file')
+@click.option('--prometheus-out', envvar='KP_PROMETHEUS_OUT', type=click.Path(dir_okay=False),
+              help='Write the same figures as a Prometheus textfile '
+                   '(node_exporter textfile collector)')
+@click.option('--profile', 'profile_path', type=click.Path(dir_okay=False),
+              help='Write a trace of the command (Chrome trace JSON, opens in Perfetto)')
+@click.option('--profile-cpu', type=click.Path(dir_okay=False),
+              help='Write a cProfile dump of the command (python -m pstats FILE)')
+@click.option('--no-daemon', is_flag=True,
+              help='Run in this process even if a daemon serves the project')
+def cli(ctx, lang, backend, model, api_key, temperature, verbose, no_cache, ollama_url,
+        metrics_out, prometheus_out, profile_path, profile_cpu, no_daemon):
     """KP Code Agent - Your local AI coding assistant for learning.
 
     KP Code Agent - Tu asistente de código local con IA para aprender.
@@ -37,6 +63,10 @@ def cli(ctx, lang, backend, model, api_key, temperature, verbose):
     if lang:
         os.environ['KP_LANG'] = lang
 
+    # Every Ollama client in the process reads the server URL from here
+    if ollama_url:
+        os.environ['OLLAMA_URL'] = ollama_url
+
     # Store options in context for subcommands
     ctx.ensure_object(dict)
     ctx.obj['lang'] = lang
@@ -45,6 +75,22 @@ def cli(ctx, lang, backend, model, api_key, temperature, verbose):
     ctx.obj['api_key'] = api_key
     ctx.obj['temperature'] = temperature
     ctx.obj['verbose'] = verbose
+    ctx.obj['no_cache'] = no_cache
+    ctx.obj['metrics_out'] = metrics_out
+    ctx.obj['prometheus_out'] = prometheus_out
+    # A profile must cover this process, so profiled commands never delegate
+    ctx.obj['daemon'] = not (no_daemon or profile_path or profile_cpu) and daemon.daemon_enabled()
+
+    if profile_path or profile_cpu:
+        profiler = Profiler(profile_path, profile_cpu).start()
+
+        def write_profile():
+            profiler.stop()
+            for path in (profile_path, profile_cpu):
+                if path:
+                    console.print(f"[dim]Profile written to {path}[/dim]")
+
+        ctx.call_on_close(write_profile)
 
     if ctx.invoked_subcommand is None:
         i18n = get_i18n(lang)
@@ -77,28 +123,193 @@ def run(ctx, task):
     api_key = ctx.obj.get('api_key')
     temperature = ctx.obj.get('temperature', 0.7)
     verbose = ctx.obj.get('verbose', False)
+    no_cache = ctx.obj.get('no_cache', False)
 
     if lang:
         os.environ['KP_LANG'] = lang
 
+    code = delegate(ctx, 'run', task_str, backend=backend, model=model, api_key=api_key,
+                    temperature=temperature, verbose=verbose)
+    if code is not None:
+        ctx.exit(code)
+
+    from .agent import CodeAgent
+
     agent = CodeAgent(
         backend=backend,
         model=model,
         api_key=api_key,
         temperature=temperature,
         verbose=verbose,
-        lang=lang
+        lang=lang,
+        use_cache=not no_cache
     )
     success = agent.run(task_str)
+    write_metrics(ctx, agent)
     ctx.exit(0 if success else 1)
 
 
+def delegate(ctx, command, task, file_path=None, **options):
+    """
+    Hand the task to the daemon serving this project, if one is running.
+    Returns the exit code, or None to run the task in this process.
+    """
+    if not ctx.obj.get('daemon'):
+        return None
+
+    for key in ('metrics_out', 'prometheus_out'):
+        # The daemon resolves paths against its own directory
+        if ctx.obj.get(key):
+            options[key] = str(Path(ctx.obj[key]).resolve())
+    options['lang'] = get_i18n(ctx.obj.get('lang')).lang
+    options['no_cache'] = ctx.obj.get('no_cache', False)
+
+    def confirm(prompt, default):
+        from rich.prompt import Confirm
+        return Confirm.ask(prompt, default=default, console=console)
+
+    reply = daemon.request({
+        'command': command,
+        'task': task,
+        'file_path': str(Path(file_path).resolve()) if file_path else None,
+        'options': options,
+        'terminal': console.is_terminal,
+        'width': console.width,
+        'no_color': console.no_color,
+    }, stdout=console.file, confirm=confirm)
+    if reply is None:
+        return None
+    if reply.get('local'):
+        # Started with another Ollama URL, API keys or KP_* settings
+        if ctx.obj.get('verbose'):
+            console.print("[dim]The daemon runs with other settings; running here[/dim]")
+        return None
+    if reply.get('error'):
+        console.print(f"[red]✗ Daemon: {reply['error']}[/red]")
+    return reply['exit']
+
+
+def write_metrics(ctx, agent):
+    """Export the agent's run metrics where --metrics-out / --prometheus-out ask."""
+    targets = [
+        (ctx.obj.get('metrics_out'), agent.metrics.write_json),
+        (ctx.obj.get('prometheus_out'), agent.metrics.write_prometheus),
+    ]
+    for path, write in targets:
+        if not path:
+            continue
+        try:
+            write(Path(path))
+        except OSError as e:
+            console.print(f"[yellow]Could not write metrics to {path}: {e}[/yellow]")
+
+
+@cli.command()
+@click.argument('tasks_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--output', '-o', type=click.Path(dir_okay=False),
+              help='Results file (default: <tasks>.results.jsonl)')
+@click.option('--jobs', '-j', default=DEFAULT_JOBS,
+              help=f'Tasks run at once (default: {DEFAULT_JOBS})')
+@click.option('--concurrency', '-c', multiple=True,
+              help='Requests at once per backend, e.g. ollama=1 groq=4 (repeatable)')
+@click.option('--apply', 'apply_policy', type=click.Choice(APPLY_POLICIES), default='none',
+              help='Write files: none (report only), new (create new files), '
+                   'all (create and modify)')
+@click.pass_context
+def batch(ctx, tasks_file, output, jobs, concurrency, apply_policy):
+    """Run every task in a JSONL file against one project scan."""
+    try:
+        tasks = load_tasks(Path(tasks_file))
+        limits = parse_concurrency(concurrency)
+    except (OSError, ValueError) as e:
+        console.print(f"[red]✗ {e}[/red]")
+        ctx.exit(2)
+
+    results_path = Path(output) if output else default_results_path(Path(tasks_file))
+    runner = BatchRunner(
+        backend=ctx.obj.get('backend', 'auto'),
+        model=ctx.obj.get('model'),
+        api_key=ctx.obj.get('api_key'),
+        temperature=ctx.obj.get('temperature', 0.7),
+        jobs=jobs,
+        concurrency=limits,
+        apply=apply_policy,
+        use_cache=not ctx.obj.get('no_cache', False)
+    )
+
+    try:
+        prepared = runner.prepare()
+    except RuntimeError as e:
+        console.print(f"[red]✗ {e}[/red]")
+        ctx.exit(1)
+
+    console.print(
+        f"[bold cyan]Batch:[/bold cyan] {len(tasks)} tasks on {runner.backend} "
+        f"({jobs} at once, apply: {apply_policy}); project scanned in {prepared['scan']:.2f}s"
+    )
+
+    done = []
+
+    def report(result):
+        done.append(result)
+        style = {"ok": "green", "no_changes": "yellow", "partial": "yellow"}.get(
+            result['status'], "red"
+        )
+        detail = result.get('error') or ", ".join(
+            f"{f['action']} {f['path']}" for f in result.get('files', [])
+        )
+        console.print(
+            f"[{style}]{result['status']:>10}[/{style}] [{len(done)}/{len(tasks)}] "
+            f"{result['id']} ({result['timings']['total']:.1f}s) [dim]{detail}[/dim]"
+        )
+
+    start = time.perf_counter()
+    results = runner.run(tasks, results_path, on_result=report)
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(results)
+    statuses = ", ".join(
+        f"{count} {status}" for status, count in sorted(summary['statuses'].items())
+    )
+    console.print(
+        f"\n[bold]{summary['tasks']} tasks in {elapsed:.1f}s[/bold] ({statuses}; "
+        f"{summary['model_seconds']:.1f}s of model time)"
+    )
+    console.print(f"[dim]Results written to {results_path}[/dim]")
+    ctx.exit(0 if summary['statuses'].get('error', 0) == 0 else 1)
+
+
+@cli.command('mock-server')
+@click.option('--port', '-p', default=11435, help='Port to listen on (default: 11435)')
+@click.option('--ttft', default=0.5, help='Seconds before the first token (default: 0.5)')
+@click.option('--tps', default=50.0, help='Tokens per second after it, 0 = unlimited (default: 50)')
+def mock_server(port: int, ttft: float, tps: float):
+    """Serve scripted answers over the Ollama and OpenAI APIs, for benchmarks."""
+    from .mock_server import MockLLMServer
+
+    server = MockLLMServer(ttft=ttft, tokens_per_second=tps, port=port)
+    console.print(
+        f"[bold cyan]Mock LLM server:[/bold cyan] {server.url} (TTFT {ttft}s, {tps:g} tokens/s)"
+    )
+    console.print(f"  Ollama: kp-codeagent --backend ollama --ollama-url {server.url} run \"task\"")
+    console.print(
+        f"  Groq:   GROQ_BASE_URL={server.url} GROQ_API_KEY=mock "
+        "kp-codeagent --backend groq run \"task\""
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
 @cli.command()
 @click.option('--model', '-m', default='codellama:7b', help='Model to download (default: codellama:7b)')
 def setup(model: str):
     """Set up Ollama and download the required model."""
     console.print("[bold cyan]KP Code Agent Setup[/bold cyan]\n")
 
+    from .ollama_client import OllamaClient
+
     client = OllamaClient(model=model)
 
     # Check if Ollama is running
@@ -136,6 +347,8 @@ def check(model: str):
     """Check if Ollama is running and model is available."""
     console.print("[bold cyan]Checking KP Code Agent setup...[/bold cyan]\n")
 
+    from .ollama_client import OllamaClient
+
     client = OllamaClient(model=model)
 
     # Check Ollama
@@ -164,20 +377,170 @@ def check(model: str):
 @click.argument('task', required=True)
 @click.option('--model', '-m', default='codellama:7b', help='Model to use')
 @click.option('--temperature', '-t', default=0.7, help='Temperature for generation')
-def modify(file_path: str, task: str, model: str, temperature: float):
+@click.pass_context
+def modify(ctx, file_path: str, task: str, model: str, temperature: float):
     """Modify a specific file based on a task."""
-    agent = CodeAgent(model=model, temperature=temperature)
+    code = delegate(ctx, 'modify', task, file_path, model=model, temperature=temperature)
+    if code is not None:
+        exit(code)
 
-    # Check setup first
-    is_ready, message = agent.client.check_setup()
-    if not is_ready:
-        console.print(f"[red]✗ {message}[/red]")
-        exit(1)
+    from .agent import CodeAgent
+
+    agent = CodeAgent(
+        model=model, temperature=temperature, use_cache=not ctx.obj.get('no_cache', False)
+    )
 
-    success = agent.modify_file_interactive(Path(file_path), task)
+    try:
+        success = agent.modify_file_interactive(Path(file_path), task)
+    finally:
+        write_metrics(ctx, agent)
     exit(0 if success else 1)
 
 
+@cli.command()
+@click.option('--stop', is_flag=True, help='Stop the daemon serving this project')
+@click.option('--status', is_flag=True, help='Show whether a daemon serves this project')
+@click.pass_context
+def serve(ctx, stop: bool, status: bool):
+    """Keep this project warm in a daemon that run and modify hand tasks to."""
+    if stop or status:
+        reply = daemon.request({'command': 'stop' if stop else 'ping'})
+        if reply is None:
+            console.print("[yellow]No daemon is serving this project.[/yellow]")
+            exit(1)
+        if stop:
+            console.print("[green]✓ Daemon stopped[/green]")
+        else:
+            console.print(
+                f"[bold cyan]Daemon:[/bold cyan] pid {reply['pid']}, serving {reply['root']}"
+            )
+            console.print(f"  Socket: {daemon.socket_path()}")
+            console.print(f"  Tasks:  {reply['tasks']}")
+            watch = reply.get('watch')
+            if watch:
+                console.print(
+                    f"  Watch:  {watch['backend']}, {watch['watched']} directories watched, "
+                    f"{watch['polled']} polled, {watch['events']} events"
+                )
+            else:
+                console.print("  Watch:  off (indexes refreshed before each task)")
+        return
+
+    server = daemon.Daemon(backend=ctx.obj.get('backend'), model=ctx.obj.get('model'))
+
+    def warm():
+        # Clients that connect meanwhile wait for the first scan
+        start = time.perf_counter()
+        server.warm()
+        console.print(
+            f"[bold cyan]Serving {server.root_dir}[/bold cyan] on {server.path} "
+            f"(warmed up in {time.perf_counter() - start:.2f}s)"
+        )
+        if server.watcher is not None:
+            watch = server.watcher.status()
+            console.print(
+                f"  Watching with {watch['backend']}: {watch['watched']} directories watched, "
+                f"{watch['polled']} polled"
+            )
+        console.print(
+            "[dim]run and modify in this directory now go through the daemon; "
+            "Ctrl+C stops it[/dim]"
+        )
+
+    try:
+        server.serve_forever(ready=warm)
+    except RuntimeError as e:
+        console.print(f"[red]✗ {e}[/red]")
+        exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+@cli.group()
+def index():
+    """Build or inspect the persistent project file index."""
+
+
+@index.command('build')
+@click.option('--rebuild', is_flag=True, help='Discard the stored index and scan everything again')
+def index_build(rebuild: bool):
+    """Build or incrementally update the file index."""
+    file_index = FileIndex(Path.cwd())
+
+    if not rebuild:
+        file_index.load()
+
+    start = time.perf_counter()
+    stats = file_index.refresh()
+    elapsed = time.perf_counter() - start
+
+    if not file_index.save():
+        console.print(f"[red]✗ Could not write {file_index.index_path}[/red]")
+        exit(1)
+
+    status = file_index.status()
+    console.print(f"[green]✓ Index written to {file_index.index_path}[/green]")
+    console.print(
+        f"  {status['files']} files in {status['dirs']} directories "
+        f"({stats['scanned_dirs']} scanned, {stats['reused_dirs']} reused, "
+        f"{stats['removed_dirs']} removed) in {elapsed:.2f}s"
+    )
+
+
+@index.command('status')
+def index_status():
+    """Show the state of the file index."""
+    status = FileIndex(Path.cwd()).status()
+
+    if not status['exists']:
+        console.print("[yellow]No file index found.[/yellow]")
+        console.print("\nRun: kp-codeagent index build")
+        exit(1)
+
+    built_at = datetime.fromtimestamp(status['built_at']).strftime("%Y-%m-%d %H:%M:%S")
+    console.print(f"[bold cyan]File index:[/bold cyan] {status['path']}")
+    console.print(f"  Built:       {built_at}")
+    console.print(f"  Directories: {status['dirs']}")
+    console.print(f"  Files:       {status['files']} ({status['bytes'] / 1024 / 1024:.1f} MB)")
+    if status['stale_dirs']:
+        console.print(
+            f"  Stale:       [yellow]{status['stale_dirs']} directories changed "
+            "since last build[/yellow]"
+        )
+    else:
+        console.print("  Stale:       [green]up to date[/green]")
+
+
+@cli.group()
+def cache():
+    """Inspect or clear the cache of model responses."""
+
+
+@cache.command('status')
+def cache_status():
+    """Show the size of the response cache."""
+    status = ResponseCache(Path.cwd()).status()
+
+    if not status['exists']:
+        console.print("[yellow]No response cache found.[/yellow]")
+        exit(1)
+
+    console.print(f"[bold cyan]Response cache:[/bold cyan] {status['path']}")
+    console.print(f"  Entries: {status['entries']}")
+    console.print(
+        f"  Size:    {status['bytes'] / 1024 / 1024:.1f} MB "
+        f"of {status['max_bytes'] / 1024 / 1024:.0f} MB"
+    )
+    console.print(f"  Hits:    {status['stored_hits']}")
+
+
+@cache.command('clear')
+def cache_clear():
+    """Delete every cached response."""
+    count = ResponseCache(Path.cwd()).clear()
+    console.print(f"[green]✓ Removed {count} cached responses[/green]")
+
+
 def main():
     """Main entry point for the CLI."""
     try:
@@ -1,68 +1,259 @@
 """Context builder for gathering project information."""
 
-import os
+import contextlib
+import sqlite3
+import time
 from pathlib import Path
-from typing import List, Dict, Tuple
-from .utils import is_binary_file, should_ignore_file, count_tokens
+from typing import Any, Iterator, List, Dict, Optional, Set, Tuple
+from .file_index import FileIndex
+from .chunker import Chunk, chunk_score, elision_marker, pack, render_chunks, split_chunks
+from .ignore import GitIgnoreMatcher
+from .profiling import span
+from .search_index import SearchIndex, query_terms
+from .symbol_index import Symbol, SymbolIndex, task_identifiers
+from .walker import TreeWalk
+from .watcher import ChangeSet, Watcher
+from .tokenizer import Tokenizer, get_tokenizer
+from .utils import MAX_READ_BYTES, is_binary_file, get_io_workers, parallel_map, read_bounded
+
+# Common code file extensions
+CODE_EXTENSIONS = [
+    '.py', '.js', '.ts', '.jsx', '.tsx', '.java', '.cpp', '.c', '.h',
+    '.cs', '.go', '.rs', '.rb', '.php', '.swift', '.kt', '.scala',
+    '.html', '.css', '.scss', '.sql', '.sh', '.bat', '.json', '.yaml', '.yml'
+]
+
+ENTRY_POINTS = ['main.py', 'app.py', 'index.js', 'main.js', 'Main.java']
+
+# Chunk values: code that matches no task term still fills spare budget,
+# preferring higher-ranked files; named definitions always come first
+BASE_CHUNK_VALUE = 0.1
+RANK_DECAY = 0.3
+SYMBOL_BONUS = 10.0
 
 
 class ContextBuilder:
     """Builds context from the current project for the AI agent."""
 
-    def __init__(self, max_tokens: int = 8000):
+    def __init__(self, max_tokens: int = 8000, io_workers: int = None, tokenizer: Tokenizer = None):
         self.max_tokens = max_tokens
-        self.gitignore_patterns = self._load_gitignore()
-
-    def _load_gitignore(self) -> List[str]:
-        """Load patterns from .gitignore if it exists."""
-        gitignore_path = Path.cwd() / '.gitignore'
-        patterns = []
+        # Counts against the active model's tokenizer (or its estimate)
+        self.tokenizer = tokenizer or get_tokenizer()
+        self._marker_tokens = self.tokenizer.count(elision_marker(99999, 99999))
+        # Threads used to stat, sniff and read files (KP_IO_WORKERS)
+        self.io_workers = get_io_workers(io_workers)
+        # Compiled once and shared by every scan of the current directory
+        self.ignore_matcher = GitIgnoreMatcher(Path.cwd())
+        self._indexes: Dict[Path, FileIndex] = {}
+        self._search_indexes: Dict[Path, SearchIndex] = {}
+        self._symbol_indexes: Dict[Path, SymbolIndex] = {}
+        self._walks: Dict[Tuple[Path, int], TreeWalk] = {}
+        # Set by watch(): the search and symbol indexes named in _fresh are
+        # kept in sync by apply_changes, so builds skip their stat pass
+        self.watcher: Optional[Watcher] = None
+        self._fresh: Set[str] = set()
+        # Seconds per step of the last build_context call (run metrics)
+        self.timings: Dict[str, Any] = {}
+
+    def fork(self, tokenizer: Tokenizer = None) -> "ContextBuilder":
+        """
+        A builder with its own token budget and tokenizer that shares this
+        one's scans and indexes, so several agents only scan the project once.
+        The indexes are not thread-safe: concurrent users must take turns.
+        """
+        builder = ContextBuilder.__new__(ContextBuilder)
+        builder.__dict__.update(self.__dict__)
+        builder.tokenizer = tokenizer or self.tokenizer
+        builder._marker_tokens = builder.tokenizer.count(elision_marker(99999, 99999))
+        builder.timings = {}
+        return builder
+
+    @contextlib.contextmanager
+    def _timed(self, step: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            with span(f"context.{step}", "context"):
+                yield
+        finally:
+            self.timings[step] = self.timings.get(step, 0.0) + time.perf_counter() - start
+
+    def get_index(self, root_dir: Path = None) -> FileIndex:
+        """Return the file index for root_dir, refreshing it once per builder."""
+        root_dir = Path(root_dir or Path.cwd()).resolve()
+
+        index = self._indexes.get(root_dir)
+        if index is None:
+            if root_dir == self.ignore_matcher.root_dir:
+                index = FileIndex(root_dir, matcher=self.ignore_matcher)
+            else:
+                index = FileIndex(root_dir)
+            with span("index.update", "context") as args:
+                stats = index.update()
+                if args is not None:
+                    args.update(stats)
+            self._indexes[root_dir] = index
+
+        return index
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        Bring the indexes of a long-lived builder (the daemon's) up to date:
+        rescan directories that changed since the last task and drop the
+        cached walks, which are rebuilt on the next scan.
+        """
+        totals = {"scanned_dirs": 0, "reused_dirs": 0, "removed_dirs": 0}
+        for index in self._indexes.values():
+            with span("index.refresh", "context"):
+                stats = index.refresh()
+            if stats["scanned_dirs"] or stats["removed_dirs"]:
+                index.save()
+            for key in totals:
+                totals[key] += stats[key]
+
+        self._walks.clear()
+        # In-place edits are only found by the indexes' own stat pass
+        self._fresh.clear()
+        return totals
+
+    def watch(self, watcher: Watcher, root_dir: Path = None) -> Dict[str, int]:
+        """
+        Keep the indexes of root_dir fresh from ``watcher`` (see
+        apply_changes). The watches are set before the tree is checked once
+        more, so nothing that changed since the last scan is missed.
+        """
+        watcher.sync(self.get_index(root_dir).dirs)
+        self.watcher = watcher.start()
+        return self.apply_changes(ChangeSet(overflow=True), root_dir)
 
-        if gitignore_path.exists():
+    def apply_changes(self, changes: ChangeSet, root_dir: Path = None) -> Dict[str, int]:
+        """
+        Push a watcher's changes into the indexes: relist the directories
+        that changed, rescan collapsed subtrees (or the whole tree, by mtime,
+        after an overflow) and record edited files, then bring the search and
+        symbol indexes up to date, stat'ing only the files that changed.
+        Token counts are cached by content and need no invalidation.
+        """
+        stats = {"scanned_dirs": 0, "reused_dirs": 0, "removed_dirs": 0, "updated_files": 0}
+        if not changes and {"search", "symbols"} <= self._fresh:
+            return stats
+
+        index = self.get_index(root_dir)
+        root_dir = index.root_dir
+        files = {rel for rel in changes.files if not index.matcher.match(rel, False)}
+
+        with span("index.apply", "context") as args:
+            if changes.overflow:
+                stats.update(index.refresh())
+                self._fresh.clear()
+            elif changes.dirs or changes.subtrees:
+                stats.update(index.refresh(changes.dirs | changes.subtrees))
+            stats["updated_files"] = index.update_files(files)
+            if args is not None:
+                args.update(stats)
+
+        if stats["scanned_dirs"] or stats["removed_dirs"]:
+            index.save()
+            # Edits alone leave the tree and file list as they were
+            self._walks.clear()
+        changed = stats["scanned_dirs"] or stats["removed_dirs"] or stats["updated_files"]
+        if changed and self.watcher is not None:
+            self.watcher.sync(index.dirs)
+
+        modified = {root_dir / rel for rel in files}
+        modified.update(index.files_under(changes.subtrees))
+        candidates = self._candidate_files(root_dir)
+        for name, content_index in (
+            ("search", self.get_search_index(root_dir)),
+            ("symbols", self.get_symbol_index(root_dir)),
+        ):
             try:
-                with open(gitignore_path, 'r') as f:
-                    for line in f:
-                        line = line.strip()
-                        if line and not line.startswith('#'):
-                            patterns.append(line)
-            except Exception:
-                pass
+                content_index.update(
+                    candidates, self.io_workers, modified if name in self._fresh else None
+                )
+                self._fresh.add(name)
+            except (sqlite3.Error, OSError):
+                self._fresh.discard(name)
+
+        return stats
+
+    def scan_project(self, root_dir: Path = None, max_depth: int = 3) -> TreeWalk:
+        """
+        Walk the indexed tree once, collecting the rendered tree, every file
+        and per-directory stats; later calls reuse the result.
+        """
+        root_dir = Path(root_dir or Path.cwd()).resolve()
 
-        return patterns
+        scan = self._walks.get((root_dir, max_depth))
+        if scan is None:
+            with self._timed("walk"):
+                index = self.get_index(root_dir)
+                with span("index.walk", "context"):
+                    scan = index.walk(max_depth)
+            self._walks[(root_dir, max_depth)] = scan
+
+        return scan
 
     def build_file_tree(self, root_dir: Path = None, max_depth: int = 3) -> str:
         """Build a text representation of the file tree."""
-        if root_dir is None:
-            root_dir = Path.cwd()
+        return self.scan_project(root_dir, max_depth).tree
 
-        tree_lines = [f"Project Root: {root_dir.name}/"]
+    def get_search_index(self, root_dir: Path = None) -> SearchIndex:
+        """Return the content search index for root_dir."""
+        root_dir = Path(root_dir or Path.cwd()).resolve()
 
-        def add_tree_lines(directory: Path, prefix: str = "", depth: int = 0):
-            if depth >= max_depth:
-                return
+        search_index = self._search_indexes.get(root_dir)
+        if search_index is None:
+            search_index = SearchIndex(root_dir)
+            self._search_indexes[root_dir] = search_index
 
-            try:
-                items = sorted(directory.iterdir(), key=lambda x: (not x.is_dir(), x.name))
+        return search_index
 
-                for i, item in enumerate(items):
-                    if should_ignore_file(item, self.gitignore_patterns):
-                        continue
+    def get_symbol_index(self, root_dir: Path = None) -> SymbolIndex:
+        """Return the symbol index for root_dir."""
+        root_dir = Path(root_dir or Path.cwd()).resolve()
 
-                    is_last = i == len(items) - 1
-                    current_prefix = "└── " if is_last else "├── "
-                    next_prefix = "    " if is_last else "│   "
+        symbol_index = self._symbol_indexes.get(root_dir)
+        if symbol_index is None:
+            symbol_index = SymbolIndex(root_dir)
+            self._symbol_indexes[root_dir] = symbol_index
 
-                    if item.is_dir():
-                        tree_lines.append(f"{prefix}{current_prefix}{item.name}/")
-                        add_tree_lines(item, prefix + next_prefix, depth + 1)
-                    else:
-                        tree_lines.append(f"{prefix}{current_prefix}{item.name}")
+        return symbol_index
 
-            except PermissionError:
-                pass
+    def _candidate_files(
+        self, root_dir: Path = None, file_extensions: List[str] = None
+    ) -> List[Path]:
+        """Indexed files with one of the given extensions."""
+        if file_extensions is None:
+            file_extensions = CODE_EXTENSIONS
 
-        add_tree_lines(root_dir)
-        return "\n".join(tree_lines)
+        return [
+            file_path for file_path, _ in self.scan_project(root_dir).files
+            if any(file_path.name.endswith(ext) for ext in file_extensions)
+        ]
+
+    def find_symbols(self, task: str, root_dir: Path = None) -> List[Tuple[Path, Symbol]]:
+        """Find definitions of the identifiers mentioned in the task."""
+        names = task_identifiers(task)
+        if not names:
+            return []
+
+        try:
+            symbol_index = self.get_symbol_index(root_dir)
+            if "symbols" not in self._fresh:
+                symbol_index.update(self._candidate_files(root_dir), self.io_workers)
+            found = symbol_index.find(names)
+        except (sqlite3.Error, OSError):
+            return []
+
+        # Skip definitions nested inside another match (e.g. a method of a matched class)
+        return [
+            (path, symbol) for path, symbol in found
+            if not any(
+                other_path == path and other != symbol
+                and other.start <= symbol.start and symbol.end <= other.end
+                for other_path, other in found
+            )
+        ]
 
     def find_relevant_files(
         self,
@@ -70,99 +261,229 @@ class ContextBuilder:
         root_dir: Path = None,
         file_extensions: List[str] = None
     ) -> List[Path]:
-        """Find files relevant to the task."""
-        if root_dir is None:
-            root_dir = Path.cwd()
-
-        if file_extensions is None:
-            # Common code file extensions
-            file_extensions = [
-                '.py', '.js', '.ts', '.jsx', '.tsx', '.java', '.cpp', '.c', '.h',
-                '.cs', '.go', '.rs', '.rb', '.php', '.swift', '.kt', '.scala',
-                '.html', '.css', '.scss', '.sql', '.sh', '.bat', '.json', '.yaml', '.yml'
-            ]
-
-        relevant_files = []
-        task_lower = task.lower()
+        """Find files relevant to the task, ranked by BM25 over their contents."""
+        candidates = self._candidate_files(root_dir, file_extensions)
 
         try:
-            for root, dirs, files in os.walk(root_dir):
-                # Remove ignored directories from dirs to prevent walking them
-                dirs[:] = [d for d in dirs if not should_ignore_file(Path(root) / d, self.gitignore_patterns)]
-
-                for file in files:
-                    file_path = Path(root) / file
-
-                    # Skip if should be ignored or is binary
-                    if should_ignore_file(file_path, self.gitignore_patterns):
-                        continue
-
-                    if is_binary_file(file_path):
-                        continue
-
-                    # Check if file extension matches
-                    if not any(file.endswith(ext) for ext in file_extensions):
-                        continue
-
-                    # Basic relevance check based on filename
-                    if any(keyword in file.lower() for keyword in task_lower.split()):
-                        relevant_files.append(file_path)
-                        continue
-
-                    # If not many files yet, add common entry points
-                    if len(relevant_files) < 5 and file in ['main.py', 'app.py', 'index.js', 'main.js', 'Main.java']:
-                        relevant_files.append(file_path)
-
-        except Exception:
-            pass
+            search_index = self.get_search_index(root_dir)
+            if file_extensions is not None or "search" not in self._fresh:
+                search_index.update(candidates, self.io_workers)
+                # Only the default candidates are kept in sync by the watcher
+                self._fresh.discard("search")
+            relevant_files = [path for path, _ in search_index.search(task, limit=10)]
+        except (sqlite3.Error, OSError):
+            # Index unavailable (e.g. read-only checkout): match file names instead
+            task_words = task.lower().split()
+            relevant_files = self._text_files([
+                path for path in candidates
+                if any(keyword in path.name.lower() for keyword in task_words)
+            ])[:10]
+
+        # If not many files yet, add common entry points
+        if len(relevant_files) < 5:
+            entry_points = self._text_files([
+                file_path for file_path in candidates
+                if file_path.name in ENTRY_POINTS and file_path not in relevant_files
+            ])
+            relevant_files.extend(entry_points[:5 - len(relevant_files)])
 
         return relevant_files[:10]  # Limit to 10 most relevant files
 
+    def _text_files(self, files: List[Path]) -> List[Path]:
+        """Drop binary files, sniffing them on the I/O pool."""
+        binary = parallel_map(is_binary_file, files, self.io_workers)
+        return [file_path for file_path, is_binary in zip(files, binary) if not is_binary]
+
     def read_file_content(self, file_path: Path, max_lines: int = 200) -> str:
         """Read file content with size limits."""
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-
-                if len(lines) > max_lines:
-                    return (
-                        f"# File: {file_path} (truncated - showing first {max_lines} lines)\n" +
-                        "".join(lines[:max_lines]) +
-                        f"\n... ({len(lines) - max_lines} more lines)"
-                    )
-                else:
-                    return f"# File: {file_path}\n" + "".join(lines)
-
+            head = read_bounded(file_path, max_lines=max_lines)
         except Exception as e:
             return f"# File: {file_path}\n# Error reading file: {e}"
 
+        if head.truncated:
+            shown = head.text.count("\n")
+            return (
+                f"# File: {file_path} (truncated - showing first {shown} lines)\n" +
+                head.text +
+                f"\n... ({head.size - len(head.text.encode('utf-8'))} more bytes)"
+            )
+        return f"# File: {file_path}\n" + head.text
+
+    def _term_weights(self, task: str, root_dir: Path = None) -> Dict[str, float]:
+        """Task terms weighted by idf, or unweighted when the index is unavailable."""
+        try:
+            return self.get_search_index(root_dir).term_weights(task)
+        except (sqlite3.Error, OSError):
+            return query_terms(task)
+
+    def _score_chunks(
+        self,
+        file_path: Path,
+        rank: int,
+        term_weights: Dict[str, float],
+        symbols: List[Symbol] = None
+    ) -> Tuple[List[str], List[Tuple[Chunk, float, int]], Optional[int]]:
+        """
+        Split the start of a file (up to MAX_READ_BYTES) into chunks. Returns
+        its lines, (chunk, value, tokens) for each chunk, and the file size
+        if it was cut.
+        """
+        try:
+            with span("read", "io", path=str(file_path)):
+                head = read_bounded(file_path, MAX_READ_BYTES)
+        except OSError:
+            return [], [], None
+
+        source = head.text
+        if head.truncated:
+            # Only whole lines take part; render_chunks notes the rest
+            source = source[:source.rfind("\n") + 1]
+        lines = source.splitlines(keepends=True)
+        rank_weight = 1 / (1 + RANK_DECAY * rank)
+        # Files reached through a named definition only contribute matching code
+        base = 0.0 if symbols else BASE_CHUNK_VALUE
+
+        scored = []
+        for chunk in split_chunks(source, file_path.suffix):
+            text = "".join(lines[chunk.start - 1:chunk.end])
+            value = rank_weight * (base + chunk_score(text, term_weights))
+            if symbols and any(s.start <= chunk.end and chunk.start <= s.end for s in symbols):
+                value += SYMBOL_BONUS
+            scored.append((chunk, value, self.tokenizer.count(text) + self._marker_tokens))
+
+        # A class header is worth as much as its best member, so methods keep their class line
+        for i, (chunk, value, tokens) in enumerate(scored):
+            if chunk.kind == "block" and chunk.name:
+                members = [v for c, v, _ in scored if c.name.startswith(chunk.name + ".")]
+                scored[i] = (chunk, max([value] + members), tokens)
+
+        return lines, scored, head.size if head.truncated else None
+
     def build_context(self, task: str) -> Tuple[str, str]:
         """
         Build complete context for the AI agent.
         Returns: (file_tree, code_snippets)
-        """
-        file_tree = self.build_file_tree()
-        relevant_files = self.find_relevant_files(task)
-
-        code_snippets = []
-        total_tokens = count_tokens(file_tree)
 
-        for file_path in relevant_files:
-            content = self.read_file_content(file_path)
-            content_tokens = count_tokens(content)
+        Relevant files are split into chunks (definitions and blocks), and
+        the most relevant chunks across all files are packed into the token
+        budget; skipped regions are replaced by elision markers.
 
-            if total_tokens + content_tokens > self.max_tokens:
-                break
-
-            code_snippets.append(content)
-            total_tokens += content_tokens
+        Afterwards ``timings`` holds the seconds spent walking the tree,
+        finding symbols, searching, reading and scoring files and packing,
+        plus the ignore matching and token counting done along the way.
+        """
+        self.timings = {}
+        matcher, tokenizer = self.ignore_matcher, self.tokenizer
+        matched, match_seconds, count_seconds = matcher.matched, matcher.seconds, tokenizer.seconds
+        hits, misses = tokenizer.hits, tokenizer.misses
 
+        file_tree = self.build_file_tree()
+        budget = self.max_tokens - self.tokenizer.count(file_tree)
+
+        # Files with definitions named in the task first, then the ranked files
+        symbol_spans: Dict[Path, List[Symbol]] = {}
+        with self._timed("symbols"):
+            for file_path, symbol in self.find_symbols(task):
+                symbol_spans.setdefault(file_path, []).append(symbol)
+        files = list(symbol_spans)
+        with self._timed("search"):
+            files += [path for path in self.find_relevant_files(task) if path not in symbol_spans]
+
+        term_weights = self._term_weights(task)
+        with self._timed("read_and_score"):
+            sections = parallel_map(
+                lambda item: self._score_chunks(
+                    item[1], item[0], term_weights, symbol_spans.get(item[1])
+                ),
+                list(enumerate(files)),
+                self.io_workers
+            )
+
+        items = [
+            (file_number, chunk, value, tokens)
+            for file_number, (_, scored, _) in enumerate(sections)
+            for chunk, value, tokens in scored
+        ]
+        with self._timed("pack"):
+            chosen = pack([item[2] for item in items], [item[3] for item in items], budget)
+
+            code_snippets = self._fit_excerpts(files, sections, items, chosen, budget)
+
+        self.timings.update({
+            "ignore_matching": matcher.seconds - match_seconds,
+            "paths_matched": matcher.matched - matched,
+            "token_counting": tokenizer.seconds - count_seconds,
+            "token_cache_hits": tokenizer.hits - hits,
+            "token_cache_misses": tokenizer.misses - misses,
+            "files_read": len(files),
+        })
         return file_tree, "\n\n".join(code_snippets) if code_snippets else "No relevant files found."
 
-    def get_file_content(self, file_path: Path) -> str:
-        """Get the full content of a specific file."""
+    def _fit_excerpts(
+        self,
+        files: List[Path],
+        sections: List[Tuple[List[str], list, Optional[int]]],
+        items: List[Tuple[int, Chunk, float, int]],
+        chosen: List[int],
+        budget: int
+    ) -> List[str]:
+        """
+        Render the chosen chunks per file, dropping the least valuable ones
+        until the excerpts fit. File headers and elision markers are not
+        part of the packing, so each pass counts every rendered file once,
+        subtracts the tokens of the chunks it drops and then counts the
+        whole context once to confirm.
+        """
+        tokenizer = self.tokenizer
+        separator = tokenizer.count("\n\n")
+        # A chunk's weight carries one marker already; dropping it may leave
+        # another marker in its place
+        marker = 2 * self._marker_tokens
+        by_density = sorted(chosen, key=lambda index: items[index][2] / items[index][3])
+        kept = set(chosen)
+
+        while True:
+            selected: Dict[int, List[Chunk]] = {}
+            for index in sorted(kept):
+                selected.setdefault(items[index][0], []).append(items[index][1])
+            rendered = {
+                file_number: render_chunks(
+                    files[file_number], sections[file_number][0], chunks,
+                    total_size=sections[file_number][2]
+                )
+                for file_number, chunks in sorted(selected.items())
+            }
+            code_snippets = list(rendered.values())
+            if not kept or tokenizer.count("\n\n".join(code_snippets)) <= budget:
+                return code_snippets
+
+            sizes = {number: tokenizer.count(text) for number, text in rendered.items()}
+            left = {number: len(chunks) for number, chunks in selected.items()}
+            total = sum(sizes.values()) + separator * (len(sizes) - 1)
+            dropped = 0
+            for index in by_density:
+                if index not in kept:
+                    continue
+                if total <= budget and dropped:
+                    break
+                file_number, tokens = items[index][0], items[index][3]
+                kept.discard(index)
+                dropped += 1
+                left[file_number] -= 1
+                if left[file_number]:
+                    sizes[file_number] -= tokens - marker
+                    total -= tokens - marker
+                else:
+                    total -= sizes.pop(file_number) + separator
+
+    def get_file_content(self, file_path: Path, max_bytes: int = MAX_READ_BYTES) -> str:
+        """Get the content of a specific file, up to max_bytes."""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            head = read_bounded(file_path, max_bytes)
         except Exception as e:
             return f"Error reading file: {e}"
+
+        if head.truncated:
+            return head.text + f"\n... (truncated, {head.size} bytes in total)"
+        return head.text
@@ -0,0 +1,447 @@
+"""
+Warm daemon: ``kp-codeagent serve`` keeps a project's indexes, model
+clients (with their HTTP connections and health checks) and imports in
+memory, and runs the tasks that ``kp-codeagent run`` and ``modify`` send it
+over a Unix socket.
+
+The protocol is one JSON object per line. The client sends a request;
+the daemon answers with ``{"out": text}`` for console output (streamed
+model tokens included), ``{"confirm": prompt, "default": bool}`` when it
+needs a yes/no answer (the client replies ``{"answer": bool}``) and a
+final ``{"exit": code}``.
+
+The client half of this module only needs the standard library, so a
+command that hands its task to the daemon starts without importing the
+agent.
+"""
+
+import hashlib
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, TextIO
+
+PROTOCOL_VERSION = 1
+
+# Seconds between background health checks of the clients the daemon keeps
+KEEP_WARM_INTERVAL = 15
+
+# Environment read by tasks besides KP_*; the KP_* variables below are
+# only read by the client, or sent with the task (KP_LANG)
+SETTINGS_ENV = ("OLLAMA_URL", "GROQ_API_KEY", "OPENAI_API_KEY")
+CLIENT_ENV = ("KP_DAEMON", "KP_DAEMON_DIR", "KP_LANG")
+
+
+def socket_path(root_dir: Path = None) -> Path:
+    """
+    Socket of the daemon serving a project: one per project root, in
+    KP_DAEMON_DIR, $XDG_RUNTIME_DIR/kp-codeagent or a per-user temp dir.
+    """
+    root_dir = Path(root_dir or Path.cwd()).resolve()
+    base = os.getenv("KP_DAEMON_DIR")
+    if not base:
+        runtime = os.getenv("XDG_RUNTIME_DIR")
+        if runtime:
+            base = os.path.join(runtime, "kp-codeagent")
+        else:
+            user = os.getuid() if hasattr(os, "getuid") else os.getenv("USERNAME", "user")
+            base = os.path.join(tempfile.gettempdir(), f"kp-codeagent-{user}")
+    digest = hashlib.sha256(str(root_dir).encode("utf-8")).hexdigest()[:16]
+    return Path(base) / f"{digest}.sock"
+
+
+def check_socket_dir(path: Path, create: bool = False) -> Path:
+    """
+    Make sure the socket directory is a directory of this user's with no
+    group or other permissions. The temp dir fallback is predictable, so
+    another user could have created it to serve a fake daemon that receives
+    tasks, paths and API keys. Raises RuntimeError if it is not private.
+    """
+    if create:
+        path.mkdir(parents=True, exist_ok=True, mode=0o700)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise RuntimeError(f"{path} is not a directory")
+    if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+        raise RuntimeError(f"{path} must belong to you and be private (chmod 700 {path})")
+    return path
+
+
+def _peer_uid(sock: socket.socket, path: Path) -> Optional[int]:
+    """User running the process at the other end, or owning the socket file."""
+    if hasattr(socket, "SO_PEERCRED"):
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        return struct.unpack("3i", creds)[1]
+    return os.stat(path).st_uid
+
+
+def settings_digest() -> str:
+    """
+    Digest of the environment a task runs with: Ollama URL, API keys and
+    KP_* settings. The daemon only takes tasks from clients whose digest
+    matches its own; the keys themselves never leave the process.
+    """
+    settings = sorted(
+        (name, value) for name, value in os.environ.items()
+        if name in SETTINGS_ENV or (name.startswith("KP_") and name not in CLIENT_ENV)
+    )
+    return hashlib.sha256(json.dumps(settings).encode("utf-8")).hexdigest()
+
+
+def daemon_enabled() -> bool:
+    """Whether commands may hand their tasks to a running daemon (KP_DAEMON)."""
+    return hasattr(socket, "AF_UNIX") and os.getenv("KP_DAEMON", "1") != "0"
+
+
+def _send(sock: socket.socket, message: Dict[str, Any]):
+    sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+
+def connect(root_dir: Path = None) -> Optional[socket.socket]:
+    """A connection to the project's daemon, or None if none is running."""
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    path = socket_path(root_dir)
+    try:
+        check_socket_dir(path.parent)
+    except FileNotFoundError:
+        return None
+    except RuntimeError as e:
+        print(f"Not using the daemon: {e}", file=sys.stderr)
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+        uid = _peer_uid(sock, path) if hasattr(os, "getuid") else None
+    except OSError:
+        sock.close()
+        return None
+    if uid is not None and uid != os.getuid():
+        sock.close()
+        print(f"Not using the daemon: {path} is served by another user", file=sys.stderr)
+        return None
+    return sock
+
+
+def request(
+    message: Dict[str, Any],
+    root_dir: Path = None,
+    stdout: TextIO = None,
+    confirm: Callable[[str, bool], bool] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Send a request to the project's daemon, writing its output to
+    ``stdout`` and answering its questions with ``confirm``. Returns the
+    daemon's final message (``{"exit": code, ...}``, with ``"local": true``
+    if the daemon runs with other settings and the task should run here),
+    or None if no daemon is running.
+    """
+    sock = connect(root_dir)
+    if sock is None:
+        return None
+
+    stdout = stdout or sys.stdout
+    with sock, sock.makefile("r", encoding="utf-8") as replies:
+        _send(sock, {"version": PROTOCOL_VERSION, "settings": settings_digest(), **message})
+        for line in replies:
+            reply = json.loads(line)
+            if "out" in reply:
+                stdout.write(reply["out"])
+                stdout.flush()
+            elif "confirm" in reply:
+                answer = reply["default"]
+                if confirm:
+                    answer = confirm(reply["confirm"], answer)
+                _send(sock, {"answer": bool(answer)})
+            else:
+                return reply
+
+    # The daemon went away mid-task
+    return {"exit": 1, "error": "connection to the daemon was lost"}
+
+
+class ClientGone(KeyboardInterrupt):
+    """The client disconnected; unwinds the task the way Ctrl+C would."""
+
+
+class _ClientStream:
+    """File-like object sending console output to the client."""
+
+    def __init__(self, sock: socket.socket, terminal: bool):
+        self._sock = sock
+        self._terminal = terminal
+        self._lock = threading.Lock()
+        self._owner = threading.current_thread()
+        self.closed = False
+
+    def write(self, text: str) -> int:
+        if text and not self.closed:
+            try:
+                with self._lock:
+                    _send(self._sock, {"out": text})
+            except OSError:
+                self.closed = True
+                # Stop the task, but not from rich's refresh threads
+                if threading.current_thread() is self._owner:
+                    raise ClientGone()
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return self._terminal
+
+    def ask(self, prompt: str, default: bool, replies) -> bool:
+        """Ask the client a yes/no question."""
+        try:
+            with self._lock:
+                _send(self._sock, {"confirm": prompt, "default": default})
+            line = replies.readline()
+        except OSError:
+            line = ""
+        if not line:
+            self.closed = True
+            raise ClientGone()
+        return bool(json.loads(line).get("answer"))
+
+
+class Daemon:
+    """
+    Serves one project. Tasks run one at a time, as the indexes are shared
+    and not thread-safe. A watcher (see watcher.py) feeds file changes into
+    the indexes between tasks; without one (KP_WATCH=0) the file index is
+    refreshed before each task instead. Model clients are kept per backend,
+    model and cache setting, so their connections, health checks and token
+    counts stay warm between tasks. Tasks from a client whose environment
+    differs from the daemon's (see ``settings_digest``) are sent back to
+    run in the client.
+    """
+
+    def __init__(self, root_dir: Path = None, backend: str = None, model: str = None):
+        from .context_builder import ContextBuilder
+
+        self.root_dir = Path(root_dir or Path.cwd()).resolve()
+        self.path = socket_path(self.root_dir)
+        self.backend = backend
+        self.model = model
+        self.settings = settings_digest()
+        self.context_builder = ContextBuilder()
+        self.watcher = None
+        self.tasks = 0
+        self._clients: Dict[tuple, Any] = {}
+        self._task_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server: Optional[socket.socket] = None
+
+    def warm(self):
+        """Scan and watch the project and connect to the default backend up front."""
+        from .watcher import create_watcher
+
+        self.context_builder.scan_project(self.root_dir)
+        self.watcher = create_watcher(self.root_dir)
+        if self.watcher is not None:
+            self.context_builder.watch(self.watcher, self.root_dir)
+            threading.Thread(
+                target=self._apply_changes, name="kp-daemon-index", daemon=True
+            ).start()
+        try:
+            self._client(self.backend, self.model, None, True).check_setup()
+        except Exception:
+            # Reported by the first task that needs the backend
+            pass
+
+    def _client(
+        self, backend: Optional[str], model: Optional[str], api_key: Optional[str], use_cache: bool
+    ):
+        from .llm_client import UnifiedLLMClient
+        from .response_cache import ResponseCache
+
+        backend = backend or os.getenv("KP_BACKEND", "auto")
+        key = (backend, model, api_key, use_cache)
+        client = self._clients.get(key)
+        if client is None:
+            client = UnifiedLLMClient(
+                backend=backend,
+                model=model,
+                api_key=api_key or os.getenv("GROQ_API_KEY") or os.getenv("OPENAI_API_KEY"),
+                cache=ResponseCache(self.root_dir) if use_cache else None
+            )
+            self._clients[key] = client
+        return client
+
+    def _apply_changes(self):
+        while not self._stopped.is_set():
+            changes = self.watcher.take(timeout=1.0)
+            if changes:
+                with self._task_lock:
+                    self.context_builder.apply_changes(changes, self.root_dir)
+
+    def _catch_up(self):
+        """Bring the indexes up to date before a task."""
+        if self.watcher is None:
+            self.context_builder.refresh()
+            return
+        from .watcher import ChangeSet
+
+        changes = self.watcher.take(flush=True) or ChangeSet()
+        self.context_builder.apply_changes(changes, self.root_dir)
+
+    def _keep_warm(self):
+        while not self._stopped.wait(KEEP_WARM_INTERVAL):
+            for client in list(self._clients.values()):
+                try:
+                    client.is_available()
+                except Exception:
+                    pass
+
+    def _bind(self):
+        check_socket_dir(self.path.parent, create=True)
+        if connect(self.root_dir) is not None:
+            raise RuntimeError(f"A daemon is already serving {self.root_dir} ({self.path})")
+        try:
+            # Left behind by a daemon that did not exit cleanly
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(self.path))
+        os.chmod(self.path, 0o600)
+        server.listen()
+        self._server = server
+
+    def serve_forever(self, ready: Callable[[], None] = None):
+        """Accept clients until ``stop`` is called or a client asks to stop."""
+        self._bind()
+        threading.Thread(target=self._keep_warm, name="kp-daemon-warm", daemon=True).start()
+        if ready is not None:
+            ready()
+
+        try:
+            while not self._stopped.is_set():
+                try:
+                    conn, _ = self._server.accept()
+                except OSError:
+                    break
+                threading.Thread(
+                    target=self._handle, args=(conn,), name="kp-daemon-client", daemon=True
+                ).start()
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stopped.set()
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self._server is not None:
+            server, self._server = self._server, None
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+            try:
+                # Wakes the accept() blocked in serve_forever; close alone does not
+                server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            server.close()
+
+    def _handle(self, conn: socket.socket):
+        with conn, conn.makefile("r", encoding="utf-8") as replies:
+            try:
+                message = json.loads(replies.readline() or "{}")
+            except ValueError:
+                return
+
+            command = message.get("command")
+            try:
+                if message.get("version") != PROTOCOL_VERSION:
+                    result = {
+                        "exit": 2, "error": "client and daemon versions differ; restart the daemon"
+                    }
+                elif command == "ping":
+                    result = {
+                        "exit": 0, "root": str(self.root_dir), "pid": os.getpid(),
+                        "tasks": self.tasks,
+                        "watch": self.watcher.status() if self.watcher is not None else None,
+                    }
+                elif command == "stop":
+                    result = {"exit": 0}
+                elif command in ("run", "modify") and message.get("settings") != self.settings:
+                    result = {
+                        "exit": 2, "local": True, "error": "the daemon runs with other settings"
+                    }
+                elif command in ("run", "modify"):
+                    stream = _ClientStream(conn, bool(message.get("terminal")))
+                    with self._task_lock:
+                        result = self._run_task(message, stream, replies)
+                else:
+                    result = {"exit": 2, "error": f"unknown command: {command}"}
+                _send(conn, result)
+            except (ClientGone, OSError):
+                pass
+
+            if command == "stop":
+                self.stop()
+
+    def _run_task(self, message: Dict[str, Any], stream: _ClientStream, replies) -> Dict[str, Any]:
+        from rich.console import Console
+
+        from .agent import CodeAgent
+
+        self.tasks += 1
+        options = message.get("options", {})
+        output = Console(
+            file=stream,
+            force_terminal=bool(message.get("terminal")),
+            width=message.get("width") or None,
+            no_color=bool(message.get("no_color"))
+        )
+        try:
+            self._catch_up()
+            agent = CodeAgent(
+                model=options.get("model"),
+                temperature=options.get("temperature", 0.7),
+                verbose=bool(options.get("verbose")),
+                # Resolved by the client, from its --lang, KP_LANG or locale
+                lang=options.get("lang"),
+                output=output,
+                context_builder=self.context_builder,
+                client=self._client(
+                    options.get("backend"), options.get("model"),
+                    options.get("api_key"), not options.get("no_cache")
+                ),
+                confirm=lambda prompt, default: stream.ask(prompt, default, replies)
+            )
+
+            if message["command"] == "run":
+                success = agent.run(message["task"])
+            else:
+                success = agent.modify_file_interactive(
+                    Path(message["file_path"]), message["task"]
+                )
+        except ClientGone:
+            raise
+        except Exception as e:
+            output.print(f"[red]✗ Error: {e}[/red]")
+            return {"exit": 1}
+
+        for path, write in (
+            (options.get("metrics_out"), agent.metrics.write_json),
+            (options.get("prometheus_out"), agent.metrics.write_prometheus),
+        ):
+            if path:
+                try:
+                    write(Path(path))
+                except OSError as e:
+                    output.print(f"[yellow]Could not write metrics to {path}: {e}[/yellow]")
+
+        return {"exit": 0 if success else 1}
@@ -0,0 +1,96 @@
+"""Structured errors raised by LLM backends."""
+
+from typing import Any, Mapping, Optional
+
+# HTTP statuses worth retrying: throttling, timeouts and server faults
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """
+    A failed model request.
+
+    ``kind`` is one of "rate_limit", "timeout", "connection", "server",
+    "auth", "request" or "error". ``retryable`` tells the router whether
+    the same request may succeed later; ``retry_after`` is the server's
+    requested delay in seconds, when it sent one.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        backend: str = "",
+        kind: str = "error",
+        retryable: bool = False,
+        retry_after: Optional[float] = None,
+        status: Optional[int] = None
+    ):
+        super().__init__(message)
+        self.message = message
+        self.backend = backend
+        self.kind = kind
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.status = status
+
+    def __str__(self) -> str:
+        return f"{self.backend}: {self.message}" if self.backend else self.message
+
+
+def _retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    try:
+        value = (headers or {}).get("retry-after")
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        # HTTP dates are rare here; fall back to our own backoff
+        return None
+
+
+def http_error(
+    status: int,
+    message: str,
+    backend: str = "",
+    headers: Optional[Mapping[str, str]] = None
+) -> LLMError:
+    """LLMError for an HTTP error status."""
+    if status == 429:
+        kind = "rate_limit"
+    elif status in (401, 403):
+        kind = "auth"
+    elif status in RETRYABLE_STATUS:
+        kind = "server"
+    else:
+        kind = "request"
+
+    return LLMError(
+        message or f"HTTP {status}",
+        backend,
+        kind=kind,
+        retryable=status in RETRYABLE_STATUS,
+        retry_after=_retry_after(headers),
+        status=status,
+    )
+
+
+def classify_error(error: BaseException, backend: str = "") -> LLMError:
+    """
+    Map an exception from requests, httpx or the OpenAI/Groq SDKs to an
+    LLMError, by duck typing so none of those packages has to be imported.
+    """
+    if isinstance(error, LLMError):
+        return error
+
+    response: Any = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if isinstance(status, int) and status >= 400:
+        return http_error(status, str(error), backend, getattr(response, "headers", None))
+
+    name = type(error).__name__
+    if isinstance(error, TimeoutError) or "Timeout" in name:
+        return LLMError(str(error), backend, kind="timeout", retryable=True)
+    if isinstance(error, ConnectionError) or any(
+        part in name for part in ("Connect", "Network", "RemoteProtocol", "ChunkedEncoding")
+    ):
+        return LLMError(str(error), backend, kind="connection", retryable=True)
+
+    return LLMError(str(error) or name, backend)
@@ -3,21 +3,39 @@
 import os
 import shutil
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 from datetime import datetime
 from rich.console import Console
 from rich.prompt import Confirm
 from rich.syntax import Syntax
 
+from .profiling import span
+from .utils import MAX_READ_BYTES, read_bounded
+
 console = Console()
 
+# Characters of old and new content shown in a preview
+PREVIEW_CHARS = 500
+
 
 class FileHandler:
     """Handles file operations with safety measures."""
 
-    def __init__(self, backup_dir: str = ".kp-codeagent-backups"):
+    def __init__(
+        self,
+        backup_dir: str = ".kp-codeagent-backups",
+        output: Console = None,
+        confirm: Callable[[str, bool], bool] = None
+    ):
         self.backup_dir = Path.cwd() / backup_dir
         self.backup_dir.mkdir(exist_ok=True)
+        # Messages and yes/no questions go to the terminal unless redirected
+        # (the daemon sends both to its client)
+        self.console = output or console
+        self.confirm = confirm or self._ask
+
+    def _ask(self, prompt: str, default: bool) -> bool:
+        return Confirm.ask(prompt, default=default, console=self.console)
 
     def backup_file(self, file_path: Path) -> Optional[Path]:
         """Create a backup of the file before modification."""
@@ -29,52 +47,59 @@ class FileHandler:
             backup_name = f"{file_path.name}.{timestamp}.backup"
             backup_path = self.backup_dir / backup_name
 
-            shutil.copy2(file_path, backup_path)
-            console.print(f"[dim]Backup created: {backup_path}[/dim]")
+            with span("backup", "file", path=str(file_path)):
+                shutil.copy2(file_path, backup_path)
+            self.console.print(f"[dim]Backup created: {backup_path}[/dim]")
             return backup_path
 
         except Exception as e:
-            console.print(f"[yellow]Warning: Could not create backup: {e}[/yellow]")
+            self.console.print(f"[yellow]Warning: Could not create backup: {e}[/yellow]")
             return None
 
     def restore_backup(self, original_path: Path, backup_path: Path) -> bool:
         """Restore a file from backup."""
         try:
             shutil.copy2(backup_path, original_path)
-            console.print(f"[green]✓ File restored from backup[/green]")
+            self.console.print("[green]✓ File restored from backup[/green]")
             return True
         except Exception as e:
-            console.print(f"[red]✗ Failed to restore backup: {e}[/red]")
+            self.console.print(f"[red]✗ Failed to restore backup: {e}[/red]")
             return False
 
     def show_diff(self, file_path: Path, new_content: str):
         """Show a visual diff of file changes."""
         if file_path.exists():
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    old_content = f.read()
+                # Only the preview is read, however large the file is
+                old_content = read_bounded(file_path, PREVIEW_CHARS * 4).text
 
-                console.print(f"\n[bold]Changes to {file_path}:[/bold]")
-                console.print("[dim]Old content:[/dim]")
-                syntax = Syntax(old_content[:500], "python", theme="monokai", line_numbers=True)
-                console.print(syntax)
+                self.console.print(f"\n[bold]Changes to {file_path}:[/bold]")
+                self.console.print("[dim]Old content:[/dim]")
+                syntax = Syntax(
+                    old_content[:PREVIEW_CHARS], "python", theme="monokai", line_numbers=True
+                )
+                self.console.print(syntax)
 
-                console.print("\n[dim]New content:[/dim]")
-                syntax = Syntax(new_content[:500], "python", theme="monokai", line_numbers=True)
-                console.print(syntax)
+                self.console.print("\n[dim]New content:[/dim]")
+                syntax = Syntax(
+                    new_content[:PREVIEW_CHARS], "python", theme="monokai", line_numbers=True
+                )
+                self.console.print(syntax)
 
-                if len(new_content) > 500:
-                    console.print("[dim]... (content truncated)[/dim]")
+                if len(new_content) > PREVIEW_CHARS:
+                    self.console.print("[dim]... (content truncated)[/dim]")
 
             except Exception:
-                console.print("[dim]Could not display diff[/dim]")
+                self.console.print("[dim]Could not display diff[/dim]")
         else:
-            console.print(f"\n[bold]New file: {file_path}[/bold]")
-            syntax = Syntax(new_content[:500], "python", theme="monokai", line_numbers=True)
-            console.print(syntax)
+            self.console.print(f"\n[bold]New file: {file_path}[/bold]")
+            syntax = Syntax(
+                new_content[:PREVIEW_CHARS], "python", theme="monokai", line_numbers=True
+            )
+            self.console.print(syntax)
 
-            if len(new_content) > 500:
-                console.print("[dim]... (content truncated)[/dim]")
+            if len(new_content) > PREVIEW_CHARS:
+                self.console.print("[dim]... (content truncated)[/dim]")
 
     def create_file(
         self,
@@ -87,7 +112,7 @@ class FileHandler:
         file_path = Path(file_path)
 
         if file_path.exists() and not force:
-            console.print(f"[yellow]File {file_path} already exists![/yellow]")
+            self.console.print(f"[yellow]File {file_path} already exists![/yellow]")
             return False
 
         # Show preview
@@ -96,22 +121,25 @@ class FileHandler:
 
         # Ask for confirmation
         if not force:
-            if not Confirm.ask(f"\nCreate file {file_path}?", default=True):
-                console.print("[yellow]File creation cancelled[/yellow]")
+            with span("confirm", "file", path=str(file_path)):
+                confirmed = self.confirm(f"\nCreate file {file_path}?", True)
+            if not confirmed:
+                self.console.print("[yellow]File creation cancelled[/yellow]")
                 return False
 
         # Create parent directories if needed
         try:
             file_path.parent.mkdir(parents=True, exist_ok=True)
 
-            with open(file_path, 'w', encoding='utf-8') as f:
+            with span("write", "file", path=str(file_path)), \
+                    open(file_path, 'w', encoding='utf-8') as f:
                 f.write(content)
 
-            console.print(f"[green]✓ Created {file_path}[/green]")
+            self.console.print(f"[green]✓ Created {file_path}[/green]")
             return True
 
         except Exception as e:
-            console.print(f"[red]✗ Failed to create file: {e}[/red]")
+            self.console.print(f"[red]✗ Failed to create file: {e}[/red]")
             return False
 
     def modify_file(
@@ -125,7 +153,7 @@ class FileHandler:
         file_path = Path(file_path)
 
         if not file_path.exists():
-            console.print(f"[red]File {file_path} does not exist![/red]")
+            self.console.print(f"[red]File {file_path} does not exist![/red]")
             return False
 
         # Create backup
@@ -137,24 +165,27 @@ class FileHandler:
 
         # Ask for confirmation
         if not force:
-            if not Confirm.ask(f"\nModify file {file_path}?", default=True):
-                console.print("[yellow]File modification cancelled[/yellow]")
+            with span("confirm", "file", path=str(file_path)):
+                confirmed = self.confirm(f"\nModify file {file_path}?", True)
+            if not confirmed:
+                self.console.print("[yellow]File modification cancelled[/yellow]")
                 return False
 
         # Modify file
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
+            with span("write", "file", path=str(file_path)), \
+                    open(file_path, 'w', encoding='utf-8') as f:
                 f.write(new_content)
 
-            console.print(f"[green]✓ Modified {file_path}[/green]")
+            self.console.print(f"[green]✓ Modified {file_path}[/green]")
             return True
 
         except Exception as e:
-            console.print(f"[red]✗ Failed to modify file: {e}[/red]")
+            self.console.print(f"[red]✗ Failed to modify file: {e}[/red]")
 
             # Try to restore backup
             if backup_path:
-                console.print("[yellow]Attempting to restore from backup...[/yellow]")
+                self.console.print("[yellow]Attempting to restore from backup...[/yellow]")
                 self.restore_backup(file_path, backup_path)
 
             return False
@@ -164,7 +195,7 @@ class FileHandler:
         file_path = Path(file_path)
 
         if not file_path.exists():
-            console.print(f"[red]File {file_path} does not exist![/red]")
+            self.console.print(f"[red]File {file_path} does not exist![/red]")
             return False
 
         # Create backup first
@@ -172,17 +203,17 @@ class FileHandler:
 
         # Ask for confirmation
         if not force:
-            if not Confirm.ask(f"\nDelete file {file_path}?", default=False):
-                console.print("[yellow]File deletion cancelled[/yellow]")
+            if not self.confirm(f"\nDelete file {file_path}?", False):
+                self.console.print("[yellow]File deletion cancelled[/yellow]")
                 return False
 
         try:
             os.remove(file_path)
-            console.print(f"[green]✓ Deleted {file_path}[/green]")
+            self.console.print(f"[green]✓ Deleted {file_path}[/green]")
             return True
 
         except Exception as e:
-            console.print(f"[red]✗ Failed to delete file: {e}[/red]")
+            self.console.print(f"[red]✗ Failed to delete file: {e}[/red]")
             return False
 
     def check_permissions(self, file_path: Path) -> bool:
@@ -195,11 +226,18 @@ class FileHandler:
             # Check if we can write to the parent directory
             return os.access(file_path.parent, os.W_OK)
 
-    def read_file(self, file_path: Path) -> Optional[str]:
-        """Safely read a file."""
+    def read_file(self, file_path: Path, max_bytes: int = MAX_READ_BYTES) -> Optional[str]:
+        """Safely read a file, refusing files larger than max_bytes."""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            content = read_bounded(file_path, max_bytes, errors='strict')
+            if content.truncated:
+                self.console.print(
+                    f"[red]✗ File too large to edit: {file_path} "
+                    f"({content.size // 1024} KB, limit {max_bytes // 1024} KB)[/red]"
+                )
+                return None
+            # Same newline handling as reading in text mode
+            return content.text.replace('\r\n', '\n').replace('\r', '\n')
         except Exception as e:
-            console.print(f"[red]✗ Failed to read file: {e}[/red]")
+            self.console.print(f"[red]✗ Failed to read file: {e}[/red]")
             return None
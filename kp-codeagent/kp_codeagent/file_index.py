@@ -0,0 +1,284 @@
+"""Persistent, incremental file index for project scanning."""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .ignore import GitIgnoreMatcher
+from .walker import TreeWalk, scan_dir, walk
+
+# Directory (relative to the project root) where agent state is stored
+STATE_DIR = ".kp-codeagent"
+INDEX_FILE = "file_index.json"
+INDEX_VERSION = 1
+
+
+def _within(rel: str, root: str) -> bool:
+    """Whether the relative path ``rel`` is ``root`` or inside it."""
+    return not root or rel == root or rel.startswith(root + "/")
+
+
+def _outermost(dirs: Iterable[str]) -> List[str]:
+    """The given relative directories, without those inside another one."""
+    roots: List[str] = []
+    kept = set()
+    for rel in sorted(set(dirs), key=lambda rel: (rel.count("/"), rel)):
+        if "" in kept:
+            break
+        parts = rel.split("/")
+        if any("/".join(parts[:i]) in kept for i in range(1, len(parts))):
+            continue
+        kept.add(rel)
+        roots.append(rel)
+    return roots
+
+
+class FileIndex:
+    """
+    On-disk index of the project tree.
+
+    Every directory is stored with its own mtime and inode, plus the list of
+    subdirectories and the (size, mtime_ns, inode) of each file it contains.
+    A refresh only lists directories whose mtime changed since the last scan;
+    unchanged directories are served from the stored listing.
+    """
+
+    def __init__(
+        self,
+        root_dir: Path = None,
+        ignore_patterns: List[str] = None,
+        matcher: GitIgnoreMatcher = None
+    ):
+        self.root_dir = Path(root_dir or Path.cwd()).resolve()
+        self.matcher = matcher or GitIgnoreMatcher(self.root_dir, ignore_patterns)
+        self.index_path = self.root_dir / STATE_DIR / INDEX_FILE
+        self.dirs: Dict[str, Dict[str, Any]] = {}
+        self.built_at: Optional[float] = None
+        self.last_refresh = {"scanned_dirs": 0, "reused_dirs": 0, "removed_dirs": 0}
+
+    @property
+    def signature(self) -> str:
+        """Hash of the ignore rules; the index is discarded when they change."""
+        return self.matcher.signature()
+
+    def load(self) -> bool:
+        """Load the index from disk. Returns False if missing or outdated."""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if data.get("version") != INDEX_VERSION or data.get("signature") != self.signature:
+            return False
+
+        self.dirs = data.get("dirs", {})
+        self.built_at = data.get("built_at")
+        return True
+
+    def save(self) -> bool:
+        """Write the index to disk atomically."""
+        data = {
+            "version": INDEX_VERSION,
+            "signature": self.signature,
+            "built_at": self.built_at,
+            "dirs": self.dirs,
+        }
+
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix(".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.index_path)
+            return True
+        except OSError:
+            return False
+
+    def clear(self):
+        """Forget every indexed directory."""
+        self.dirs = {}
+        self.built_at = None
+
+    def _abs(self, rel: str) -> Path:
+        return self.root_dir / rel if rel else self.root_dir
+
+    def _scan_dir(self, rel: str, st: os.stat_result) -> Dict[str, Any]:
+        """List a single directory and record its entries."""
+        return scan_dir(self._abs(rel), rel, st, self.matcher)
+
+    def _file_changed(self, rel: str, name: str, entry: Dict[str, Any]) -> bool:
+        """Check whether a file recorded in a directory entry changed on disk."""
+        meta = entry["files"].get(name)
+        if meta is None:
+            return False
+        try:
+            st = os.stat(self._abs(rel) / name)
+        except OSError:
+            return True
+        return [st.st_size, st.st_mtime_ns, st.st_ino] != meta
+
+    def refresh(self, dirs: Iterable[str] = None) -> Dict[str, int]:
+        """
+        Bring the index up to date, rescanning only changed directories.
+
+        ``dirs`` limits the refresh to those indexed subtrees (relative
+        paths); their roots are relisted even if their mtime looks the same,
+        as a watcher saw them change and directory mtimes only move once per
+        clock tick.
+        """
+        if dirs is None:
+            roots = [""]
+        else:
+            roots = [rel for rel in _outermost(dirs) if rel in self.dirs]
+
+        scanned = reused = 0
+        seen = set()
+        # (relative dir, force rescan because a parent .gitignore changed, relist)
+        pending = [(rel, False, dirs is not None) for rel in roots]
+
+        while pending:
+            rel, force, relist = pending.pop()
+            try:
+                st = os.stat(self._abs(rel))
+            except OSError:
+                continue
+
+            old = self.dirs.get(rel)
+            unchanged = (
+                old is not None and not force and not relist
+                and old["mtime"] == st.st_mtime_ns and old["ino"] == st.st_ino
+            )
+            # Editing .gitignore in place does not touch the directory mtime
+            gitignore_changed = unchanged and self._file_changed(rel, ".gitignore", old)
+
+            if unchanged and not gitignore_changed:
+                entry = old
+                reused += 1
+            else:
+                self.matcher.invalidate(rel)
+                try:
+                    entry = self._scan_dir(rel, st)
+                except OSError:
+                    # Permission denied or vanished while scanning
+                    continue
+                if old is not None:
+                    gitignore_changed = gitignore_changed or (
+                        old["files"].get(".gitignore") != entry["files"].get(".gitignore")
+                    )
+                self.dirs[rel] = entry
+                scanned += 1
+
+            seen.add(rel)
+            child_force = force or gitignore_changed
+            pending.extend(
+                (f"{rel}/{name}" if rel else name, child_force, False) for name in entry["dirs"]
+            )
+
+        removed = [
+            rel for rel in self.dirs
+            if rel not in seen and any(_within(rel, root) for root in roots)
+        ]
+        for rel in removed:
+            del self.dirs[rel]
+
+        if scanned or removed or self.built_at is None:
+            self.built_at = time.time()
+
+        self.last_refresh = {
+            "scanned_dirs": scanned,
+            "reused_dirs": reused,
+            "removed_dirs": len(removed),
+        }
+        return self.last_refresh
+
+    def update_files(self, paths: Iterable[str]) -> int:
+        """
+        Record the current size and mtime of indexed files (relative paths)
+        edited in place, which leaves their directory's mtime alone. New and
+        deleted files are picked up by relisting their directory instead.
+        Returns how many entries changed.
+        """
+        updated = 0
+        for path in paths:
+            rel, _, name = path.rpartition("/")
+            entry = self.dirs.get(rel)
+            if entry is None or name not in entry["files"]:
+                continue
+            try:
+                st = os.stat(self._abs(rel) / name)
+            except OSError:
+                continue
+
+            meta = [st.st_size, st.st_mtime_ns, st.st_ino]
+            if meta != entry["files"][name]:
+                # Entries are replaced, never edited, so a watcher sweeping
+                # a previous one is not disturbed
+                files = dict(entry["files"])
+                files[name] = meta
+                self.dirs[rel] = dict(entry, files=files)
+                updated += 1
+
+        return updated
+
+    def files_under(self, roots: Iterable[str]) -> Iterator[Path]:
+        """Absolute paths of the indexed files in the given subtrees."""
+        roots = _outermost(roots)
+        for rel, entry in self.dirs.items():
+            if any(_within(rel, root) for root in roots):
+                directory = self._abs(rel)
+                for name in entry["files"]:
+                    yield directory / name
+
+    def update(self) -> Dict[str, int]:
+        """Load, refresh and save the index in one step."""
+        self.load()
+        try:
+            # Create the state directory first so it does not dirty the root
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            pass
+        stats = self.refresh()
+        if stats["scanned_dirs"] or stats["removed_dirs"] or not self.index_path.exists():
+            self.save()
+        return stats
+
+    def walk(self, max_depth: int = 3) -> TreeWalk:
+        """Tree, files and directory stats from the stored index, in one pass."""
+        return walk(self.root_dir, self.dirs.get, max_depth)
+
+    def iter_files(self) -> Iterator[Tuple[Path, List[int]]]:
+        """Yield (absolute path, [size, mtime_ns, inode]) in depth-first order."""
+        yield from self.walk(max_depth=0).files
+
+    def render_tree(self, max_depth: int = 3) -> str:
+        """Render the indexed tree in the same format as ContextBuilder."""
+        return self.walk(max_depth).tree
+
+    def status(self) -> Dict[str, Any]:
+        """Summarize the stored index without rescanning it."""
+        loaded = self.load()
+        stale = 0
+
+        for rel, entry in self.dirs.items():
+            try:
+                st = os.stat(self._abs(rel))
+            except OSError:
+                stale += 1
+                continue
+            if st.st_mtime_ns != entry["mtime"] or st.st_ino != entry["ino"]:
+                stale += 1
+
+        return {
+            "path": str(self.index_path),
+            "exists": loaded,
+            "built_at": self.built_at,
+            "dirs": len(self.dirs),
+            "files": sum(len(entry["files"]) for entry in self.dirs.values()),
+            "bytes": sum(
+                meta[0] for entry in self.dirs.values() for meta in entry["files"].values()
+            ),
+            "stale_dirs": stale,
+        }
@@ -0,0 +1,127 @@
+"""Memoized backend health checks."""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from .file_index import STATE_DIR
+from .transport import get_transport, ollama_url
+
+HEALTH_FILE = "health.json"
+
+# Seconds to wait for a health check; a local server answers in milliseconds
+PROBE_TIMEOUT = 2
+# Seconds a successful check is trusted, in this and later processes
+DEFAULT_HEALTH_TTL = 30
+
+_memo: Dict[str, Tuple[float, Any]] = {}
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _ttl() -> float:
+    try:
+        return float(os.getenv("KP_HEALTH_TTL", DEFAULT_HEALTH_TTL))
+    except ValueError:
+        return DEFAULT_HEALTH_TTL
+
+
+def _state_path() -> Path:
+    return Path.cwd() / STATE_DIR / HEALTH_FILE
+
+
+def _load_state() -> Dict[str, Any]:
+    try:
+        with open(_state_path(), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(state: Dict[str, Any]):
+    path = _state_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def probe(key: str, check: Callable[[], Any]) -> Any:
+    """
+    Result of a health check, run at most once per KP_HEALTH_TTL seconds.
+
+    Results are memoized in the process. Successful results (anything but
+    None) are also written to ``.kp-codeagent/health.json`` so the next run
+    can skip the check; failures are only remembered by this process, so a
+    server started in the meantime is noticed right away.
+    """
+    with _locks_guard:
+        lock = _locks.setdefault(key, threading.Lock())
+
+    # Concurrent callers for the same key wait for one check
+    with lock:
+        now = time.time()
+        ttl = _ttl()
+
+        cached = _memo.get(key)
+        if cached is not None and now - cached[0] < ttl:
+            return cached[1]
+
+        stored = _load_state().get(key)
+        if isinstance(stored, list) and len(stored) == 2 and 0 <= now - stored[0] < ttl:
+            _memo[key] = (stored[0], stored[1])
+            return stored[1]
+
+        result = check()
+        _memo[key] = (now, result)
+
+        if result is not None:
+            state = _load_state()
+            state = {k: v for k, v in state.items() if isinstance(v, list) and now - v[0] < ttl}
+            state[key] = [now, result]
+            _save_state(state)
+
+        return result
+
+
+def forget(key: str):
+    """Drop a memoized result, e.g. after the state it describes changed."""
+    _memo.pop(key, None)
+    state = _load_state()
+    if state.pop(key, None) is not None:
+        _save_state(state)
+
+
+def _tags_key(base_url: Optional[str]) -> str:
+    return f"ollama:{ollama_url(base_url)}"
+
+
+def ollama_models(base_url: Optional[str] = None) -> Optional[List[str]]:
+    """
+    Names of the models installed in an Ollama server, or None if it is not
+    reachable. One ``GET /api/tags`` answers both "is it running" and "is
+    the model installed", so every caller shares it.
+    """
+    def check():
+        try:
+            data = get_transport(base_url).tags(timeout=PROBE_TIMEOUT)
+            return [m.get('name', '') for m in data.get('models', [])]
+        except (requests.exceptions.RequestException, ValueError):
+            return None
+
+    return probe(_tags_key(base_url), check)
+
+
+def forget_ollama(base_url: Optional[str] = None):
+    """Invalidate the cached model list of an Ollama server."""
+    forget(_tags_key(base_url))
@@ -2,6 +2,7 @@
 
 import os
 import json
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, Any
 
@@ -11,6 +12,40 @@ DEFAULT_LANG = "en"
 # Supported languages
 SUPPORTED_LANGUAGES = ["en", "es"]
 
+TRANSLATIONS_DIR = Path(__file__).parent / "translations"
+
+
+def _flatten(tree: Dict[str, Any], prefix: str, catalog: Dict[str, Any]):
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            _flatten(value, f"{prefix}{key}.", catalog)
+        else:
+            catalog[prefix + key] = value
+
+
+@lru_cache(maxsize=None)
+def load_catalog(lang: str) -> Dict[str, Any]:
+    """
+    Translations for a language, flattened to dotted keys
+    ({"welcome.title": ...}); read once per process.
+    """
+    translation_file = TRANSLATIONS_DIR / f"{lang}.json"
+
+    if not translation_file.exists():
+        # Fallback to English
+        translation_file = TRANSLATIONS_DIR / "en.json"
+
+    try:
+        with open(translation_file, 'r', encoding='utf-8') as f:
+            tree = json.load(f)
+    except Exception:
+        # Return empty dict if loading fails
+        return {}
+
+    catalog: Dict[str, Any] = {}
+    _flatten(tree, "", catalog)
+    return catalog
+
 
 class I18n:
     """Handle translations for KP Code Agent."""
@@ -18,7 +53,7 @@ class I18n:
     def __init__(self, lang: str = None):
         """Initialize with a specific language."""
         self.lang = lang or self._detect_language()
-        self.translations = self._load_translations()
+        self.catalog = load_catalog(self.lang)
 
     def _detect_language(self) -> str:
         """Detect system language."""
@@ -31,22 +66,6 @@ class I18n:
         else:
             return "en"
 
-    def _load_translations(self) -> Dict[str, Any]:
-        """Load translation file for the current language."""
-        translations_dir = Path(__file__).parent / "translations"
-        translation_file = translations_dir / f"{self.lang}.json"
-
-        if not translation_file.exists():
-            # Fallback to English
-            translation_file = translations_dir / "en.json"
-
-        try:
-            with open(translation_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception:
-            # Return empty dict if loading fails
-            return {}
-
     def t(self, key: str, **kwargs) -> str:
         """
         Translate a key with optional formatting.
@@ -58,19 +77,8 @@ class I18n:
         Returns:
             Translated and formatted string
         """
-        # Navigate nested dictionary using dot notation
-        keys = key.split('.')
-        value = self.translations
-
-        for k in keys:
-            if isinstance(value, dict):
-                value = value.get(k, key)
-            else:
-                return key
-
-        # If value is still a dict, return the key
-        if isinstance(value, dict):
-            return key
+        # Unknown keys, and keys of whole sections, come back unchanged
+        value = self.catalog.get(key, key)
 
         # Format with kwargs if provided
         if kwargs:
@@ -85,7 +93,7 @@ class I18n:
         """Change the current language."""
         if lang in SUPPORTED_LANGUAGES:
             self.lang = lang
-            self.translations = self._load_translations()
+            self.catalog = load_catalog(lang)
 
 
 # Global instance
@@ -0,0 +1,286 @@
+"""Compiled gitignore matching for project scanning."""
+
+import hashlib
+import re
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Always ignored, with lower priority than any .gitignore rule
+DEFAULT_IGNORES = [
+    '__pycache__', '.git', 'node_modules', '.venv', 'venv',
+    '.kp-codeagent', '.kp-codeagent-backups', '.idea', '.vscode',
+    '*.pyc', '*.pyo', '*.so', '*.dll', '*.exe', '*.bin',
+    '*.jpg', '*.png', '*.gif', '*.pdf'
+]
+
+_GLOB_CHARS = re.compile(r'[*?\[\\]')
+
+# (rule index, negated, directory only)
+Rule = Tuple[int, bool, bool]
+
+
+def _translate_glob(pattern: str) -> str:
+    """Translate a gitignore glob (without anchoring) into a regex body."""
+    out = []
+    i, n = 0, len(pattern)
+
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i):
+                at_start = i == 0 or pattern[i - 1] == '/'
+                at_end = i + 2 == n or pattern[i + 2] == '/'
+                if at_start and at_end:
+                    if i + 2 == n:
+                        # Trailing "/**": everything inside
+                        out.append('.*')
+                    else:
+                        # Leading "**/" or inner "/**/": zero or more directories
+                        out.append('(?:.*/)?')
+                        i += 1
+                    i += 2
+                    continue
+                # "**" glued to other characters behaves like "*"
+                i += 1
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            j = i + 1
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            end = pattern.find(']', j)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end].replace('\\', '\\\\')
+                if body[:1] in ('!', '^'):
+                    body = '^' + body[1:]
+                out.append(f'[{body}]')
+                i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+
+    return ''.join(out)
+
+
+class IgnoreRuleSet:
+    """
+    The rules of a single .gitignore, compiled for fast lookups.
+
+    Literal names (``build``), extension globs (``*.log``) and literal
+    anchored paths (``/docs/api``) are stored in hash tables. Remaining globs
+    are merged into alternation regexes, bucketed by their first path
+    segment when it is literal, and ordered so the first hit is the last rule.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self._literals: Dict[str, List[Rule]] = {}
+        self._suffixes: Dict[str, List[Rule]] = {}
+        self._paths: Dict[str, List[Rule]] = {}
+        self._regex_rules: Dict[str, Rule] = {}
+        buckets: Dict[Optional[str], List[Tuple[int, str, bool]]] = {}
+
+        for line in patterns:
+            parsed = self._parse(line)
+            if parsed is None:
+                continue
+
+            body, negate, dir_only = parsed
+            index = len(self.patterns)
+            self.patterns.append(line.rstrip('\r\n'))
+            rule = (index, negate, dir_only)
+
+            anchored = '/' in body
+            body = body.lstrip('/')
+            has_glob = _GLOB_CHARS.search(body) is not None
+
+            if not anchored and not has_glob:
+                self._literals.setdefault(body, []).append(rule)
+            elif not anchored and body.startswith('*') and not _GLOB_CHARS.search(body[1:]):
+                self._suffixes.setdefault(body[1:], []).append(rule)
+            elif anchored and not has_glob:
+                self._paths.setdefault(body, []).append(rule)
+            else:
+                regex = _translate_glob(body)
+                first = body.split('/', 1)[0]
+                if not anchored or _GLOB_CHARS.search(first):
+                    key = None
+                    if not anchored:
+                        regex = '(?:.*/)?' + regex
+                else:
+                    key = first
+                self._regex_rules[f'r{index}'] = rule
+                buckets.setdefault(key, []).append((index, regex, dir_only))
+
+        self._suffix_lengths = sorted({len(s) for s in self._suffixes}, reverse=True)
+
+        # Highest index first so the first alternative that matches is the
+        # last matching rule, which is the one that decides in gitignore
+        self._regexes = {}
+        for key, parts in buckets.items():
+            parts.sort(reverse=True)
+            self._regexes[key] = (
+                self._combine(parts),
+                self._combine([p for p in parts if not p[2]]),
+            )
+
+    @staticmethod
+    def _parse(line: str) -> Optional[Tuple[str, bool, bool]]:
+        """Return (pattern, negated, directory only) or None for blank lines."""
+        # Trailing spaces are dropped unless escaped with a backslash
+        line = re.sub(r'(?<!\\) +$', '', line.rstrip('\r\n'))
+
+        if not line or line.startswith('#'):
+            return None
+
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        elif line.startswith('\\!') or line.startswith('\\#'):
+            line = line[1:]
+
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            return None
+
+        return line, negate, dir_only
+
+    @staticmethod
+    def _combine(parts: List[Tuple[int, str, bool]]):
+        if not parts:
+            return None
+        alternatives = '|'.join(f'(?P<r{index}>{regex})' for index, regex, _ in parts)
+        return re.compile(f'(?:{alternatives})\\Z')
+
+    def match(self, rel_path: str, name: str, is_dir: bool) -> Optional[bool]:
+        """
+        Match a path relative to this .gitignore's directory.
+
+        Returns True if ignored, False if re-included by a negation,
+        or None if no rule matches.
+        """
+        best: Optional[Rule] = None
+        candidates = list(self._literals.get(name, ()))
+
+        for length in self._suffix_lengths:
+            if length <= len(name):
+                candidates.extend(self._suffixes.get(name[-length:], ()))
+
+        if self._paths:
+            candidates.extend(self._paths.get(rel_path, ()))
+
+        for key in (None, rel_path.split('/', 1)[0]):
+            regexes = self._regexes.get(key)
+            regex = regexes and regexes[0 if is_dir else 1]
+            if regex:
+                m = regex.match(rel_path)
+                if m is not None:
+                    candidates.append(self._regex_rules[m.lastgroup])
+
+        for rule in candidates:
+            if (is_dir or not rule[2]) and (best is None or rule[0] > best[0]):
+                best = rule
+
+        if best is None:
+            return None
+        return not best[1]
+
+
+class GitIgnoreMatcher:
+    """
+    Gitignore-compatible matcher for a project tree.
+
+    Built-in defaults have the lowest priority, then the root .gitignore,
+    then nested .gitignore files, which are loaded lazily the first time a
+    path below their directory is matched.
+    """
+
+    def __init__(self, root_dir: Path = None, extra_patterns: List[str] = None):
+        self.root_dir = Path(root_dir or Path.cwd()).resolve()
+        self.defaults = IgnoreRuleSet(DEFAULT_IGNORES + list(extra_patterns or []))
+        self._rulesets: Dict[str, Optional[IgnoreRuleSet]] = {}
+        # Paths matched and seconds spent matching them (run metrics)
+        self.matched = 0
+        self.seconds = 0.0
+
+    def _load(self, dir_rel: str) -> Optional[IgnoreRuleSet]:
+        if dir_rel in self._rulesets:
+            return self._rulesets[dir_rel]
+
+        gitignore_path = (self.root_dir / dir_rel if dir_rel else self.root_dir) / '.gitignore'
+        ruleset = None
+        try:
+            with open(gitignore_path, 'r', encoding='utf-8', errors='ignore') as f:
+                ruleset = IgnoreRuleSet(f)
+            if not ruleset.patterns:
+                ruleset = None
+        except OSError:
+            pass
+
+        self._rulesets[dir_rel] = ruleset
+        return ruleset
+
+    def mark_missing(self, dir_rel: str):
+        """Record that a directory has no .gitignore, so it is never opened."""
+        self._rulesets.setdefault(dir_rel, None)
+
+    def invalidate(self, dir_rel: str = None):
+        """Forget cached .gitignore rules for one directory (or all of them)."""
+        if dir_rel is None:
+            self._rulesets.clear()
+        else:
+            self._rulesets.pop(dir_rel, None)
+
+    def signature(self) -> str:
+        """Hash of the default and root rules, used to invalidate caches."""
+        root = self._load('')
+        data = self.defaults.patterns + (root.patterns if root else [])
+        return hashlib.sha1("\n".join(data).encode("utf-8")).hexdigest()
+
+    def match(self, rel_path: str, is_dir: bool) -> bool:
+        """
+        Check a single path (POSIX, relative to the root).
+
+        Parent directories are not checked; walkers are expected to prune
+        ignored directories, which mirrors how git itself treats them.
+        """
+        start = time.perf_counter()
+        try:
+            return self._match(rel_path, is_dir)
+        finally:
+            self.matched += 1
+            self.seconds += time.perf_counter() - start
+
+    def _match(self, rel_path: str, is_dir: bool) -> bool:
+        name = rel_path.rsplit('/', 1)[-1]
+        parts = rel_path.split('/')[:-1]
+
+        # Deepest .gitignore first; the first one with an opinion decides
+        for depth in range(len(parts), -1, -1):
+            dir_rel = '/'.join(parts[:depth])
+            ruleset = self._load(dir_rel)
+            if ruleset is None:
+                continue
+            result = ruleset.match('/'.join(parts[depth:] + [name]), name, is_dir)
+            if result is not None:
+                return result
+
+        return bool(self.defaults.match(rel_path, name, is_dir))
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """Check a path and all of its parent directories."""
+        parts = rel_path.strip('/').split('/')
+        for depth in range(1, len(parts)):
+            if self.match('/'.join(parts[:depth]), True):
+                return True
+        return self.match('/'.join(parts), is_dir)
@@ -1,32 +1,80 @@
 """Unified LLM client supporting multiple backends."""
 
+import importlib.util
+import json
 import os
-from typing import Iterator, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Type
 from abc import ABC, abstractmethod
 
-# Import various clients conditionally
-try:
-    import requests
-    HAS_REQUESTS = True
-except ImportError:
-    HAS_REQUESTS = False
+from .errors import LLMError, classify_error, http_error
+from .health import ollama_models
+from .profiling import trace_stream
+from .rate_limit import RateLimiter, rate_limiter_for, response_headers
+from .transport import get_transport
+from .response_cache import ResponseCache
+from .tokenizer import DEFAULT_OLLAMA_NUM_CTX, Tokenizer, context_window, get_tokenizer
 
-try:
-    import openai
-    HAS_OPENAI = True
-except ImportError:
-    HAS_OPENAI = False
+# The SDKs are optional, and slow to import (pydantic models for the whole
+# API), so they are only located here and imported when a client is built
+HAS_OPENAI = importlib.util.find_spec("openai") is not None
+HAS_GROQ = importlib.util.find_spec("groq") is not None
 
-try:
-    from groq import Groq
-    HAS_GROQ = True
-except ImportError:
-    HAS_GROQ = False
+# How long Ollama keeps the model (and its prompt cache) loaded after a call
+DEFAULT_KEEP_ALIVE = "10m"
+
+
+def usage_stats(usage: Any) -> Dict[str, int]:
+    """Token counts from an OpenAI-style usage object, with cached prompt tokens."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+    }
+
+
+def chat_messages(prompt: str, system: Optional[str] = None) -> List[Dict[str, str]]:
+    """Chat completion messages for a prompt and optional system prompt."""
+    messages = []
+    if system:
+        messages.append({"role": "system", "content": system})
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+def chunk_text(chunk: Any) -> str:
+    """Text of a streamed chat completion chunk ('' for the usage chunk)."""
+    if chunk.choices and chunk.choices[0].delta.content:
+        return chunk.choices[0].delta.content
+    return ""
+
+
+def chunk_usage(chunk: Any) -> Any:
+    """Usage of a streamed chunk: OpenAI's ``usage`` or Groq's ``x_groq.usage``."""
+    return getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+
+
+def ollama_http_error(status: int, body: str, headers: Any = None) -> LLMError:
+    """LLMError for a failed Ollama request, with the message from its JSON body."""
+    try:
+        message = json.loads(body).get("error", "")
+    except (ValueError, AttributeError):
+        message = body.strip()[:200]
+    return http_error(status, message, "ollama", headers)
 
 
 class LLMBackend(ABC):
     """Abstract base class for LLM backends."""
 
+    name = "base"
+    # Whether generate() accepts the ``context`` returned by an earlier call
+    supports_context = False
+    # Final metadata of the last generation (timings, token counts), if any
+    last_response: Optional[Dict[str, Any]] = None
+    # Client-side scheduler for a hosted API's rate limits (None = unlimited)
+    rate_limiter: Optional[RateLimiter] = None
+
     @abstractmethod
     def is_available(self) -> bool:
         """Check if this backend is available."""
@@ -43,70 +91,178 @@ class LLMBackend(ABC):
         """Generate text with streaming."""
         pass
 
+    @property
+    def context_window(self) -> int:
+        """Maximum prompt plus answer size, in tokens."""
+        return context_window(self.model)
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        """Tokenizer used to budget prompts for this backend's model."""
+        return get_tokenizer(self.model)
+
+    def throttle(self, prompt: str, system: Optional[str] = None) -> int:
+        """
+        Wait until the rate limiter has room for a request, if there is one.
+        Returns the prompt's estimated token count, for ``track_rate_limits``.
+        """
+        estimate = self.tokenizer.count((system or "") + prompt)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(estimate)
+        return estimate
+
+    def track_rate_limits(
+        self,
+        source: Any = None,
+        estimate: int = None,
+        usage: Optional[Dict[str, int]] = None,
+        error: Optional[LLMError] = None
+    ):
+        """
+        Feed the rate limiter what a response told us: the limit headers of
+        ``source`` (an SDK stream or exception), the real token usage once
+        the stream is done, and the Retry-After of a 429.
+        """
+        if self.rate_limiter is None:
+            return
+        self.rate_limiter.observe(response_headers(source))
+        if usage and estimate is not None:
+            self.rate_limiter.settle(estimate, usage["prompt_tokens"] + usage["completion_tokens"])
+        if error is not None and error.kind == "rate_limit":
+            self.rate_limiter.penalize(error.retry_after)
+
 
 class OllamaBackend(LLMBackend):
     """Ollama backend (local)."""
 
-    def __init__(self, base_url: str = "http://localhost:11434", model: str = "codellama:7b"):
-        self.base_url = base_url
+    name = "ollama"
+    supports_context = True
+
+    def __init__(
+        self,
+        base_url: str = None,
+        model: str = "codellama:7b",
+        num_ctx: int = None,
+        keep_alive: str = None
+    ):
+        self.transport = get_transport(base_url)
+        self.base_url = self.transport.base_url
         self.model = model
+        self.num_ctx = num_ctx or int(os.getenv("KP_NUM_CTX", DEFAULT_OLLAMA_NUM_CTX))
+        self.keep_alive = keep_alive or os.getenv("KP_KEEP_ALIVE", DEFAULT_KEEP_ALIVE)
+
+    @property
+    def context_window(self) -> int:
+        # Ollama truncates prompts to num_ctx, whatever the model supports
+        return min(self.num_ctx, context_window(self.model))
 
     def is_available(self) -> bool:
-        if not HAS_REQUESTS:
-            return False
-        try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=2)
-            return response.status_code == 200
-        except:
-            return False
+        return ollama_models(self.base_url) is not None
 
-    def generate(
+    def build_payload(
         self,
         prompt: str,
         system: Optional[str] = None,
         temperature: float = 0.7,
-        timeout: int = 120
-    ) -> Iterator[str]:
-        """Generate using Ollama API."""
-        import json
-
+        context: Optional[List[int]] = None
+    ) -> Dict[str, Any]:
+        """Body of a streaming /api/generate request."""
         payload = {
             "model": self.model,
             "prompt": prompt,
             "temperature": temperature,
-            "stream": True
+            "stream": True,
+            "keep_alive": self.keep_alive,
+            "options": {"num_ctx": self.context_window}
         }
 
         if system:
             payload["system"] = system
+        if context:
+            payload["context"] = context
 
-        try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json=payload,
-                stream=True,
-                timeout=timeout
-            )
+        return payload
 
-            for line in response.iter_lines():
-                if line:
-                    data = json.loads(line)
-                    if 'response' in data:
-                        yield data['response']
-                    if data.get('done', False):
-                        break
+    def generate(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+        timeout: int = 120,
+        context: Optional[List[int]] = None
+    ) -> Iterator[str]:
+        """
+        Generate using Ollama API.
+
+        ``context`` is the token list returned by an earlier call (see
+        ``last_response``): the new prompt continues that conversation, and
+        Ollama only evaluates the new tokens as long as the model is still
+        loaded. The options must match the earlier call, or Ollama reloads
+        the model and its cache is lost.
+        """
+        payload = self.build_payload(prompt, system, temperature, context)
+
+        self.last_response = None
+        try:
+            response = self.transport.stream("/api/generate", payload, timeout=timeout)
+            if response.status_code >= 400:
+                raise ollama_http_error(response.status_code, response.text, response.headers)
+
+            for data in self.transport.iter_json(response):
+                if 'error' in data:
+                    raise LLMError(data['error'], self.name, kind="server")
+                if 'response' in data:
+                    yield data['response']
+                if data.get('done', False):
+                    self.last_response = data
+                    break
         except Exception as e:
-            yield f"\n[Error: {e}]"
+            raise classify_error(e, self.name) from e
 
 
-class OpenAIBackend(LLMBackend):
+class SDKBackend(LLMBackend):
+    """
+    Backend built on a vendor SDK. The SDK client is created on first use,
+    so configuring the backend (e.g. as a fallback) does not import it.
+    """
+
+    # Environment variable holding the API key
+    key_env = ""
+    _client = None
+
+    def __init__(self, api_key: str = None, installed: bool = False):
+        self.api_key = api_key or os.getenv(self.key_env)
+        if installed and not self.api_key:
+            raise ValueError(f"No {self.name} API key (set {self.key_env})")
+
+    def create_client(self) -> Any:
+        raise NotImplementedError
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            self._client = self.create_client()
+        return self._client
+
+    @client.setter
+    def client(self, value: Any):
+        self._client = value
+
+
+class OpenAIBackend(SDKBackend):
     """OpenAI API backend."""
 
+    name = "openai"
+    key_env = "OPENAI_API_KEY"
+
     def __init__(self, api_key: str = None, model: str = "gpt-3.5-turbo"):
-        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        super().__init__(api_key, HAS_OPENAI)
         self.model = model
-        if HAS_OPENAI:
-            self.client = openai.OpenAI(api_key=self.api_key)
+        self.rate_limiter = rate_limiter_for(self.api_key)
+
+    def create_client(self) -> Any:
+        import openai
+        return openai.OpenAI(api_key=self.api_key)
 
     def is_available(self) -> bool:
         return HAS_OPENAI and self.api_key is not None
@@ -118,36 +274,50 @@ class OpenAIBackend(LLMBackend):
         temperature: float = 0.7,
         timeout: int = 120
     ) -> Iterator[str]:
-        """Generate using OpenAI API."""
-        messages = []
-        if system:
-            messages.append({"role": "system", "content": system})
-        messages.append({"role": "user", "content": prompt})
-
+        """Generate using OpenAI API, within the key's rate limits."""
+        estimate = self.throttle(prompt, system)
+        usage = None
         try:
             stream = self.client.chat.completions.create(
                 model=self.model,
-                messages=messages,
+                messages=chat_messages(prompt, system),
                 temperature=temperature,
                 stream=True,
+                stream_options={"include_usage": True},
                 timeout=timeout
             )
+            self.track_rate_limits(stream)
 
             for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+                # The usage chunk comes last, with no choices
+                if chunk_usage(chunk):
+                    usage = self.last_response = usage_stats(chunk_usage(chunk))
+                text = chunk_text(chunk)
+                if text:
+                    yield text
         except Exception as e:
-            yield f"\n[Error: {e}]"
+            error = classify_error(e, self.name)
+            self.track_rate_limits(e, error=error)
+            raise error from e
 
+        self.track_rate_limits(None, estimate, usage)
 
-class GroqBackend(LLMBackend):
+
+class GroqBackend(SDKBackend):
     """Groq API backend (fast and free)."""
 
+    name = "groq"
+    key_env = "GROQ_API_KEY"
+
     def __init__(self, api_key: str = None, model: str = "llama-3.3-70b-versatile"):
-        self.api_key = api_key or os.getenv("GROQ_API_KEY")
+        super().__init__(api_key, HAS_GROQ)
         self.model = model
-        if HAS_GROQ:
-            self.client = Groq(api_key=self.api_key)
+        # Groq's request limit is per day; its token limit is per minute
+        self.rate_limiter = rate_limiter_for(self.api_key, request_window=24 * 3600)
+
+    def create_client(self) -> Any:
+        from groq import Groq
+        return Groq(api_key=self.api_key)
 
     def is_available(self) -> bool:
         return HAS_GROQ and self.api_key is not None
@@ -159,40 +329,110 @@ class GroqBackend(LLMBackend):
         temperature: float = 0.7,
         timeout: int = 120
     ) -> Iterator[str]:
-        """Generate using Groq API."""
-        messages = []
-        if system:
-            messages.append({"role": "system", "content": system})
-        messages.append({"role": "user", "content": prompt})
-
+        """Generate using Groq API, within the key's rate limits."""
+        estimate = self.throttle(prompt, system)
+        usage = None
         try:
             stream = self.client.chat.completions.create(
                 model=self.model,
-                messages=messages,
+                messages=chat_messages(prompt, system),
                 temperature=temperature,
                 stream=True,
                 timeout=timeout
             )
+            self.track_rate_limits(stream)
 
             for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+                # Groq reports usage in the last chunk, under x_groq
+                if chunk_usage(chunk):
+                    usage = self.last_response = usage_stats(chunk_usage(chunk))
+                text = chunk_text(chunk)
+                if text:
+                    yield text
         except Exception as e:
-            yield f"\n[Error: {e}]"
+            error = classify_error(e, self.name)
+            self.track_rate_limits(e, error=error)
+            raise error from e
+
+        self.track_rate_limits(None, estimate, usage)
+
+
+# Backends by name, in order of preference for "auto" and failover
+BACKENDS: Dict[str, Type[LLMBackend]] = {
+    "groq": GroqBackend,
+    "openai": OpenAIBackend,
+    "ollama": OllamaBackend,
+}
 
 
 class UnifiedLLMClient:
     """Unified client that can use multiple backends."""
 
-    def __init__(self, backend: str = "auto", **kwargs):
+    def __init__(
+        self,
+        backend: str = "auto",
+        cache: Optional[ResponseCache] = None,
+        use_async: bool = None,
+        failover: bool = None,
+        **kwargs
+    ):
         """
         Initialize with a specific backend or auto-detect.
 
+        Requests go through a ``Router`` that retries transient errors and,
+        unless ``failover`` is off, falls back to the other backends that
+        are configured (API key set, Ollama running) in order of preference.
+
         Args:
             backend: "ollama", "openai", "groq", or "auto"
+            cache: Response cache to replay identical requests from (optional)
+            use_async: Stream through the asyncio backends (default: KP_ASYNC=1)
+            failover: Fall back to other backends (default: KP_FAILOVER, on)
             **kwargs: Backend-specific parameters
         """
-        self.backend = self._create_backend(backend, **kwargs)
+        from .router import Router
+
+        primary = self._create_backend(backend, **kwargs)
+        self.cache = cache
+
+        if use_async is None:
+            use_async = os.getenv("KP_ASYNC", "0") == "1"
+        if failover is None:
+            failover = os.getenv("KP_FAILOVER", "1") != "0"
+
+        backends = [primary]
+        if failover:
+            backends += self._fallback_backends(primary)
+        if use_async:
+            backends = [self._async_wrap(instance) for instance in backends]
+
+        self.backend = Router(backends)
+
+    @staticmethod
+    def _async_wrap(backend: LLMBackend) -> LLMBackend:
+        from .async_llm import SyncBackend, async_backend
+        try:
+            return SyncBackend(async_backend(backend))
+        except ValueError:
+            # No async client installed for this backend; stay synchronous
+            return backend
+
+    @staticmethod
+    def _fallback_backends(primary: LLMBackend) -> List[LLMBackend]:
+        """
+        Other backends with their default settings, in order of preference.
+        They are only probed when the router actually needs one.
+        """
+        fallbacks = []
+        for backend_class in BACKENDS.values():
+            if isinstance(primary, backend_class):
+                continue
+            try:
+                fallbacks.append(backend_class())
+            except Exception:
+                # Missing API key or SDK
+                continue
+        return fallbacks
 
     def _create_backend(self, backend: str, **kwargs) -> LLMBackend:
         """Create the appropriate backend."""
@@ -201,29 +441,36 @@ class UnifiedLLMClient:
 
         if backend == "auto":
             # Try backends in order of preference
-            backends_to_try = [
-                ("groq", lambda: GroqBackend(**filtered_kwargs)),
-                ("openai", lambda: OpenAIBackend(**filtered_kwargs)),
-                ("ollama", lambda: OllamaBackend(**filtered_kwargs)),
-            ]
-
-            for name, creator in backends_to_try:
+            candidates = []
+            for name, backend_class in BACKENDS.items():
                 try:
-                    backend_instance = creator()
-                    if backend_instance.is_available():
-                        print(f"✓ Using {name} backend")
-                        return backend_instance
+                    candidates.append((name, backend_class(**filtered_kwargs)))
                 except Exception:
                     continue
 
+            # Probe every backend at once and take the first available one
+            # in order of preference, without waiting for slower probes
+            executor = ThreadPoolExecutor(max_workers=len(candidates) or 1)
+            try:
+                probes = [
+                    (name, instance, executor.submit(instance.is_available))
+                    for name, instance in candidates
+                ]
+                for name, instance, future in probes:
+                    try:
+                        available = future.result()
+                    except Exception:
+                        continue
+                    if available:
+                        print(f"✓ Using {name} backend")
+                        return instance
+            finally:
+                executor.shutdown(wait=False)
+
             raise RuntimeError("No LLM backend available. Install Ollama or set API keys.")
 
-        elif backend == "ollama":
-            return OllamaBackend(**filtered_kwargs)
-        elif backend == "openai":
-            return OpenAIBackend(**filtered_kwargs)
-        elif backend == "groq":
-            return GroqBackend(**filtered_kwargs)
+        elif backend in BACKENDS:
+            return BACKENDS[backend](**filtered_kwargs)
         else:
             raise ValueError(f"Unknown backend: {backend}")
 
@@ -232,15 +479,77 @@ class UnifiedLLMClient:
         prompt: str,
         system: Optional[str] = None,
         temperature: float = 0.7,
-        timeout: int = 120
+        timeout: int = 120,
+        context: Optional[List[int]] = None
     ) -> Iterator[str]:
-        """Generate text using the configured backend."""
-        return self.backend.generate(prompt, system, temperature, timeout)
+        """
+        Generate text using the configured backend.
+
+        With a response cache, a request identical to an earlier one is
+        replayed from disk; otherwise the stream is stored once it completes
+        without an error. ``context`` continues an earlier generation on
+        backends that support it (see ``last_context``).
+        """
+        self.backend.last_response = None
+        if context and self.backend.supports_context:
+            stream = self.backend.generate(prompt, system, temperature, timeout, context=context)
+        else:
+            stream = self.backend.generate(prompt, system, temperature, timeout)
+
+        cached = None
+        if self.cache is not None:
+            key = self.cache.key(
+                self.backend.name, self.backend.model, system, prompt, temperature, context
+            )
+            cached = self.cache.get(key)
+            if cached is not None:
+                stream.close()
+                stream = self.cache.replay(cached)
+            else:
+                # Keyed once the stream ends: a failover or hedge may have
+                # answered instead of the backend that was asked
+                stream = self.cache.record(lambda: self.cache.key(
+                    self.answered.name, self.answered.model, system, prompt, temperature, context
+                ), stream)
+
+        return trace_stream(
+            "llm.generate", stream,
+            backend=lambda: self.answered.name, model=lambda: self.answered.model,
+            cached=cached is not None
+        )
+
+    @property
+    def answered(self) -> LLMBackend:
+        """Backend that produced the last answer; the configured one unless it failed over."""
+        return getattr(self.backend, "answered", None) or self.backend
+
+    @property
+    def last_response(self) -> Optional[Dict[str, Any]]:
+        """Final metadata of the last generation; None if it was replayed from cache."""
+        return self.backend.last_response
+
+    @property
+    def last_context(self) -> Optional[List[int]]:
+        """Context to pass to ``generate`` to continue the last generation."""
+        response = self.backend.last_response
+        if not self.backend.supports_context or not response:
+            return None
+        return response.get("context") or None
 
     def is_available(self) -> bool:
         """Check if the backend is available."""
         return self.backend.is_available()
 
+    @property
+    def context_window(self) -> int:
+        """Context window of the active backend's model."""
+        return self.backend.context_window
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        """Tokenizer of the active backend's model."""
+        return self.backend.tokenizer
+
     def check_setup(self) -> tuple[bool, str]:
         """Check if the client is properly configured."""
         if self.is_available():
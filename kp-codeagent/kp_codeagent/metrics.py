@@ -0,0 +1,173 @@
+"""Per-run timings and model call metrics, exported as JSON or Prometheus text."""
+
+import contextlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .profiling import span
+from .tokenizer import Tokenizer
+from .utils import write_atomic
+
+METRIC_PREFIX = "kp_codeagent"
+
+
+def _label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_label_value(value)}"' for key, value in labels.items()) + "}"
+
+
+class RunMetrics:
+    """
+    Timings of one agent run.
+
+    - ``phases``: seconds per workflow step (setup check, context analysis,
+      plan, implementation, apply, verify); a step run twice adds up.
+    - ``context``: where context analysis went (walk, symbol and search
+      lookups, reading and scoring files, packing), plus the time spent in
+      ignore matching and token counting across those steps.
+    - ``llm_calls``: per model request, prompt and output tokens, time to
+      first token, streaming rate and total duration.
+    """
+
+    def __init__(self, command: str = "run"):
+        self.command = command
+        self.started = time.time()
+        self.phases: Dict[str, float] = {}
+        self.context: Dict[str, Any] = {}
+        self.llm_calls: List[Dict[str, Any]] = []
+        self.info: Dict[str, Any] = {}
+        self.status: Optional[str] = None
+        self.duration: Optional[float] = None
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a block as a workflow phase (and trace it under --profile)."""
+        start = time.perf_counter()
+        try:
+            with span(name, "phase"):
+                yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def track_stream(
+        self,
+        call: str,
+        stream: Iterator[str],
+        prompt_tokens: int,
+        last_response: Callable[[], Optional[Dict[str, Any]]] = None,
+        tokenizer: Tokenizer = None
+    ) -> Iterator[str]:
+        """
+        Pass a model stream through, recording the call when it ends.
+
+        Token counts reported by the backend (``last_response``) are used
+        when there are any; otherwise prompt tokens are the estimate given
+        and output tokens are counted with ``tokenizer``.
+        """
+        start = time.perf_counter()
+        first = None
+        parts: List[str] = []
+        record = {"call": call, "prompt_tokens": prompt_tokens, "status": "error"}
+
+        try:
+            for chunk in stream:
+                if first is None:
+                    first = time.perf_counter()
+                parts.append(chunk)
+                yield chunk
+            record["status"] = "ok"
+        finally:
+            end = time.perf_counter()
+            response = (last_response() if last_response else None) or {}
+            output_tokens = response.get("eval_count") or response.get("completion_tokens")
+            if output_tokens is None and tokenizer is not None:
+                output_tokens = tokenizer.count("".join(parts))
+            reported_prompt = response.get("prompt_eval_count") or response.get("prompt_tokens")
+
+            streaming = end - first if first is not None else 0.0
+            record.update({
+                "prompt_tokens": reported_prompt or prompt_tokens,
+                "output_tokens": output_tokens or 0,
+                "ttft": round(first - start, 4) if first is not None else None,
+                "duration": round(end - start, 4),
+                "tokens_per_second": (
+                    round(output_tokens / streaming, 2) if output_tokens and streaming else None
+                ),
+            })
+            self.llm_calls.append(record)
+
+    def finish(self, status: str):
+        """Mark the run done with "success", "failure" or "error"."""
+        self.status = status
+        self.duration = time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        duration = self.duration if self.duration is not None else time.perf_counter() - self._start
+        return {
+            "command": self.command,
+            "started": self.started,
+            "status": self.status,
+            "duration": round(duration, 4),
+            **self.info,
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            "context": self.context,
+            "llm_calls": self.llm_calls,
+        }
+
+    def write_json(self, path: Path):
+        write_atomic(path, json.dumps(self.to_dict(), indent=2) + "\n")
+
+    def prometheus_text(self) -> str:
+        """
+        The run as Prometheus text exposition format: gauges describing the
+        last run, as read by node_exporter's textfile collector.
+        """
+        data = self.to_dict()
+        base = {key: data[key] for key in ("backend", "model") if data.get(key)}
+        lines: List[str] = []
+
+        def gauge(name: str, help_text: str, samples: List[tuple]):
+            samples = [(labels, value) for labels, value in samples if value is not None]
+            if not samples:
+                return
+            metric = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            for labels, value in samples:
+                lines.append(f"{metric}{_labels({**base, **labels})} {value}")
+
+        gauge("last_run_timestamp_seconds", "Unix time the last run started.",
+              [({"command": data["command"]}, data["started"])])
+        gauge("run_duration_seconds", "Wall time of the last run.",
+              [({"command": data["command"], "status": data["status"] or "unknown"},
+                data["duration"])])
+        gauge("phase_duration_seconds", "Seconds per workflow phase of the last run.",
+              [({"phase": name}, seconds) for name, seconds in data["phases"].items()])
+        gauge("context_duration_seconds", "Seconds per context analysis step of the last run.",
+              [({"step": name}, seconds) for name, seconds in data["context"].items()
+               if isinstance(seconds, float)])
+
+        calls = data["llm_calls"]
+        gauge("llm_ttft_seconds", "Time to first token per model call.",
+              [({"call": c["call"]}, c["ttft"]) for c in calls])
+        gauge("llm_duration_seconds", "Total duration per model call.",
+              [({"call": c["call"]}, c["duration"]) for c in calls])
+        gauge("llm_tokens_per_second", "Output tokens per second while streaming, per model call.",
+              [({"call": c["call"]}, c["tokens_per_second"]) for c in calls])
+        gauge("llm_prompt_tokens", "Prompt tokens per model call.",
+              [({"call": c["call"]}, c["prompt_tokens"]) for c in calls])
+        gauge("llm_output_tokens", "Output tokens per model call.",
+              [({"call": c["call"]}, c["output_tokens"]) for c in calls])
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path):
+        write_atomic(path, self.prometheus_text())
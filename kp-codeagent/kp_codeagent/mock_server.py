@@ -0,0 +1,288 @@
+"""
+A stand-in LLM server for benchmarks and tests.
+
+Speaks enough of two protocols for every backend to run against it:
+
+- Ollama: ``GET /api/tags`` and streaming ``POST /api/generate`` (NDJSON).
+- OpenAI-compatible: ``GET /v1/models`` and streaming
+  ``POST .../chat/completions`` (server-sent events), which the OpenAI SDK
+  (``OPENAI_BASE_URL=<url>/v1``) and the Groq SDK (``GROQ_BASE_URL=<url>``)
+  both accept.
+
+Answers are scripted and streamed word by word after a configurable time to
+first token, at a configurable number of tokens per second.
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+DEFAULT_MODEL = "codellama:7b"
+
+DEFAULT_PLAN = """1. Create a `greeting.py` module with a `greet(name)` function.
+2. Validate that the name is a non-empty string.
+3. Add a `main()` entry point that prints the greeting.
+"""
+
+DEFAULT_IMPLEMENTATION = '''Here is the implementation, following the plan.
+
+```python:greeting.py
+"""Greeting helpers."""
+
+
+def greet(name: str) -> str:
+    """Return a friendly greeting for ``name``."""
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("name must be a non-empty string")
+    return f"Hello, {name.strip()}!"
+
+
+def main():
+    print(greet("world"))
+
+
+if __name__ == "__main__":
+    main()
+```
+
+The validation keeps `greet` from silently formatting empty names.
+'''
+
+DEFAULT_MODIFICATION = '''```python
+"""Greeting helpers."""
+
+
+def greet(name: str, punctuation: str = "!") -> str:
+    """Return a friendly greeting for ``name``."""
+    return f"Hello, {name}{punctuation}"
+```
+'''
+
+# (substring of the prompt, answer); the first match wins
+DEFAULT_SCRIPT: List[Tuple[str, str]] = [
+    ("You need to modify an existing file", DEFAULT_MODIFICATION),
+    ("implementation plan", DEFAULT_PLAN),
+    ("", DEFAULT_IMPLEMENTATION),
+]
+
+Script = Union[Sequence[Tuple[str, str]], Callable[[str], str]]
+
+_TOKEN_PATTERN = re.compile(r"\s*\S+|\s+")
+
+
+def split_tokens(text: str) -> List[str]:
+    """Split an answer into word-sized stream chunks that join back to it."""
+    return _TOKEN_PATTERN.findall(text)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, *args):
+        pass
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, data: Any, status: int = 200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        mock = self.server.mock
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": name} for name in mock.models]})
+        elif self.path.endswith("/models"):
+            self._send_json({
+                "object": "list",
+                "data": [{"id": name, "object": "model"} for name in mock.models]
+            })
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        mock = self.server.mock
+        payload = self._read_json()
+        mock.requests.append({"path": self.path, "payload": payload})
+
+        try:
+            if self.path == "/api/generate":
+                self._ollama(mock, payload)
+            elif self.path.endswith("/chat/completions"):
+                self._chat(mock, payload)
+            else:
+                self._send_json({"error": "not found"}, 404)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, e.g. a cancelled or hedged request
+            self.close_connection = True
+
+    def _ollama(self, mock: "MockLLMServer", payload: Dict[str, Any]):
+        prompt = payload.get("prompt", "")
+        prompt_tokens = (len(payload.get("system", "")) + len(prompt)) // 4
+        self._start_stream("application/x-ndjson")
+
+        tokens = 0
+        for token in mock.stream(prompt):
+            tokens += 1
+            line = {"model": payload.get("model"), "response": token, "done": False}
+            self._write_chunk((json.dumps(line) + "\n").encode())
+
+        context = list(payload.get("context") or []) + list(range(prompt_tokens + tokens))
+        done = {
+            "model": payload.get("model"),
+            "response": "",
+            "done": True,
+            "context": context,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(mock.ttft * 1e9),
+            "eval_count": tokens,
+        }
+        self._write_chunk((json.dumps(done) + "\n").encode())
+        self._write_chunk(b"")
+
+    def _chat(self, mock: "MockLLMServer", payload: Dict[str, Any]):
+        messages = payload.get("messages", [])
+        prompt = messages[-1].get("content", "") if messages else ""
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        self._start_stream("text/event-stream")
+
+        def event(delta: Dict[str, Any], finish: Optional[str] = None, **extra: Any):
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", DEFAULT_MODEL),
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish}
+                ] if delta is not None else [],
+                **extra,
+            }
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        tokens = 0
+        for token in mock.stream(prompt):
+            delta = {"content": token}
+            if not tokens:
+                delta["role"] = "assistant"
+            tokens += 1
+            event(delta)
+
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": tokens,
+                 "total_tokens": prompt_tokens + tokens}
+        if self.path.startswith("/openai/"):
+            # Groq reports usage with the last choice chunk
+            event({}, "stop", x_groq={"id": "req-mock", "usage": usage})
+        else:
+            event({}, "stop")
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                event(None, usage=usage)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    mock: "MockLLMServer"
+
+
+class MockLLMServer:
+    """
+    Scripted Ollama / OpenAI-compatible server on a background thread.
+
+    ``script`` maps prompts to answers: a list of (substring, answer) pairs
+    where the first substring found in the prompt wins, or a function of
+    the prompt. Each answer is streamed one word at a time: the first word
+    after ``ttft`` seconds, the rest at ``tokens_per_second`` (0 = as fast
+    as possible).
+
+        with MockLLMServer(ttft=0.2, tokens_per_second=100) as server:
+            os.environ["OLLAMA_URL"] = server.url
+    """
+
+    def __init__(
+        self,
+        ttft: float = 0.0,
+        tokens_per_second: float = 0.0,
+        script: Script = None,
+        models: List[str] = None,
+        host: str = "127.0.0.1",
+        port: int = 0
+    ):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.script = script if script is not None else DEFAULT_SCRIPT
+        self.models = models or [DEFAULT_MODEL]
+        # Every request received: {"path": ..., "payload": ...}
+        self.requests: List[Dict[str, Any]] = []
+
+        self._server = _Server((host, port), _Handler)
+        self._server.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def answer(self, prompt: str) -> str:
+        """The scripted answer for a prompt."""
+        if callable(self.script):
+            return self.script(prompt)
+        for pattern, answer in self.script:
+            if pattern in prompt:
+                return answer
+        return ""
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """The answer's tokens, paced by ttft and tokens_per_second."""
+        start = time.perf_counter()
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+        for i, token in enumerate(split_tokens(self.answer(prompt))):
+            delay = start + self.ttft + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            yield token
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="kp-mock-llm", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        """Serve in the calling thread until interrupted."""
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
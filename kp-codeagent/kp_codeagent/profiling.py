@@ -0,0 +1,163 @@
+"""
+Span tracing for ``--profile``.
+
+Instrumented code opens spans with ``span(name, category, **args)``; while a
+``Profiler`` is running they are recorded as Chrome trace events (one row
+per thread, nested by time) and written as JSON that Perfetto
+(https://ui.perfetto.dev) and chrome://tracing open directly. When nothing
+is being traced a span is a shared no-op context manager.
+"""
+
+import contextlib
+import cProfile
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .utils import write_atomic
+
+_NO_SPAN = contextlib.nullcontext()
+
+# The tracer of the running profiler, if any
+_tracer: Optional["Tracer"] = None
+
+
+class Tracer:
+    """Collects trace events; safe to use from several threads."""
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self.pid = os.getpid()
+        self._origin = time.perf_counter_ns()
+        self._threads: Dict[int, str] = {}
+
+    def now(self) -> float:
+        """Microseconds since the tracer started."""
+        return (time.perf_counter_ns() - self._origin) / 1000
+
+    def _tid(self) -> int:
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            self._threads[tid] = threading.current_thread().name
+        return tid
+
+    def complete(self, name: str, category: str, start: float, args: Dict[str, Any]):
+        """Record a span that began at ``start`` (see ``now``) and ends now."""
+        event = {"name": name, "cat": category, "ph": "X", "ts": start, "dur": self.now() - start,
+                 "pid": self.pid, "tid": self._tid()}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def instant(self, name: str, category: str, **args: Any):
+        """Record a point in time, e.g. the first token of a stream."""
+        event = {"name": name, "cat": category, "ph": "i", "s": "t", "ts": self.now(),
+                 "pid": self.pid, "tid": self._tid()}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str, args: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        start = self.now()
+        try:
+            yield args
+        finally:
+            self.complete(name, category, start, args)
+
+    def to_dict(self) -> Dict[str, Any]:
+        names = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+            for tid, name in list(self._threads.items())
+        ]
+        process = {"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0,
+                   "args": {"name": "kp-codeagent"}}
+        return {"traceEvents": [process] + names + list(self.events), "displayTimeUnit": "ms"}
+
+    def write(self, path: Path):
+        write_atomic(path, json.dumps(self.to_dict()))
+
+
+def span(name: str, category: str = "agent", **args: Any):
+    """
+    Context manager timing a block as a span while tracing. It yields the
+    span's args dict (or None when not tracing), so results can be added
+    to it before the span closes.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NO_SPAN
+    return tracer.span(name, category, args)
+
+
+def trace_stream(
+    name: str, stream: Iterator[str], category: str = "llm", **args: Any
+) -> Iterator[str]:
+    """
+    Trace a model stream as one span, from its first read until it ends,
+    with an instant event at the first chunk. Arguments given as functions
+    are called when the span ends.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return stream
+
+    def traced() -> Iterator[str]:
+        start = tracer.now()
+        chunks = 0
+        try:
+            for chunk in stream:
+                if not chunks:
+                    tracer.instant("first token", category)
+                chunks += 1
+                yield chunk
+        finally:
+            values = {key: value() if callable(value) else value for key, value in args.items()}
+            tracer.complete(name, category, start, {**values, "chunks": chunks})
+
+    return traced()
+
+
+class Profiler:
+    """
+    Traces spans into ``trace_path`` and, with ``cpu_path``, runs cProfile
+    over the same period (the calling thread only; worker threads show up
+    as spans in the trace). Dump files open with ``python -m pstats``,
+    snakeviz and similar tools.
+    """
+
+    def __init__(self, trace_path: Optional[Path] = None, cpu_path: Optional[Path] = None):
+        self.trace_path = trace_path
+        self.cpu_path = cpu_path
+        self.tracer: Optional[Tracer] = None
+        self.cpu_profile: Optional[cProfile.Profile] = None
+
+    def start(self) -> "Profiler":
+        global _tracer
+        if self.trace_path:
+            self.tracer = _tracer = Tracer()
+        if self.cpu_path:
+            self.cpu_profile = cProfile.Profile()
+            self.cpu_profile.enable()
+        return self
+
+    def stop(self):
+        """Stop recording and write the trace and profile files."""
+        global _tracer
+        if self.cpu_profile is not None:
+            self.cpu_profile.disable()
+            Path(self.cpu_path).parent.mkdir(parents=True, exist_ok=True)
+            self.cpu_profile.dump_stats(str(self.cpu_path))
+        if self.tracer is not None:
+            if _tracer is self.tracer:
+                _tracer = None
+            self.tracer.write(Path(self.trace_path))
+
+    def __enter__(self) -> "Profiler":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -56,14 +56,20 @@ def get_system_prompt(lang: str = "en") -> str:
     return SYSTEM_PROMPT_ES if lang == "es" else SYSTEM_PROMPT_EN
 
 
-TASK_PROMPT_TEMPLATE = '''Task: {user_task}
-
-Current Project Context:
+# The project context comes first and the task last, so the system prompt,
+# file structure and code form the same leading bytes in the plan and
+# implementation prompts (and across reruns): providers that cache prompt
+# prefixes (OpenAI, Groq) only process the part after it again.
+PROJECT_CONTEXT_TEMPLATE = '''Current Project Context:
 File Structure:
 {file_tree}
 
 Relevant Code Files:
 {code_snippets}
+'''
+
+TASK_PROMPT_TEMPLATE = PROJECT_CONTEXT_TEMPLATE + '''
+Task: {user_task}
 
 Instructions:
 1. Analyze the task and existing code
@@ -74,13 +80,11 @@ Instructions:
 Remember: This code should help the student learn, not just work.
 '''
 
-PLAN_PROMPT_TEMPLATE = '''Analyze this coding task and create a detailed implementation plan.
+PLAN_PROMPT_TEMPLATE = PROJECT_CONTEXT_TEMPLATE + '''
+Analyze this coding task and create a detailed implementation plan.
 
 Task: {user_task}
 
-Current Project Context:
-{context}
-
 Provide:
 1. A brief analysis of what needs to be done
 2. Step-by-step implementation plan (3-7 steps)
@@ -90,6 +94,18 @@ Provide:
 Keep it concise and actionable.
 '''
 
+# Sent after the plan, continuing the same Ollama conversation: the project
+# context and the task were already part of the plan prompt
+IMPLEMENTATION_FOLLOWUP_TEMPLATE = '''Now implement the plan above.
+
+Instructions:
+1. Follow the plan step by step
+2. Write clean, well-documented code
+3. Explain your key design decisions
+
+Remember: This code should help the student learn, not just work.
+'''
+
 FILE_MODIFICATION_TEMPLATE = '''You need to modify an existing file.
 
 File: {file_path}
@@ -0,0 +1,233 @@
+"""Client-side rate limiting for hosted LLM APIs, shared across processes."""
+
+import contextlib
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional
+
+# File locks are platform specific; without either, state is still shared
+# but updates from concurrent processes may race
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+try:
+    import msvcrt
+    HAS_MSVCRT = True
+except ImportError:
+    HAS_MSVCRT = False
+
+# Keys are shared by every project on the machine, so their state lives in
+# the user's home rather than in a project's .kp-codeagent directory
+DEFAULT_STATE_DIR = Path.home() / ".kp-codeagent" / "ratelimits"
+
+# Never wait longer than this in one go; the state is re-read after it
+MAX_WAIT = 60.0
+
+
+def _parse_number(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def response_headers(obj: Any) -> Optional[Mapping[str, str]]:
+    """
+    HTTP headers of an SDK stream or exception: both the OpenAI and Groq
+    SDKs keep the ``httpx.Response`` they came from in ``.response``.
+    """
+    headers = getattr(getattr(obj, "response", None), "headers", None)
+    return headers if hasattr(headers, "get") else None
+
+
+@contextlib.contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as f:
+        if HAS_FCNTL:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif HAS_MSVCRT:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if HAS_FCNTL:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif HAS_MSVCRT:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class RateLimiter:
+    """
+    Token buckets for one API key: requests and tokens per window.
+
+    ``acquire`` blocks until the request fits both buckets instead of
+    sending it into a 429. Limits come from KP_RATE_RPM / KP_RATE_TPM or
+    are learned from the ``x-ratelimit-*`` headers of each response, whose
+    ``remaining`` counts also account for other machines using the key.
+
+    The buckets are stored in a small JSON file per key (named after a hash
+    of the key, never the key itself) and updated under a file lock, so
+    every kp-codeagent process on the machine shares them.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        request_window: float = 60.0,
+        token_window: float = 60.0,
+        rpm: int = None,
+        tpm: int = None,
+        state_dir: Path = None,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        state_dir = Path(state_dir or os.getenv("KP_RATE_LIMIT_DIR") or DEFAULT_STATE_DIR)
+        digest = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+        self.path = state_dir / f"{digest}.json"
+        self.lock_path = state_dir / f"{digest}.lock"
+
+        self.windows = {"requests": request_window, "tokens": token_window}
+        self.configured = {
+            "requests": rpm if rpm is not None else _parse_number(os.getenv("KP_RATE_RPM")),
+            "tokens": tpm if tpm is not None else _parse_number(os.getenv("KP_RATE_TPM")),
+        }
+        # Configured limits are per minute, whatever the provider's window
+        for bucket, limit in self.configured.items():
+            if limit:
+                self.windows[bucket] = 60.0
+
+        self._clock = clock
+        self._sleep = sleep
+
+        # Seconds this process spent waiting for capacity
+        self.waited = 0.0
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, state: Dict[str, Any]):
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    @contextlib.contextmanager
+    def _state(self) -> Iterator[Dict[str, Any]]:
+        """Locked, refilled bucket state; saved when the block exits."""
+        with _file_lock(self.lock_path):
+            state = self._load()
+            now = self._clock()
+            for bucket in self.windows:
+                limit = self.limit(bucket, state)
+                if limit is None:
+                    continue
+                level = state.get(bucket, limit)
+                elapsed = max(0.0, now - state.get("updated", now))
+                state[bucket] = min(limit, level + elapsed * limit / self.windows[bucket])
+            state["updated"] = now
+            yield state
+            self._save(state)
+
+    def limit(self, bucket: str, state: Dict[str, Any] = None) -> Optional[float]:
+        """Capacity of a bucket, configured or learned; None while unknown."""
+        if self.configured[bucket]:
+            return self.configured[bucket]
+        state = state if state is not None else self._load()
+        return state.get(f"{bucket}_limit")
+
+    def _wait_time(self, state: Dict[str, Any], tokens: int) -> float:
+        wait = state.get("blocked_until", 0) - state["updated"]
+        for bucket, needed in (("requests", 1), ("tokens", tokens)):
+            limit = self.limit(bucket, state)
+            if not limit:
+                continue
+            # A request larger than the whole bucket waits for a full one
+            needed = min(needed, limit)
+            if state[bucket] < needed:
+                wait = max(wait, (needed - state[bucket]) * self.windows[bucket] / limit)
+        return wait
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Block until a request of about ``tokens`` tokens fits, then take its
+        share of both buckets. Returns the seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._state() as state:
+                wait = self._wait_time(state, tokens)
+                if wait <= 0:
+                    for bucket, needed in (("requests", 1), ("tokens", tokens)):
+                        if self.limit(bucket, state):
+                            state[bucket] -= needed
+                    break
+
+            wait = min(wait, MAX_WAIT)
+            self._sleep(wait)
+            waited += wait
+
+        self.waited += waited
+        return waited
+
+    def settle(self, estimated: int, actual: int):
+        """Correct the token bucket once the response reports its real usage."""
+        if actual == estimated:
+            return
+        with self._state() as state:
+            if self.limit("tokens", state):
+                state["tokens"] -= actual - estimated
+
+    def observe(self, headers: Optional[Mapping[str, str]]):
+        """Learn limits and remaining capacity from rate-limit response headers."""
+        if not headers:
+            return
+
+        learned = {}
+        for bucket in self.windows:
+            limit = _parse_number(headers.get(f"x-ratelimit-limit-{bucket}"))
+            remaining = _parse_number(headers.get(f"x-ratelimit-remaining-{bucket}"))
+            if limit or remaining is not None:
+                learned[bucket] = (limit, remaining)
+        if not learned:
+            return
+
+        with self._state() as state:
+            for bucket, (limit, remaining) in learned.items():
+                if limit:
+                    state[f"{bucket}_limit"] = limit
+                    state.setdefault(bucket, limit)
+                if remaining is not None and bucket in state:
+                    state[bucket] = min(state[bucket], remaining)
+
+    def penalize(self, retry_after: Optional[float]):
+        """Hold every request for the key after a 429, until Retry-After passes."""
+        if not retry_after:
+            return
+        with self._state() as state:
+            state["blocked_until"] = max(
+                state.get("blocked_until", 0), state["updated"] + retry_after
+            )
+
+
+def rate_limiter_for(api_key: Optional[str], **kwargs) -> Optional[RateLimiter]:
+    """RateLimiter for an API key, or None without a key or with KP_RATE_LIMIT=0."""
+    if not api_key or os.getenv("KP_RATE_LIMIT", "1") == "0":
+        return None
+    return RateLimiter(api_key, **kwargs)
@@ -0,0 +1,73 @@
+"""Buffered rendering of streamed model output."""
+
+import time
+from typing import Iterable, List, Optional
+
+from rich.console import Console
+
+# Terminal redraws per second while a response streams in
+DEFAULT_FPS = 30
+
+
+class StreamRenderer:
+    """
+    Collect streamed chunks and write them to the console at a capped frame rate.
+
+    Fast backends stream hundreds of tokens per second; printing each one
+    through rich costs far more than producing it. Chunks are buffered and
+    written at most ``max_fps`` times per second. When the output is not a
+    terminal (pipes, CI logs), rich is bypassed and text goes straight to
+    the file.
+    """
+
+    def __init__(self, console: Optional[Console] = None, max_fps: int = DEFAULT_FPS):
+        self.console = console or Console()
+        self.interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.plain = not self.console.is_terminal
+        self.frames = 0
+        self._parts: List[str] = []
+        self._pending: List[str] = []
+        self._last_flush = time.monotonic()
+
+    def write(self, chunk: str):
+        """Add a chunk; it reaches the screen with the next frame."""
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        self._pending.append(chunk)
+
+        now = time.monotonic()
+        if now - self._last_flush >= self.interval:
+            self.flush(now)
+
+    def flush(self, now: float = None):
+        """Write everything buffered since the last frame."""
+        self._last_flush = now if now is not None else time.monotonic()
+        if not self._pending:
+            return
+
+        text = "".join(self._pending)
+        self._pending.clear()
+        self.frames += 1
+
+        if self.plain:
+            self.console.file.write(text)
+            self.console.file.flush()
+        else:
+            # Model output is shown as is: brackets are not rich markup, and
+            # long lines are left for the terminal to wrap
+            self.console.print(text, end="", markup=False, highlight=False, soft_wrap=True)
+
+    @property
+    def text(self) -> str:
+        """Everything written so far."""
+        return "".join(self._parts)
+
+    def stream(self, chunks: Iterable[str]) -> str:
+        """Render a whole stream and return the full response."""
+        try:
+            for chunk in chunks:
+                self.write(chunk)
+        finally:
+            self.flush()
+        return self.text
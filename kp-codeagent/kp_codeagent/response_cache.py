@@ -0,0 +1,224 @@
+"""Persistent, content-addressed cache of model responses."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from .file_index import STATE_DIR
+
+CACHE_DB = "responses.db"
+SCHEMA_VERSION = 1
+
+DEFAULT_MAX_MB = 64
+DEFAULT_TTL_HOURS = 7 * 24
+
+# Cached responses are replayed line by line, like a fast stream
+REPLAY_CHUNK_CHARS = 256
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class ResponseCache:
+    """
+    On-disk LRU cache of complete model responses, in
+    ``.kp-codeagent/responses.db``.
+
+    Entries are keyed by a hash of everything that determines the answer
+    (backend, model, system prompt, prompt and temperature), so rerunning
+    the same task skips the network. The cache is capped by total size
+    (KP_CACHE_MAX_MB), evicting the least recently used entries first, and
+    entries older than KP_CACHE_TTL_HOURS are ignored and purged.
+
+    One cache may be shared by threads (the daemon serves each task on its
+    own thread); they take turns on its connection.
+    """
+
+    def __init__(
+        self,
+        root_dir: Path = None,
+        db_path: Path = None,
+        max_bytes: int = None,
+        ttl: float = None
+    ):
+        self.root_dir = Path(root_dir or Path.cwd()).resolve()
+        self.db_path = db_path or self.root_dir / STATE_DIR / CACHE_DB
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            _env_number("KP_CACHE_MAX_MB", DEFAULT_MAX_MB) * 1024 * 1024
+        )
+        self.ttl = ttl if ttl is not None else (
+            _env_number("KP_CACHE_TTL_HOURS", DEFAULT_TTL_HOURS) * 3600
+        )
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.RLock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._conn is None:
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+                self._init_schema()
+            return self._conn
+
+    def _init_schema(self):
+        conn = self._conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS responses")
+
+        conn.executescript(f"""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS responses_used ON responses (used);
+            PRAGMA user_version = {SCHEMA_VERSION};
+        """)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @staticmethod
+    def key(
+        backend: str,
+        model: str,
+        system: Optional[str],
+        prompt: str,
+        temperature: float,
+        context: Optional[List[int]] = None
+    ) -> str:
+        """Content address of a request, including any continued context."""
+        fields = [backend, model, system or "", prompt, float(temperature)]
+        if context:
+            fields.append(context)
+        payload = json.dumps(fields)
+        return hashlib.sha256(payload.encode("utf-8", "surrogatepass")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response for a key, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            conn = self.conn
+            row = conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    with conn:
+                        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+
+            with conn:
+                conn.execute(
+                    "UPDATE responses SET used = ?, hits = hits + 1 WHERE key = ?", (now, key)
+                )
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str):
+        """Store a complete response, then evict down to the size cap."""
+        size = len(response.encode("utf-8", "surrogatepass"))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._lock:
+            conn = self.conn
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, size, created, used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, response, size, now, now)
+                )
+                self._evict(now)
+
+    def _evict(self, now: float):
+        conn = self.conn
+        conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Oldest use first, until the rest fits
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY used"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def replay(self, response: str) -> Iterator[str]:
+        """Yield a cached response in stream-sized pieces."""
+        for line in response.splitlines(keepends=True):
+            for start in range(0, len(line), REPLAY_CHUNK_CHARS):
+                yield line[start:start + REPLAY_CHUNK_CHARS]
+
+    def record(self, key: Union[str, Callable[[], str]], chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Pass a stream through, storing the response once it has been read to
+        the end. Streams that fail or are abandoned midway are not stored.
+        ``key`` may be a function, called once the stream has ended.
+        """
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+
+        response = "".join(parts)
+        if response:
+            self.put(key() if callable(key) else key, response)
+
+    def clear(self) -> int:
+        """Drop every entry; returns how many there were."""
+        with self._lock:
+            conn = self.conn
+            with conn:
+                count = conn.execute("DELETE FROM responses").rowcount
+        return count
+
+    def status(self) -> Dict[str, Any]:
+        """Summary of the cache on disk and of this process's lookups."""
+        exists = self.db_path.exists()
+        entries, size, hits = 0, 0, 0
+        if exists:
+            with self._lock:
+                entries, size, hits = self.conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) "
+                    "FROM responses"
+                ).fetchone()
+
+        return {
+            "path": str(self.db_path),
+            "exists": exists,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "stored_hits": hits,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
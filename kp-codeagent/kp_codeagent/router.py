@@ -0,0 +1,271 @@
+"""Retries, failover and hedged requests across LLM backends."""
+
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .errors import LLMError, classify_error
+from .llm_client import LLMBackend
+from .tokenizer import Tokenizer
+
+DEFAULT_MAX_RETRIES = 2
+# First retry waits up to this many seconds; each later one doubles it
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 8.0
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class Router(LLMBackend):
+    """
+    An ``LLMBackend`` that spreads one request over several backends.
+
+    - Retryable errors (rate limits, timeouts, connection and server
+      errors) are retried with exponential backoff and full jitter,
+      honouring the server's Retry-After up to MAX_BACKOFF seconds.
+    - When a backend keeps failing, fails for good or asks to wait longer
+      than MAX_BACKOFF, the request fails over to the next available
+      backend.
+    - With ``hedge_after`` set, a request that has not produced its first
+      chunk after that many seconds is also sent to the next backend, and
+      whichever streams first is kept.
+
+    Only failures before the first chunk are retried: once output has been
+    streamed to the user, an error is raised as is. Requests that continue
+    an Ollama ``context`` stay on the primary backend, the only one that
+    can read it.
+    """
+
+    def __init__(
+        self,
+        backends: List[LLMBackend],
+        max_retries: int = None,
+        backoff: float = None,
+        hedge_after: float = None,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        if not backends:
+            raise ValueError("Router needs at least one backend")
+
+        self.backends = backends
+        self.max_retries = max_retries if max_retries is not None else int(
+            _env_float("KP_MAX_RETRIES", DEFAULT_MAX_RETRIES)
+        )
+        self.backoff = backoff if backoff is not None else _env_float(
+            "KP_RETRY_BACKOFF", DEFAULT_BACKOFF
+        )
+        self.hedge_after = hedge_after if hedge_after is not None else _env_float(
+            "KP_HEDGE_AFTER", 0
+        )
+        self._sleep = sleep
+        self._answered: Optional[LLMBackend] = None
+        self.stats = {"retries": 0, "failovers": 0, "hedges": 0, "hedge_wins": 0}
+
+    @property
+    def primary(self) -> LLMBackend:
+        return self.backends[0]
+
+    @property
+    def name(self) -> str:
+        return self.primary.name
+
+    @property
+    def model(self) -> str:
+        return self.primary.model
+
+    @property
+    def supports_context(self) -> bool:
+        return self.primary.supports_context
+
+    @property
+    def context_window(self) -> int:
+        return self.primary.context_window
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        return self.primary.tokenizer
+
+    @property
+    def answered(self) -> Optional[LLMBackend]:
+        """Backend that produced the last answer, a fallback or hedge included."""
+        return self._answered
+
+    @property
+    def last_response(self) -> Optional[Dict[str, Any]]:
+        """Metadata of the last generation, from whichever backend answered."""
+        return self._answered.last_response if self._answered else None
+
+    @last_response.setter
+    def last_response(self, value: Optional[Dict[str, Any]]):
+        self._answered = None
+        for backend in self.backends:
+            backend.last_response = value
+
+    def is_available(self) -> bool:
+        return any(backend.is_available() for backend in self.backends)
+
+    def backoff_delay(self, attempt: int, error: LLMError) -> float:
+        """Seconds to wait before retry number ``attempt`` (0-based)."""
+        delay = random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** attempt))
+        if error.retry_after is not None:
+            delay = max(delay, error.retry_after)
+        return min(delay, MAX_BACKOFF)
+
+    def _candidates(self, context: Optional[List[int]]) -> Iterator[LLMBackend]:
+        yield self.primary
+        if context:
+            return
+        for backend in self.backends[1:]:
+            try:
+                available = backend.is_available()
+            except Exception:
+                available = False
+            if available:
+                yield backend
+
+    def generate(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+        timeout: int = 120,
+        context: Optional[List[int]] = None
+    ) -> Iterator[str]:
+        """Generate text with streaming, retrying and failing over as needed."""
+        def open_stream(backend: LLMBackend) -> Iterator[str]:
+            if context:
+                return backend.generate(prompt, system, temperature, timeout, context=context)
+            return backend.generate(prompt, system, temperature, timeout)
+
+        candidates = list(self._candidates(context)) if self.hedge_after > 0 else None
+        errors: List[LLMError] = []
+
+        for position, backend in enumerate(candidates or self._candidates(context)):
+            if position:
+                self.stats["failovers"] += 1
+
+            hedge = None
+            if candidates and position + 1 < len(candidates):
+                hedge = candidates[position + 1]
+
+            for attempt in range(self.max_retries + 1):
+                started = False
+                try:
+                    if hedge is not None:
+                        stream = self._race(backend, hedge, open_stream)
+                    else:
+                        self._answered = backend
+                        stream = open_stream(backend)
+
+                    for chunk in stream:
+                        started = True
+                        yield chunk
+                    return
+                except Exception as e:
+                    error = classify_error(e, backend.name)
+                    if started:
+                        raise error from e
+                    errors.append(error)
+
+                if not error.retryable or attempt == self.max_retries:
+                    break
+                if error.retry_after is not None and error.retry_after > MAX_BACKOFF:
+                    # Not worth the wait: try the next backend now
+                    break
+                self.stats["retries"] += 1
+                self._sleep(self.backoff_delay(attempt, error))
+
+        if not errors:
+            raise LLMError("No LLM backend available", kind="connection")
+        raise errors[-1] if len(errors) == 1 else LLMError(
+            "All backends failed: " + "; ".join(str(error) for error in errors),
+            kind=errors[-1].kind,
+        )
+
+    def _race(
+        self,
+        primary: LLMBackend,
+        hedge: LLMBackend,
+        open_stream: Callable[[LLMBackend], Iterator[str]]
+    ) -> Iterator[str]:
+        """
+        Stream from ``primary``; if its first chunk takes longer than
+        hedge_after seconds, start ``hedge`` too and keep the first to
+        produce output. The loser stops at its next chunk.
+        """
+        events: "queue.Queue" = queue.Queue()
+        cancelled = [threading.Event(), threading.Event()]
+        racers = [primary, hedge]
+
+        def pump(index: int):
+            stream = None
+            try:
+                stream = open_stream(racers[index])
+                for chunk in stream:
+                    if cancelled[index].is_set():
+                        return
+                    events.put((index, "chunk", chunk))
+                events.put((index, "done", None))
+            except Exception as e:
+                events.put((index, "error", e))
+            finally:
+                if stream is not None:
+                    stream.close()
+
+        def start(index: int):
+            threading.Thread(target=pump, args=(index,), daemon=True).start()
+
+        start(0)
+        running = 1
+        winner = None
+        failures = {}
+
+        try:
+            while True:
+                waiting = running == 1 and winner is None and not failures
+                wait = self.hedge_after if waiting else None
+                try:
+                    index, kind, value = events.get(timeout=wait)
+                except queue.Empty:
+                    # Slow first token: send the request to the hedge as well
+                    self.stats["hedges"] += 1
+                    start(1)
+                    running = 2
+                    continue
+
+                if winner is not None and index != winner:
+                    continue
+
+                if kind == "error":
+                    if winner is not None:
+                        raise value
+                    failures[index] = value
+                    if len(failures) == running:
+                        raise failures.get(0, value)
+                    continue
+
+                if winner is None:
+                    if kind == "done" and running == 2 and (1 - index) not in failures:
+                        # Empty answer: let the other racer have its chance
+                        failures[index] = LLMError("empty response", racers[index].name)
+                        continue
+                    winner = index
+                    self._answered = racers[index]
+                    cancelled[1 - index].set()
+                    if index == 1:
+                        self.stats["hedge_wins"] += 1
+
+                if kind == "done":
+                    return
+                yield value
+        finally:
+            for event in cancelled:
+                event.set()
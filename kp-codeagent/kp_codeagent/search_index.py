@@ -0,0 +1,405 @@
+"""Persistent BM25 inverted index for content-based file relevance."""
+
+import heapq
+import math
+import os
+import re
+import sqlite3
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from .file_index import STATE_DIR
+from .profiling import span
+from .utils import parallel_map, safe_stat
+
+SEARCH_DB = "search.db"
+SCHEMA_VERSION = 1
+
+# Only the head of very large files is indexed
+MAX_INDEX_BYTES = 256 * 1024
+
+# Extra term frequency given to words in the file path
+PATH_TERM_WEIGHT = 3
+
+# Posting lists longer than this are read partially: the highest-tf docs,
+# plus the current best candidates, which are rescored with the term
+MAX_FULL_POSTINGS = 1000
+MAX_RESCORED = 200
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD_RE = re.compile(r'[^\W\d_][\w]*|\d+')
+_CAMEL_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+STOPWORDS_EN = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'do', 'for', 'from',
+    'has', 'have', 'if', 'in', 'into', 'is', 'it', 'its', 'me', 'my', 'not', 'of',
+    'on', 'or', 'so', 'that', 'the', 'then', 'there', 'this', 'to', 'was', 'we',
+    'will', 'with', 'you', 'your',
+    # Instruction verbs that describe the task rather than the code
+    'add', 'make', 'please', 'should', 'want', 'need', 'using', 'use',
+}
+
+STOPWORDS_ES = {
+    'a', 'al', 'algo', 'como', 'con', 'de', 'del', 'desde', 'donde', 'e', 'el',
+    'ella', 'en', 'entre', 'es', 'esa', 'ese', 'eso', 'esta', 'este', 'esto', 'hay',
+    'la', 'las', 'le', 'les', 'lo', 'los', 'mas', 'me', 'mi', 'muy', 'ni', 'no',
+    'o', 'para', 'pero', 'por', 'que', 'se', 'si', 'sin', 'sobre', 'su', 'sus',
+    'tambien', 'un', 'una', 'uno', 'unos', 'y', 'ya',
+    # Instruction verbs that describe the task rather than the code
+    'agrega', 'agregar', 'anade', 'anadir', 'crea', 'crear', 'haz', 'hacer',
+    'necesito', 'quiero', 'usa', 'usar', 'usando',
+}
+
+STOPWORDS = STOPWORDS_EN | STOPWORDS_ES
+
+# Spanish task words mapped to the English terms code is usually written in
+ES_TO_EN = {
+    'archivo': 'file', 'archivos': 'file', 'funcion': 'function', 'funciones': 'function',
+    'clase': 'class', 'clases': 'class', 'metodo': 'method', 'metodos': 'method',
+    'prueba': 'test', 'pruebas': 'test', 'errores': 'error',
+    'usuario': 'user', 'usuarios': 'user', 'contrasena': 'password', 'correo': 'email',
+    'conexion': 'connection', 'configuracion': 'config', 'datos': 'data',
+    'lista': 'list', 'ruta': 'path', 'rutas': 'route', 'servidor': 'server',
+    'cliente': 'client', 'pagina': 'page', 'validar': 'validate', 'validacion': 'validation',
+    'fecha': 'date', 'nombre': 'name', 'tabla': 'table', 'modelo': 'model',
+    'vista': 'view', 'plantilla': 'template', 'mensaje': 'message', 'registro': 'log',
+    'inicio': 'main', 'principal': 'main', 'sesion': 'session', 'boton': 'button',
+    'formulario': 'form', 'consulta': 'query', 'cadena': 'string', 'numero': 'number',
+    'calcular': 'calculate', 'calculadora': 'calculator', 'ordenar': 'sort',
+    'buscar': 'search', 'busqueda': 'search', 'guardar': 'save', 'cargar': 'load',
+    'leer': 'read', 'escribir': 'write', 'borrar': 'delete', 'eliminar': 'delete',
+    'actualizar': 'update', 'analizar': 'parse', 'pedido': 'order', 'producto': 'product',
+    'precio': 'price', 'tarea': 'task', 'tareas': 'task', 'registrar': 'register',
+    'ignorar': 'ignore', 'indice': 'index', 'contexto': 'context', 'salida': 'output',
+    'entrada': 'input', 'respuesta': 'response', 'solicitud': 'request',
+}
+
+
+def _fold(word: str) -> str:
+    """Strip accents so 'función' and 'funcion' index the same."""
+    if word.isascii():
+        return word
+    decomposed = unicodedata.normalize('NFKD', word)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _stem(term: str) -> str:
+    """Light plural stripping shared by English and Spanish."""
+    if len(term) <= 3:
+        return term
+    if term.endswith('ies'):
+        return term[:-3] + 'y'
+    if term.endswith('sses'):
+        return term[:-2]
+    if term.endswith('s') and not term.endswith('ss'):
+        return term[:-1]
+    return term
+
+
+def split_identifier(word: str) -> List[str]:
+    """Split snake_case and camelCase identifiers into lowercase parts."""
+    parts = []
+    for piece in word.split('_'):
+        parts.extend(p.lower() for p in _CAMEL_RE.findall(piece))
+    return parts
+
+
+def tokenize(text: str) -> Iterator[str]:
+    """Yield index terms: identifier parts plus the whole compound identifier."""
+    for word in _WORD_RE.findall(text):
+        word = _fold(word)
+        parts = split_identifier(word)
+        if len(parts) > 1:
+            yield word.lower()
+        for part in parts:
+            if len(part) > 1 and part not in STOPWORDS:
+                yield _stem(part)
+
+
+def query_terms(text: str) -> Dict[str, float]:
+    """Weighted query terms, with Spanish words expanded to English."""
+    weights: Dict[str, float] = {}
+    for word in _WORD_RE.findall(text):
+        folded = _fold(word).lower()
+        translated = ES_TO_EN.get(folded)
+        if translated and translated != folded:
+            weights.setdefault(translated, 0.8)
+
+    for term in tokenize(text):
+        weights[term] = 1.0
+
+    return weights
+
+
+class SearchIndex:
+    """
+    BM25 ranking over file contents, stored in SQLite.
+
+    Postings are keyed by term, so a query only touches the rows of its own
+    terms and never reads file contents. ``update`` re-reads only files whose
+    size or mtime changed since they were indexed.
+    """
+
+    def __init__(self, root_dir: Path = None, db_path: Path = None):
+        self.root_dir = Path(root_dir or Path.cwd()).resolve()
+        self.db_path = db_path or self.root_dir / STATE_DIR / SEARCH_DB
+        self._conn = None
+        self._root_prefix = str(self.root_dir) + os.sep
+        # (document count, total length), cached until the next change
+        self._stats = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            # Batch workers share one index and take turns using it
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._init_schema()
+        return self._conn
+
+    def _init_schema(self):
+        conn = self._conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            conn.executescript("""
+                DROP TABLE IF EXISTS docs;
+                DROP TABLE IF EXISTS postings;
+                DROP TABLE IF EXISTS terms;
+            """)
+
+        conn.executescript(f"""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            );
+            -- Document length is repeated here so scoring needs no join
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+            CREATE INDEX IF NOT EXISTS postings_impact ON postings (term, tf DESC, length);
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                df INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            PRAGMA user_version = {SCHEMA_VERSION};
+        """)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _rel(self, file_path: Path) -> str:
+        path = str(file_path)
+        if path.startswith(self._root_prefix):
+            path = path[len(self._root_prefix):]
+        return path.replace(os.sep, '/')
+
+    def _read_terms(self, file_path: Path, rel: str) -> Counter:
+        """Term frequencies for a file; empty for binary or unreadable files."""
+        try:
+            with span("read", "io", path=rel), open(file_path, 'rb') as f:
+                data = f.read(MAX_INDEX_BYTES)
+        except OSError:
+            return Counter()
+
+        if b'\x00' in data[:1024]:
+            return Counter()
+
+        counts = Counter(tokenize(data.decode('utf-8', errors='ignore')))
+        for term in tokenize(rel.replace('/', ' ').replace('.', ' ')):
+            counts[term] += PATH_TERM_WEIGHT
+        return counts
+
+    def _delete_doc(self, doc_id: int):
+        conn = self.conn
+        conn.execute(
+            "UPDATE terms SET df = df - 1 "
+            "WHERE term IN (SELECT term FROM postings WHERE doc_id = ?)",
+            (doc_id,)
+        )
+        conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        conn.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+
+    def update(
+        self, files: Iterable[Path], workers: int = None, modified: Iterable[Path] = None
+    ) -> Dict[str, int]:
+        """
+        Sync the index with the given files.
+
+        Files are stat'ed to catch in-place edits (which do not change the
+        directory mtime the file index relies on); only changed files are read.
+        With ``modified``, the files a watcher saw change, only those and
+        files new to the index are stat'ed. Stats and reads run on a bounded
+        thread pool of ``workers`` threads. Indexed files missing from
+        ``files`` are dropped.
+        """
+        conn = self.conn
+        known = {
+            path: (doc_id, size, mtime)
+            for doc_id, path, size, mtime in conn.execute("SELECT id, path, size, mtime FROM docs")
+        }
+
+        files = list(files)
+        rels = [self._rel(file_path) for file_path in files]
+        seen = set(rels)
+
+        if modified is not None:
+            modified = {self._rel(file_path) for file_path in modified}
+            pairs = [
+                (file_path, rel) for file_path, rel in zip(files, rels)
+                if rel in modified or rel not in known
+            ]
+            files, rels = [pair[0] for pair in pairs], [pair[1] for pair in pairs]
+
+        changed = []
+        for file_path, rel, st in zip(files, rels, parallel_map(safe_stat, files, workers)):
+            if st is None:
+                continue
+            previous = known.get(rel)
+            if previous is None or previous[1:] != (st.st_size, st.st_mtime_ns):
+                changed.append((file_path, rel, st))
+
+        term_counts = parallel_map(
+            lambda item: self._read_terms(item[0], item[1]), changed, workers
+        )
+
+        with conn:
+            for (file_path, rel, st), counts in zip(changed, term_counts):
+                previous = known.get(rel)
+                if previous is not None:
+                    self._delete_doc(previous[0])
+
+                length = sum(counts.values())
+                cursor = conn.execute(
+                    "INSERT INTO docs (path, size, mtime, length) VALUES (?, ?, ?, ?)",
+                    (rel, st.st_size, st.st_mtime_ns, length)
+                )
+                conn.executemany(
+                    "INSERT INTO postings (term, doc_id, tf, length) VALUES (?, ?, ?, ?)",
+                    ((term, cursor.lastrowid, tf, length) for term, tf in counts.items())
+                )
+                conn.executemany(
+                    "INSERT INTO terms (term, df) VALUES (?, 1) "
+                    "ON CONFLICT (term) DO UPDATE SET df = df + 1",
+                    ((term,) for term in counts)
+                )
+
+            indexed = len(changed)
+            removed = [doc_id for path, (doc_id, _, _) in known.items() if path not in seen]
+            for doc_id in removed:
+                self._delete_doc(doc_id)
+
+            if removed or indexed:
+                conn.execute("DELETE FROM terms WHERE df <= 0")
+
+        if indexed or removed:
+            self._stats = None
+
+        return {"indexed": indexed, "removed": len(removed), "total": len(seen)}
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[Path, float]]:
+        """Rank indexed files against the query with BM25."""
+        terms = query_terms(query)
+        if not terms:
+            return []
+
+        conn = self.conn
+        if self._stats is None:
+            self._stats = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs WHERE length > 0"
+            ).fetchone()
+
+        doc_count, total_length = self._stats
+        if doc_count == 0:
+            return []
+
+        placeholders = ",".join("?" * len(terms))
+        doc_freqs = conn.execute(
+            f"SELECT term, df FROM terms WHERE term IN ({placeholders})", list(terms)
+        ).fetchall()
+
+        avg_length = total_length / doc_count
+        k = BM25_K1 * (1 - BM25_B)
+        scale = BM25_K1 * BM25_B / avg_length
+        scores: Dict[int, float] = {}
+
+        # Rarest terms first: they carry most of the score and seed the
+        # candidate set that frequent, low-idf terms are then limited to
+        for term, df in sorted(doc_freqs, key=lambda item: item[1]):
+            if df <= MAX_FULL_POSTINGS:
+                rows = conn.execute(
+                    "SELECT doc_id, tf, length FROM postings WHERE term = ?", (term,)
+                ).fetchall()
+            else:
+                leaders = heapq.nlargest(MAX_RESCORED, scores, key=scores.__getitem__)
+                rows = self._partial_postings(term, leaders)
+
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            gain = terms[term] * idf * (BM25_K1 + 1)
+            for doc_id, tf, length in rows:
+                scores[doc_id] = scores.get(doc_id, 0.0) + gain * tf / (tf + k + scale * length)
+
+        best = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        if not best:
+            return []
+
+        placeholders = ",".join("?" * len(best))
+        paths = dict(conn.execute(
+            f"SELECT id, path FROM docs WHERE id IN ({placeholders})",
+            [doc_id for doc_id, _ in best]
+        ))
+        return [(self.root_dir / paths[doc_id], score) for doc_id, score in best]
+
+    def term_weights(self, query: str) -> Dict[str, float]:
+        """Query terms weighted by their idf over the indexed files."""
+        terms = query_terms(query)
+        if not terms:
+            return {}
+
+        doc_count = self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        placeholders = ",".join("?" * len(terms))
+        doc_freqs = dict(self.conn.execute(
+            f"SELECT term, df FROM terms WHERE term IN ({placeholders})", list(terms)
+        ))
+
+        return {
+            term: weight * math.log(
+                1 + (doc_count - doc_freqs[term] + 0.5) / (doc_freqs[term] + 0.5)
+            )
+            for term, weight in terms.items() if term in doc_freqs
+        }
+
+    def _partial_postings(self, term: str, candidates: List[int]) -> List[Tuple[int, int, int]]:
+        """Postings of a frequent term: its highest-tf docs plus current candidates."""
+        conn = self.conn
+        rows = conn.execute(
+            "SELECT doc_id, tf, length FROM postings WHERE term = ? ORDER BY tf DESC LIMIT ?",
+            (term, MAX_FULL_POSTINGS)
+        ).fetchall()
+        seen = {row[0] for row in rows}
+
+        pending = [doc_id for doc_id in candidates if doc_id not in seen]
+        if pending:
+            placeholders = ",".join("?" * len(pending))
+            rows += conn.execute(
+                "SELECT doc_id, tf, length FROM postings "
+                f"WHERE term = ? AND doc_id IN ({placeholders})",
+                [term] + pending
+            ).fetchall()
+
+        return rows
@@ -0,0 +1,395 @@
+"""Symbol index (ctags-style) of function, class and method definitions."""
+
+import ast
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .file_index import STATE_DIR
+from .profiling import span
+from .utils import parallel_map, safe_stat
+
+SYMBOLS_DB = "symbols.db"
+SCHEMA_VERSION = 1
+
+# Files larger than this are not parsed
+MAX_PARSE_BYTES = 1024 * 1024
+
+# ast.parse is not thread-safe on CPython 3.11 (its recursion depth counter
+# is shared), so index threads read files in parallel but parse one at a time
+_AST_LOCK = threading.Lock()
+
+
+class Symbol(NamedTuple):
+    """A definition with its 1-based, inclusive line span."""
+    name: str
+    qualname: str
+    kind: str
+    start: int
+    end: int
+
+
+def parse_python(source: str) -> List[Symbol]:
+    """Extract definitions from Python source with the ast module."""
+    try:
+        with _AST_LOCK:
+            tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+
+    symbols = []
+
+    def visit(node: ast.AST, prefix: str, in_class: bool):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                is_class = isinstance(child, ast.ClassDef)
+                kind = "class" if is_class else ("method" if in_class else "function")
+                qualname = f"{prefix}{child.name}"
+                # Decorators belong to the definition
+                start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+                symbols.append(Symbol(child.name, qualname, kind, start, child.end_lineno))
+                visit(child, f"{qualname}.", is_class)
+
+    visit(tree, "", False)
+    return symbols
+
+
+_IDENT = r'[A-Za-z_$][\w$]*'
+
+_BRACE_PATTERNS: Dict[str, List[Tuple[re.Pattern, str]]] = {
+    "js": [
+        (re.compile(
+            rf'^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*({_IDENT})'
+        ), "function"),
+        (re.compile(
+            rf'^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+({_IDENT})'
+        ), "class"),
+        (re.compile(
+            rf'^\s*(?:export\s+)?(?:const|let|var)\s+({_IDENT})\s*(?::[^=]+)?=\s*(?:async\s+)?'
+            rf'(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|{_IDENT}\s*=>)'
+        ), "function"),
+        (re.compile(
+            rf'^\s*(?:export\s+)?(?:declare\s+)?(?:interface|enum|type)\s+({_IDENT})'
+        ), "type"),
+        (re.compile(
+            rf'^\s+(?:(?:public|private|protected|static|async|readonly|override|get|set)\s+)*'
+            rf'({_IDENT})\s*(?:<[^>]*>)?\([^)]*\)\s*(?::\s*[^{{;]+)?\{{'
+        ), "method"),
+    ],
+    "java": [
+        (re.compile(
+            r'^\s*(?:(?:public|private|protected|static|final|abstract|sealed|non-sealed)\s+)*'
+            r'(?:class|interface|enum|record|@interface)\s+(\w+)'
+        ), "class"),
+        (re.compile(
+            r'^\s*(?:@\w+\s+)*(?:(?:public|private|protected|static|final|abstract|synchronized|'
+            r'native|default)\s+)+(?:<[^>]+>\s+)?[\w<>\[\],.?\s]+?\s+(\w+)\s*\('
+        ), "method"),
+    ],
+    "go": [
+        (re.compile(r'^func\s+\([^)]*\)\s*(\w+)'), "method"),
+        (re.compile(r'^func\s+(\w+)'), "function"),
+        (re.compile(r'^type\s+(\w+)\s+(?:struct|interface)\b'), "class"),
+    ],
+    "rust": [
+        (re.compile(
+            r'^\s*(?:pub(?:\([^)]*\))?\s+)?(?:default\s+)?(?:const\s+)?(?:async\s+)?(?:unsafe\s+)?'
+            r'(?:extern\s+"[^"]*"\s+)?fn\s+(\w+)'
+        ), "function"),
+        (re.compile(r'^\s*(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait|union)\s+(\w+)'), "class"),
+        (re.compile(r'^\s*impl(?:<[^>]*>)?\s+(?:[\w:<>, ]+\s+for\s+)?(\w+)'), "impl"),
+    ],
+}
+
+LANGUAGES = {
+    ".py": "python",
+    ".js": "js", ".jsx": "js", ".ts": "js", ".tsx": "js",
+    ".java": "java",
+    ".go": "go",
+    ".rs": "rust",
+}
+
+# Control-flow keywords that the method pattern would otherwise pick up
+_NOT_METHODS = {"if", "for", "while", "switch", "catch", "return", "function", "with", "else"}
+
+_STRINGS_AND_COMMENTS = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`[^`]*`|//.*$')
+
+
+def _brace_depths(lines: List[str]) -> List[int]:
+    """Brace depth after each line, ignoring braces in strings and comments."""
+    depths = []
+    depth = 0
+    for line in lines:
+        code = _STRINGS_AND_COMMENTS.sub('', line)
+        depth += code.count('{') - code.count('}')
+        depths.append(depth)
+    return depths
+
+
+def _block_end(lines: List[str], depths: List[int], index: int) -> int:
+    """0-based index of the last line of the block that starts at index."""
+    base = depths[index - 1] if index > 0 else 0
+
+    # Find where the block opens; a ';' first means a bodiless declaration
+    opened = None
+    for j in range(index, min(index + 5, len(lines))):
+        if depths[j] > base:
+            opened = j
+            break
+        if ';' in _STRINGS_AND_COMMENTS.sub('', lines[j]):
+            return j
+    if opened is None:
+        return index
+
+    for k in range(opened, len(lines)):
+        if depths[k] <= base:
+            return k
+    return len(lines) - 1
+
+
+def parse_braced(source: str, language: str) -> List[Symbol]:
+    """Extract definitions from brace-delimited languages with regexes."""
+    patterns = _BRACE_PATTERNS[language]
+    lines = source.splitlines()
+    depths = _brace_depths(lines)
+    found = []
+
+    for i, line in enumerate(lines):
+        for pattern, kind in patterns:
+            m = pattern.match(line)
+            if m is None:
+                continue
+            name = m.group(1)
+            if kind == "method" and name in _NOT_METHODS:
+                continue
+            found.append((name, kind, i, _block_end(lines, depths, i)))
+            break
+
+    # Qualify members with the innermost enclosing class, struct or impl
+    containers = [s for s in found if s[1] in ("class", "impl")]
+    symbols = []
+    for name, kind, start, end in found:
+        parent = None
+        for c_name, _, c_start, c_end in containers:
+            if c_start < start and end <= c_end and (parent is None or c_start > parent[1]):
+                parent = (c_name, c_start)
+        if kind == "impl":
+            continue
+        if parent is not None and kind == "function":
+            kind = "method"
+        qualname = f"{parent[0]}.{name}" if parent else name
+        symbols.append(Symbol(name, qualname, kind, start + 1, end + 1))
+
+    return symbols
+
+
+def parse_symbols(source: str, suffix: str) -> List[Symbol]:
+    """Parse the definitions of a file based on its extension."""
+    language = LANGUAGES.get(suffix)
+    if language == "python":
+        return parse_python(source)
+    if language is not None:
+        return parse_braced(source, language)
+    return []
+
+
+_TASK_IDENT_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*(\s*\()?')
+
+
+def task_identifiers(task: str) -> List[str]:
+    """Words in a task that look like code identifiers (snake/camel/dotted/calls)."""
+    names = []
+    for m in _TASK_IDENT_RE.finditer(task):
+        word = m.group(0).rstrip('( ')
+        if (
+            '_' in word or '.' in word or m.group(1)
+            or any(c.isupper() for c in word[1:])
+        ):
+            if word not in names:
+                names.append(word)
+    return names
+
+
+class SymbolIndex:
+    """
+    Persistent table of definitions per file.
+
+    Parsed symbols are cached by content hash; ``update`` only hashes files
+    whose size or mtime changed and only parses content it has not seen.
+    """
+
+    def __init__(self, root_dir: Path = None, db_path: Path = None):
+        self.root_dir = Path(root_dir or Path.cwd()).resolve()
+        self.db_path = db_path or self.root_dir / STATE_DIR / SYMBOLS_DB
+        self._conn = None
+        self._root_prefix = str(self.root_dir) + os.sep
+        self.parsed = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            # Batch workers share one index and take turns using it
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._init_schema()
+        return self._conn
+
+    def _init_schema(self):
+        conn = self._conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            conn.executescript("""
+                DROP TABLE IF EXISTS files;
+                DROP TABLE IF EXISTS symbols;
+                DROP TABLE IF EXISTS parsed;
+            """)
+
+        conn.executescript(f"""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                hash TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS files_hash ON files (hash);
+            CREATE TABLE IF NOT EXISTS parsed (hash TEXT PRIMARY KEY) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS symbols (
+                hash TEXT NOT NULL,
+                name TEXT NOT NULL,
+                qualname TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS symbols_hash ON symbols (hash);
+            CREATE INDEX IF NOT EXISTS symbols_name ON symbols (name);
+            CREATE INDEX IF NOT EXISTS symbols_qualname ON symbols (qualname);
+            PRAGMA user_version = {SCHEMA_VERSION};
+        """)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _rel(self, file_path: Path) -> str:
+        path = str(file_path)
+        if path.startswith(self._root_prefix):
+            path = path[len(self._root_prefix):]
+        return path.replace(os.sep, '/')
+
+    @staticmethod
+    def _read_and_parse(file_path: Path) -> Optional[Tuple[str, List[Symbol]]]:
+        """Return (content hash, symbols) for a file, or None if unreadable."""
+        try:
+            with span("read", "io", path=str(file_path)), open(file_path, 'rb') as f:
+                data = f.read(MAX_PARSE_BYTES)
+        except OSError:
+            return None
+        symbols = parse_symbols(data.decode('utf-8', errors='ignore'), file_path.suffix)
+        return hashlib.sha1(data).hexdigest(), symbols
+
+    def update(
+        self, files: Iterable[Path], workers: int = None, modified: Iterable[Path] = None
+    ) -> Dict[str, int]:
+        """
+        Sync the table with the given files, parsing only new content.
+
+        With ``modified`` (the files a watcher saw change) only those and
+        files new to the table are stat'ed. Stats, reads and parsing run on
+        a bounded thread pool; the database is only written from the
+        calling thread.
+        """
+        conn = self.conn
+        known = {
+            path: (size, mtime)
+            for path, size, mtime in conn.execute("SELECT path, size, mtime FROM files")
+        }
+
+        files = [
+            file_path if isinstance(file_path, Path) else Path(file_path) for file_path in files
+        ]
+        files = [file_path for file_path in files if file_path.suffix in LANGUAGES]
+        rels = [self._rel(file_path) for file_path in files]
+        seen = set(rels)
+
+        if modified is not None:
+            modified = {self._rel(Path(file_path)) for file_path in modified}
+            pairs = [
+                (file_path, rel) for file_path, rel in zip(files, rels)
+                if rel in modified or rel not in known
+            ]
+            files, rels = [pair[0] for pair in pairs], [pair[1] for pair in pairs]
+
+        changed = []
+        # Known files that grew past the parse limit lose their stale symbols
+        oversized = []
+        for file_path, rel, st in zip(files, rels, parallel_map(safe_stat, files, workers)):
+            if st is None:
+                continue
+            if st.st_size > MAX_PARSE_BYTES:
+                if rel in known:
+                    oversized.append(rel)
+                continue
+            if known.get(rel) != (st.st_size, st.st_mtime_ns):
+                changed.append((file_path, rel, st))
+
+        results = parallel_map(lambda item: self._read_and_parse(item[0]), changed, workers)
+        parsed = 0
+
+        with conn:
+            for (file_path, rel, st), result in zip(changed, results):
+                if result is None:
+                    continue
+
+                digest, symbols = result
+                conn.execute(
+                    "INSERT OR REPLACE INTO files (path, size, mtime, hash) VALUES (?, ?, ?, ?)",
+                    (rel, st.st_size, st.st_mtime_ns, digest)
+                )
+
+                if conn.execute("SELECT 1 FROM parsed WHERE hash = ?", (digest,)).fetchone():
+                    continue
+
+                conn.execute("INSERT INTO parsed (hash) VALUES (?)", (digest,))
+                conn.executemany(
+                    "INSERT INTO symbols (hash, name, qualname, kind, start, end) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    ((digest,) + tuple(symbol) for symbol in symbols)
+                )
+                parsed += 1
+
+            removed = [path for path in known if path not in seen] + oversized
+            conn.executemany("DELETE FROM files WHERE path = ?", ((path,) for path in removed))
+
+            # Drop parse results no file points to any more
+            conn.execute("DELETE FROM symbols WHERE hash NOT IN (SELECT hash FROM files)")
+            conn.execute("DELETE FROM parsed WHERE hash NOT IN (SELECT hash FROM files)")
+
+        self.parsed += parsed
+        return {"parsed": parsed, "removed": len(removed), "total": len(seen)}
+
+    def find(self, names: Iterable[str]) -> List[Tuple[Path, Symbol]]:
+        """Definitions whose name or qualified name matches one of names."""
+        names = list(dict.fromkeys(names))
+        if not names:
+            return []
+
+        placeholders = ",".join("?" * len(names))
+        rows = self.conn.execute(
+            f"""
+            SELECT f.path, s.name, s.qualname, s.kind, s.start, s.end
+            FROM symbols s JOIN files f ON f.hash = s.hash
+            WHERE s.name IN ({placeholders}) OR s.qualname IN ({placeholders})
+            ORDER BY f.path, s.start
+            """,
+            names + names
+        ).fetchall()
+
+        return [(self.root_dir / row[0], Symbol(*row[1:])) for row in rows]
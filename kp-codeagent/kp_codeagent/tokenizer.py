@@ -0,0 +1,272 @@
+"""Token counting for prompt budgets, per model."""
+
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Real tokenizers are optional; counts fall back to a calibrated estimate
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+try:
+    from tokenizers import Tokenizer as HFTokenizer
+    HAS_TOKENIZERS = True
+except ImportError:
+    HAS_TOKENIZERS = False
+
+DEFAULT_CONTEXT_WINDOW = 8192
+# Tokens kept free for the model's answer when budgeting a prompt
+RESPONSE_TOKENS = 1024
+# Ollama's own default num_ctx is smaller than most models support
+DEFAULT_OLLAMA_NUM_CTX = 4096
+
+# Context windows by model name prefix; the longest matching prefix wins
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "o1": 200000,
+    "o3": 200000,
+    "llama-3.1": 131072,
+    "llama-3.3": 131072,
+    "llama3": 8192,
+    "llama3.1": 131072,
+    "llama2": 4096,
+    "codellama": 16384,
+    "mistral": 32768,
+    "mixtral": 32768,
+    "gemma2": 8192,
+    "qwen2.5-coder": 32768,
+}
+
+# Estimator settings per tokenizer family:
+#   letters: characters per token inside a word or identifier
+#   digits:  digits merged into one token
+#   symbols: adjacent punctuation characters per token
+#   indent:  spaces or tabs of indentation per token
+# Tuned to stay slightly under the usual chars-per-token ratios of each
+# family on source code (about 3.5 for BPE, 3 for SentencePiece), so that
+# budgets err on the safe side.
+ESTIMATOR_PROFILES = {
+    # Large BPE vocabularies (cl100k, o200k, Llama 3)
+    "bpe": {"letters": 6.0, "digits": 3, "symbols": 2.5, "indent": 8},
+    # 32k SentencePiece vocabularies (Llama 2, CodeLlama, Mistral)
+    "sentencepiece": {"letters": 4.5, "digits": 1, "symbols": 1.8, "indent": 4},
+}
+
+_BPE_MODELS = ("gpt-", "o1", "o3", "llama-3", "llama3", "qwen", "gemma")
+_OPENAI_MODELS = ("gpt-", "o1", "o3", "text-")
+
+# Words, numbers, newlines, runs of blanks and runs of symbols
+_PIECES = re.compile(r"([^\W\d]+)|(\d+)|(\n)|([ \t]+)|([^\w\s]+)")
+
+
+def _longest_prefix(model: str, table: Dict[str, int]) -> Optional[int]:
+    model = model.lower().split("/")[-1]
+    best = None
+    for prefix, value in table.items():
+        if model.startswith(prefix) and (best is None or len(prefix) > len(best[0])):
+            best = (prefix, value)
+    return best[1] if best else None
+
+
+def context_window(model: Optional[str]) -> int:
+    """Context window, in tokens, of a model (by name)."""
+    if not model:
+        return DEFAULT_CONTEXT_WINDOW
+    return _longest_prefix(model, MODEL_CONTEXT_WINDOWS) or DEFAULT_CONTEXT_WINDOW
+
+
+class Tokenizer:
+    """
+    Base tokenizer. Counts are memoized by content hash, so counting the
+    same file or prompt section again only costs a hash of the text.
+    """
+
+    name = "base"
+
+    def __init__(self, cache_size: int = 4096):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[bytes, int]" = OrderedDict()
+        # Tokenizers are shared by the I/O pool, batch workers and the daemon
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Seconds spent counting, summed across threads (run metrics)
+        self.seconds = 0.0
+
+    def _count(self, text: str) -> int:
+        raise NotImplementedError
+
+    def count(self, text: str) -> int:
+        """Number of tokens in text."""
+        if not text:
+            return 0
+
+        key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        # Counted outside the lock, so threads only wait for the memo
+        start = time.perf_counter()
+        tokens = self._count(text)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.seconds += elapsed
+            self._cache[key] = tokens
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def truncate(self, text: str, max_tokens: int, marker: str = "\n...") -> str:
+        """Cut text at a line boundary so that it fits in max_tokens."""
+        if self.count(text) <= max_tokens:
+            return text
+        if max_tokens <= 0:
+            return ""
+
+        lines = text.splitlines(keepends=True)
+        budget = max_tokens - self._count(marker)
+
+        # Largest number of leading lines that fits
+        lo, hi = 0, len(lines)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self._count("".join(lines[:mid])) <= budget:
+                lo = mid
+            else:
+                hi = mid - 1
+
+        return "".join(lines[:lo]) + marker
+
+
+class EstimatingTokenizer(Tokenizer):
+    """
+    Estimate from the shape of the text instead of a flat chars/4 ratio.
+
+    Code is mostly identifiers, symbols and indentation, which tokenize very
+    differently from prose: punctuation merges only in short runs, long
+    identifiers split every few letters, and digit grouping and indentation
+    handling depend on the tokenizer family.
+    """
+
+    def __init__(self, family: str = "sentencepiece", cache_size: int = 4096):
+        super().__init__(cache_size)
+        self.family = family
+        self.name = f"estimate:{family}"
+        profile = ESTIMATOR_PROFILES[family]
+        self._letters = profile["letters"]
+        self._digits = profile["digits"]
+        self._symbols = profile["symbols"]
+        self._indent = profile["indent"]
+
+    def _count(self, text: str) -> int:
+        tokens = 0
+        after_newline = True
+
+        for word, number, newline, blank, symbol in _PIECES.findall(text):
+            if word:
+                size = len(word)
+                if not word.isascii():
+                    # Accented and non-Latin letters rarely merge with neighbours
+                    size += sum(1 for c in word if ord(c) > 127) * (self._letters - 1)
+                tokens += math.ceil(size / self._letters)
+            elif number:
+                tokens += math.ceil(len(number) / self._digits)
+            elif newline:
+                tokens += 1
+                after_newline = True
+                continue
+            elif blank:
+                # A single space between words is merged into the next token
+                if after_newline or len(blank) > 1:
+                    tokens += math.ceil(len(blank.expandtabs(4)) / self._indent)
+            else:
+                tokens += math.ceil(len(symbol) / self._symbols)
+            after_newline = False
+
+        return tokens
+
+
+class TiktokenTokenizer(Tokenizer):
+    """Exact counts for OpenAI models via tiktoken."""
+
+    def __init__(self, model: str, cache_size: int = 4096):
+        super().__init__(cache_size)
+        try:
+            self._encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self._encoding = tiktoken.get_encoding("cl100k_base")
+        self.name = f"tiktoken:{self._encoding.name}"
+
+    def _count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+
+class HuggingFaceTokenizer(Tokenizer):
+    """Exact counts from a local tokenizer.json (KP_TOKENIZER_FILE)."""
+
+    def __init__(self, path: str, cache_size: int = 4096):
+        super().__init__(cache_size)
+        self._tokenizer = HFTokenizer.from_file(path)
+        self.name = f"tokenizers:{os.path.basename(path)}"
+
+    def _count(self, text: str) -> int:
+        return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def estimator_family(model: Optional[str]) -> str:
+    """Tokenizer family used to estimate counts for a model."""
+    name = (model or "").lower().split("/")[-1]
+    return "bpe" if name.startswith(_BPE_MODELS) else "sentencepiece"
+
+
+_TOKENIZERS: Dict[Tuple[str, str], Tokenizer] = {}
+
+
+def get_tokenizer(model: Optional[str] = None) -> Tokenizer:
+    """
+    Tokenizer for a model, shared by everything in the process.
+
+    Uses tiktoken for OpenAI models and a local Hugging Face tokenizer.json
+    (KP_TOKENIZER_FILE) for other models when those packages are installed;
+    otherwise a calibrated estimate for the model's tokenizer family.
+    """
+    model = model or ""
+    hf_path = os.getenv("KP_TOKENIZER_FILE", "")
+    key = (model, hf_path)
+
+    tokenizer = _TOKENIZERS.get(key)
+    if tokenizer is not None:
+        return tokenizer
+
+    name = model.lower()
+    try:
+        if HAS_TIKTOKEN and name.startswith(_OPENAI_MODELS):
+            tokenizer = TiktokenTokenizer(model)
+        elif HAS_TOKENIZERS and hf_path and os.path.exists(hf_path):
+            tokenizer = HuggingFaceTokenizer(hf_path)
+    except Exception:
+        # e.g. tiktoken cannot download its encoding while offline
+        tokenizer = None
+
+    if tokenizer is None:
+        tokenizer = EstimatingTokenizer(estimator_family(model))
+
+    _TOKENIZERS[key] = tokenizer
+    return tokenizer
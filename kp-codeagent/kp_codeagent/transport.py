@@ -0,0 +1,119 @@
+"""Shared keep-alive HTTP transport for the Ollama API."""
+
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+# Connections kept open per host; enough for a few concurrent streams
+DEFAULT_POOL_SIZE = 8
+
+
+def ollama_url(base_url: Optional[str] = None) -> str:
+    """Ollama base URL: the argument, else OLLAMA_URL, else localhost."""
+    return (base_url or os.getenv("OLLAMA_URL") or DEFAULT_OLLAMA_URL).rstrip("/")
+
+
+class OllamaTransport:
+    """
+    One persistent ``requests.Session`` per Ollama server.
+
+    Health checks, model listings, pulls and generations all go through the
+    same connection pool, so after the first request they reuse an open
+    keep-alive connection instead of a new TCP handshake each time.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, pool_size: int = None):
+        self.base_url = ollama_url(base_url)
+        if pool_size is None:
+            pool_size = int(os.getenv("KP_HTTP_POOL", DEFAULT_POOL_SIZE))
+
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Send a request to an API path such as ``/api/tags``."""
+        with self._lock:
+            self.requests += 1
+        return self.session.request(method, f"{self.base_url}{path}", **kwargs)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def tags(self, timeout: float) -> Dict[str, Any]:
+        """Installed models (``GET /api/tags``); raises on HTTP errors."""
+        response = self.get("/api/tags", timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def stream(self, path: str, payload: Dict[str, Any], timeout: float) -> requests.Response:
+        """POST a streaming request; read it with ``iter_json``."""
+        return self.post(path, json=payload, stream=True, timeout=timeout)
+
+    @staticmethod
+    def iter_json(response: requests.Response) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the JSON objects of a streamed (newline-delimited) response.
+
+        The body is read to the end before the final ``done`` object is
+        yielded, so the connection goes back to the pool even when the
+        caller stops there. A stream abandoned earlier closes its connection.
+        """
+        try:
+            lines = response.iter_lines()
+            for line in lines:
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("done", False):
+                    for _ in lines:
+                        pass
+                    yield data
+                    return
+                yield data
+        finally:
+            response.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Requests sent and TCP connections opened, for reuse metrics."""
+        connections = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+
+        return {
+            "requests": self.requests,
+            "connections": connections,
+            "reused": max(0, self.requests - connections),
+        }
+
+    def close(self):
+        self.session.close()
+
+
+_TRANSPORTS: Dict[str, OllamaTransport] = {}
+_TRANSPORTS_LOCK = threading.Lock()
+
+
+def get_transport(base_url: Optional[str] = None) -> OllamaTransport:
+    """Transport for an Ollama server, shared by everything in the process."""
+    url = ollama_url(base_url)
+    with _TRANSPORTS_LOCK:
+        transport = _TRANSPORTS.get(url)
+        if transport is None:
+            transport = _TRANSPORTS[url] = OllamaTransport(url)
+        return transport
@@ -1,7 +1,28 @@
 """Utility functions for KP Code Agent."""
 
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import List
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple, TypeVar
+
+from .ignore import DEFAULT_IGNORES, IgnoreRuleSet
+from .tokenizer import get_tokenizer
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+# Default number of threads for file I/O during context building
+DEFAULT_IO_WORKERS = 8
+# Most bytes of a single file ever held in memory at once
+MAX_READ_BYTES = 512 * 1024
+
+
+class FileSlice(NamedTuple):
+    """The start of a file, read up to a byte or line budget."""
+    text: str
+    size: int
+    truncated: bool
 
 
 def is_binary_file(file_path: Path) -> bool:
@@ -14,24 +35,111 @@ def is_binary_file(file_path: Path) -> bool:
         return True
 
 
+@lru_cache(maxsize=32)
+def _compile_ignore_rules(patterns: Tuple[str, ...]) -> IgnoreRuleSet:
+    return IgnoreRuleSet(DEFAULT_IGNORES + list(patterns))
+
+
 def should_ignore_file(file_path: Path, gitignore_patterns: List[str]) -> bool:
-    """Check if file should be ignored based on gitignore patterns."""
-    file_str = str(file_path)
-
-    # Default ignores
-    default_ignores = [
-        '__pycache__', '.git', 'node_modules', '.venv', 'venv',
-        '.idea', '.vscode', '*.pyc', '*.pyo', '*.so', '*.dll',
-        '*.exe', '*.bin', '*.jpg', '*.png', '*.gif', '*.pdf'
-    ]
-
-    for pattern in default_ignores + gitignore_patterns:
-        if pattern in file_str or file_str.endswith(pattern.replace('*', '')):
+    """Check if a path or any of its parents matches the ignore patterns."""
+    rules = _compile_ignore_rules(tuple(gitignore_patterns))
+    file_path = Path(file_path)
+    parts = file_path.parts[1:] if file_path.anchor else file_path.parts
+
+    for i, name in enumerate(parts):
+        is_dir = i < len(parts) - 1 or file_path.is_dir()
+        if rules.match('/'.join(parts[:i + 1]), name, is_dir):
             return True
 
     return False
 
 
-def count_tokens(text: str) -> int:
-    """Rough estimate of token count (1 token ≈ 4 characters)."""
-    return len(text) // 4
+def read_bounded(
+    file_path: Path,
+    max_bytes: int = MAX_READ_BYTES,
+    max_lines: int = None,
+    errors: str = 'ignore'
+) -> FileSlice:
+    """
+    Read a file as text, stopping at max_bytes or max_lines.
+
+    Lines are read with a byte limit, so a single huge line (a minified
+    bundle, a one-line dump) is cut as well. The total size comes from
+    fstat, never from reading the rest of the file.
+    """
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+
+        if max_lines is None:
+            data = f.read(max_bytes)
+        else:
+            parts = []
+            remaining = max_bytes
+            while remaining > 0 and len(parts) < max_lines:
+                line = f.readline(remaining)
+                if not line:
+                    break
+                parts.append(line)
+                remaining -= len(line)
+            data = b"".join(parts)
+
+        truncated = len(data) < size or bool(f.read(1))
+
+    # With errors='ignore', a multi-byte character cut at the limit is dropped
+    return FileSlice(data.decode('utf-8', errors=errors), size, truncated)
+
+
+def count_tokens(text: str, model: str = None) -> int:
+    """Token count for a model, exact when its tokenizer is installed."""
+    return get_tokenizer(model).count(text)
+
+
+def safe_stat(file_path: Path) -> Optional[os.stat_result]:
+    """os.stat that returns None instead of raising."""
+    try:
+        return os.stat(file_path)
+    except OSError:
+        return None
+
+
+def write_atomic(path: Path, text: str):
+    """Write text via a temporary file, so readers never see a partial file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def get_io_workers(workers: int = None) -> int:
+    """Resolve the I/O thread count from the argument or KP_IO_WORKERS."""
+    if workers is None:
+        try:
+            workers = int(os.getenv("KP_IO_WORKERS", DEFAULT_IO_WORKERS))
+        except ValueError:
+            workers = DEFAULT_IO_WORKERS
+    return max(1, workers)
+
+
+def parallel_map(func: Callable[[T], R], items: Sequence[T], max_workers: int = None) -> List[R]:
+    """
+    Apply func to items on a bounded thread pool, keeping input order.
+
+    Items are submitted in chunks so that large inputs (tens of thousands of
+    stat calls) do not pay one future per item.
+    """
+    items = list(items)
+    max_workers = get_io_workers(max_workers)
+
+    if max_workers == 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    chunk_size = max(1, -(-len(items) // (max_workers * 4)))
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        results = []
+        for chunk_result in executor.map(lambda chunk: [func(item) for item in chunk], chunks):
+            results.extend(chunk_result)
+        return results
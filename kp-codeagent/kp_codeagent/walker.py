@@ -0,0 +1,126 @@
+"""Single-pass directory traversal shared by the file tree and file search."""
+
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .ignore import GitIgnoreMatcher
+
+# A directory as stored in the file index:
+# {"mtime", "ino", "dirs": [names], "files": {name: [size, mtime_ns, inode]}}
+Listing = Dict[str, Any]
+
+
+class DirStats(NamedTuple):
+    """Direct contents of one directory (not recursive)."""
+    files: int
+    bytes: int
+    dirs: int
+
+
+class TreeWalk(NamedTuple):
+    """Everything a context build needs from the tree, gathered in one pass."""
+    tree: str
+    files: List[Tuple[Path, List[int]]]
+    dirs: Dict[str, DirStats]
+
+
+def scan_dir(directory: Path, rel: str, st: os.stat_result, matcher: GitIgnoreMatcher) -> Listing:
+    """
+    List a single directory with one os.scandir call.
+
+    Entry types come from the directory listing itself, so only regular files
+    are stat'ed, once each, to record their size and mtime.
+    """
+    subdirs = []
+    files = {}
+
+    with os.scandir(directory) as it:
+        entries = list(it)
+
+    # The listing already tells whether a .gitignore exists here
+    if not any(entry.name == '.gitignore' for entry in entries):
+        matcher.mark_missing(rel)
+
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if matcher.match(f"{rel}/{entry.name}" if rel else entry.name, is_dir):
+                continue
+
+            if is_dir:
+                subdirs.append(entry.name)
+            elif entry.is_file():
+                entry_st = entry.stat()
+                files[entry.name] = [entry_st.st_size, entry_st.st_mtime_ns, entry_st.st_ino]
+        except OSError:
+            continue
+
+    return {
+        "mtime": st.st_mtime_ns,
+        "ino": st.st_ino,
+        "dirs": sorted(subdirs),
+        "files": dict(sorted(files.items())),
+    }
+
+
+def disk_listing(root_dir: Path, matcher: GitIgnoreMatcher) -> Callable[[str], Optional[Listing]]:
+    """Listing source that scans directories on demand, without an index."""
+    def listing(rel: str) -> Optional[Listing]:
+        directory = root_dir / rel if rel else root_dir
+        try:
+            return scan_dir(directory, rel, os.stat(directory), matcher)
+        except OSError:
+            return None
+
+    return listing
+
+
+def walk(
+    root_dir: Path,
+    listing: Callable[[str], Optional[Listing]],
+    max_depth: int = 3
+) -> TreeWalk:
+    """
+    Visit every directory once, in sorted depth-first order.
+
+    Produces the rendered tree (down to max_depth, in the same format as the
+    original ContextBuilder), every file with its [size, mtime_ns, inode],
+    and per-directory stats. ``listing`` maps a relative directory to its
+    listing, either from the file index or straight from disk.
+    """
+    tree_lines = [f"Project Root: {root_dir.name}/"]
+    files: List[Tuple[Path, List[int]]] = []
+    dirs: Dict[str, DirStats] = {}
+
+    def visit(rel: str, prefix: str, depth: int):
+        entry = listing(rel)
+        if entry is None:
+            return
+
+        directory = root_dir / rel if rel else root_dir
+        entry_files = entry["files"]
+        files.extend((directory / name, meta) for name, meta in entry_files.items())
+        dirs[rel] = DirStats(
+            len(entry_files), sum(meta[0] for meta in entry_files.values()), len(entry["dirs"])
+        )
+
+        render = depth < max_depth
+        count = len(entry["dirs"]) + len(entry_files)
+
+        for i, name in enumerate(entry["dirs"]):
+            is_last = i == count - 1
+            child_prefix = prefix
+            if render:
+                tree_lines.append(f"{prefix}{'└── ' if is_last else '├── '}{name}/")
+                child_prefix = prefix + ("    " if is_last else "│   ")
+            visit(f"{rel}/{name}" if rel else name, child_prefix, depth + 1)
+
+        if render:
+            offset = len(entry["dirs"])
+            for i, name in enumerate(entry_files):
+                is_last = offset + i == count - 1
+                tree_lines.append(f"{prefix}{'└── ' if is_last else '├── '}{name}")
+
+    visit("", "", 0)
+    return TreeWalk("\n".join(tree_lines), files, dirs)
@@ -0,0 +1,438 @@
+"""
+Filesystem watching, so a long-lived process (the daemon) keeps its
+context indexes fresh instead of re-walking and re-stat'ing the project
+before every task.
+
+On Linux, indexed directories are watched with inotify (through ctypes, so
+no extra dependency). Elsewhere, or with KP_WATCH=poll, and for the
+directories beyond the watch budget on huge trees, a background sweep
+compares the index with the disk instead. Either way changes are coalesced
+into a ChangeSet, handed out once they have been quiet for a short
+debounce, and applied with ``ContextBuilder.apply_changes``.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Seconds a burst of changes must be quiet before it is handed out (KP_WATCH_DEBOUNCE)
+DEFAULT_DEBOUNCE = 0.2
+
+# Seconds between sweeps of the directories inotify does not cover (KP_WATCH_INTERVAL)
+DEFAULT_INTERVAL = 5.0
+
+# Most inotify watches one watcher takes (KP_WATCH_MAX), and never more
+# than half of the user's fs.inotify.max_user_watches
+DEFAULT_MAX_WATCHES = 8192
+
+# Distinct paths kept before they are collapsed into subtree rescans
+MAX_PENDING = 4096
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Entries added or removed: the directory is relisted
+LISTING_EVENTS = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+WATCH_MASK = (
+    LISTING_EVENTS | IN_MODIFY | IN_CLOSE_WRITE | IN_DELETE_SELF | IN_MOVE_SELF
+    | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK
+)
+
+# struct inotify_event {int wd; uint32_t mask, cookie, len; char name[];}
+_EVENT = struct.Struct("iIII")
+
+_libc = None
+
+
+def _parent(rel: str) -> str:
+    return rel.rpartition("/")[0]
+
+
+def _depth(rel: str) -> Tuple[int, str]:
+    """Sort key putting shallow directories first."""
+    return (rel.count("/") + 1 if rel else 0, rel)
+
+
+class ChangeSet:
+    """
+    Coalesced changes under a project root, as relative paths.
+
+    ``dirs`` had entries added or removed and are relisted; ``files`` may
+    have new contents; ``subtrees`` are rescanned and their files re-stat'ed,
+    after more changes than are worth tracking one by one; ``overflow``
+    means events were lost and the whole tree must be checked.
+    """
+
+    def __init__(self, overflow: bool = False, max_pending: int = MAX_PENDING):
+        self.dirs = set()
+        self.files = set()
+        self.subtrees = set()
+        self.overflow = overflow
+        self.max_pending = max_pending
+
+    def __bool__(self) -> bool:
+        return bool(self.overflow or self.dirs or self.files or self.subtrees)
+
+    def __len__(self) -> int:
+        return len(self.dirs) + len(self.files) + len(self.subtrees)
+
+    def _covered(self, rel: str) -> bool:
+        if not self.subtrees:
+            return False
+        while True:
+            if rel in self.subtrees:
+                return True
+            if not rel:
+                return False
+            rel = _parent(rel)
+
+    def add_dir(self, rel: str):
+        if not self._covered(rel):
+            self.dirs.add(rel)
+            self._bound()
+
+    def add_file(self, rel: str):
+        if self._covered(rel):
+            return
+        self.files.add(rel)
+        if rel.rpartition("/")[2] == ".gitignore":
+            # New ignore rules: the directory and everything below is rechecked
+            self.dirs.add(_parent(rel))
+        self._bound()
+
+    def _bound(self):
+        if len(self) <= self.max_pending:
+            return
+        # Too many to track (a checkout, an install): rescan the directories
+        # they are in, or failing that their top-level directories
+        self.subtrees.update(self.dirs, (_parent(rel) for rel in self.files))
+        self.dirs.clear()
+        self.files.clear()
+        if len(self.subtrees) > self.max_pending:
+            self.subtrees = {rel.partition("/")[0] for rel in self.subtrees}
+
+
+class Watcher:
+    """
+    Polling watcher: a background thread sweeps the indexed directories
+    every ``interval`` seconds, comparing their mtimes and their files' sizes
+    and mtimes with the index. The base of InotifyWatcher, which only
+    sweeps the directories it cannot watch.
+    """
+
+    backend = "poll"
+
+    def __init__(self, root_dir: Path, debounce: float = None, interval: float = None):
+        self.root_dir = Path(root_dir).resolve()
+        self.debounce = debounce if debounce is not None else float(
+            os.getenv("KP_WATCH_DEBOUNCE", DEFAULT_DEBOUNCE)
+        )
+        self.interval = interval if interval is not None else float(
+            os.getenv("KP_WATCH_INTERVAL", DEFAULT_INTERVAL)
+        )
+        self.events = 0
+        self.sweeps = 0
+        # Directories to sweep, with their listing as last indexed; listings
+        # are replaced, never edited, so the sweep needs no copy
+        self._polled: List[Tuple[str, Dict[str, Any]]] = []
+        self._pending = ChangeSet()
+        self._last_change = 0.0
+        self._ready = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend, "watched": 0, "polled": len(self._polled),
+            "events": self.events,
+        }
+
+    def sync(self, dirs: Dict[str, Dict[str, Any]]):
+        """Follow the index's directories (relative path -> listing)."""
+        self._polled = list(dirs.items())
+
+    def start(self) -> "Watcher":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="kp-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self._ready:
+            self._ready.notify_all()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def take(self, timeout: float = None, flush: bool = False) -> Optional[ChangeSet]:
+        """
+        The changes seen so far, once quiet for ``debounce`` seconds; waits
+        up to ``timeout`` seconds (None: until there are some or the watcher
+        stops). ``flush`` hands out whatever is pending right away, or None.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._ready:
+            if flush:
+                self._read_events()
+            while True:
+                now = time.monotonic()
+                if self._pending and (flush or now - self._last_change >= self.debounce):
+                    changes, self._pending = self._pending, ChangeSet()
+                    return changes
+                if flush or self._stopped.is_set() or (deadline is not None and now >= deadline):
+                    return None
+
+                wait = None if deadline is None else deadline - now
+                if self._pending:
+                    quiet = self._last_change + self.debounce - now
+                    wait = quiet if wait is None else min(wait, quiet)
+                self._ready.wait(wait)
+
+    def _changed(self):
+        """Called with ``_ready`` held after adding to ``_pending``."""
+        self._last_change = time.monotonic()
+        self._ready.notify_all()
+
+    def _run(self):
+        next_sweep = time.monotonic() + self.interval
+        while not self._stopped.is_set():
+            self._wait(max(0.0, next_sweep - time.monotonic()))
+            if time.monotonic() >= next_sweep:
+                self._sweep()
+                next_sweep = time.monotonic() + self.interval
+
+    def _wait(self, timeout: float):
+        self._stopped.wait(timeout)
+
+    def _read_events(self):
+        """Collect events that are ready (inotify only)."""
+
+    def _sweep(self):
+        dirs, files = [], []
+        for rel, entry in self._polled:
+            if self._stopped.is_set():
+                return
+            directory = self.root_dir / rel if rel else self.root_dir
+            try:
+                st = os.stat(directory)
+            except OSError:
+                if rel:
+                    dirs.append(_parent(rel))
+                continue
+            if st.st_mtime_ns != entry["mtime"] or st.st_ino != entry["ino"]:
+                dirs.append(rel)
+
+            for name, meta in entry["files"].items():
+                try:
+                    file_st = os.stat(directory / name)
+                except OSError:
+                    dirs.append(rel)
+                    continue
+                if [file_st.st_size, file_st.st_mtime_ns, file_st.st_ino] != meta:
+                    files.append(f"{rel}/{name}" if rel else name)
+
+        self.sweeps += 1
+        if dirs or files:
+            with self._ready:
+                for rel in dirs:
+                    self._pending.add_dir(rel)
+                for rel in files:
+                    self._pending.add_file(rel)
+                self._changed()
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        _libc = libc
+    return _libc
+
+
+def inotify_available() -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        return hasattr(_load_libc(), "inotify_init1")
+    except OSError:
+        return False
+
+
+def watch_budget() -> int:
+    """Watches to take at most: KP_WATCH_MAX, within half the user's limit."""
+    budget = int(os.getenv("KP_WATCH_MAX", DEFAULT_MAX_WATCHES))
+    try:
+        with open("/proc/sys/fs/inotify/max_user_watches") as f:
+            budget = min(budget, int(f.read()) // 2)
+    except (OSError, ValueError):
+        pass
+    return max(budget, 1)
+
+
+class InotifyWatcher(Watcher):
+    """
+    Watches up to ``max_watches`` indexed directories with inotify,
+    shallowest first, and sweeps the rest like the polling watcher. Only
+    directories are watched, one watch each, so memory stays bounded by the
+    budget however large the tree.
+    """
+
+    backend = "inotify"
+
+    def __init__(
+        self, root_dir: Path, debounce: float = None, interval: float = None,
+        max_watches: int = None
+    ):
+        super().__init__(root_dir, debounce, interval)
+        self.max_watches = max_watches or watch_budget()
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+        self._paths: Dict[int, str] = {}
+        self._watches: Dict[str, int] = {}
+
+    def status(self) -> Dict[str, Any]:
+        status = super().status()
+        status["watched"] = len(self._watches)
+        return status
+
+    def sync(self, dirs: Dict[str, Dict[str, Any]]):
+        initial = not self._watches
+        with self._ready:
+            # Drop watches first: a moved directory keeps its watch, which
+            # adding it under its new path would otherwise hand back
+            for rel in [rel for rel in self._watches if rel not in dirs]:
+                wd = self._watches.pop(rel)
+                if self._paths.pop(wd, None) is not None:
+                    self._libc.inotify_rm_watch(self._fd, wd)
+
+            if len(self._watches) < min(len(dirs), self.max_watches):
+                added = False
+                for rel in sorted((rel for rel in dirs if rel not in self._watches), key=_depth):
+                    if len(self._watches) >= self.max_watches:
+                        break
+                    path = os.fsencode(str(self.root_dir / rel if rel else self.root_dir))
+                    wd = self._libc.inotify_add_watch(self._fd, path, WATCH_MASK)
+                    if wd < 0:
+                        if ctypes.get_errno() == errno.ENOSPC:
+                            # Out of the user's watches: sweep the rest
+                            self.max_watches = len(self._watches)
+                            break
+                        # Gone or unreadable; its parent reports it
+                        continue
+                    self._watches[rel] = wd
+                    self._paths[wd] = rel
+                    if not initial:
+                        # Entries may have been created before the watch was
+                        self._pending.add_dir(rel)
+                        added = True
+                if added:
+                    self._changed()
+
+            self._polled = [(rel, entry) for rel, entry in dirs.items() if rel not in self._watches]
+
+    def stop(self):
+        super().stop()
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _wait(self, timeout: float):
+        # Wake up regularly to notice stop()
+        try:
+            readable, _, _ = select.select([self._fd], [], [], min(timeout, 0.5))
+        except (OSError, ValueError):
+            self._stopped.wait(timeout)
+            return
+        if readable:
+            with self._ready:
+                self._read_events()
+
+    def _read_events(self):
+        """Read every queued event; called with ``_ready`` held."""
+        changed = False
+        while self._fd >= 0:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except OSError:
+                # EAGAIN: the queue is empty
+                break
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                changed = self._event(wd, mask, os.fsdecode(name)) or changed
+
+        if changed:
+            self._changed()
+
+    def _event(self, wd: int, mask: int, name: str) -> bool:
+        self.events += 1
+        if mask & IN_Q_OVERFLOW:
+            # The kernel queue filled up and events were lost
+            self._pending.overflow = True
+            return True
+
+        rel = self._paths.get(wd)
+        if rel is None:
+            return False
+        if mask & IN_IGNORED:
+            # The directory is gone (its parent reports that) or was unwatched
+            del self._paths[wd]
+            if self._watches.get(rel) == wd:
+                del self._watches[rel]
+            return False
+        if not name:
+            # DELETE_SELF / MOVE_SELF: also reported by the parent
+            return False
+
+        if mask & LISTING_EVENTS:
+            self._pending.add_dir(rel)
+        if not mask & IN_ISDIR:
+            self._pending.add_file(f"{rel}/{name}" if rel else name)
+        return True
+
+
+def create_watcher(root_dir: Path) -> Optional[Watcher]:
+    """
+    The watcher KP_WATCH asks for: inotify where available (the default),
+    ``poll`` for the polling watcher, ``0`` for none.
+    """
+    mode = os.getenv("KP_WATCH", "1").lower()
+    if mode in ("0", "off", "false", "no"):
+        return None
+    if mode != "poll" and inotify_available():
+        try:
+            return InotifyWatcher(root_dir)
+        except OSError:
+            # Out of inotify instances: poll instead
+            pass
+    return Watcher(root_dir)
@@ -0,0 +1,124 @@
+"""Tests for the asyncio backend layer and its sync adapter."""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from kp_codeagent.async_llm import AsyncOllamaBackend, SyncBackend, async_backend
+from kp_codeagent.llm_client import OllamaBackend, UnifiedLLMClient
+
+# Seconds between streamed words, and how long the "hang" prompt stalls
+WORD_DELAY = 0.1
+HANG_SECONDS = 5
+
+
+class SlowOllama(BaseHTTPRequestHandler):
+    """Streams one word per WORD_DELAY; the prompt "hang" stalls after one."""
+    protocol_version = "HTTP/1.0"
+    stop = threading.Event()
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.send_response(200)
+        self.end_headers()
+
+        for word in ["one ", "two ", "three"]:
+            self._line({"response": word, "done": False})
+            if payload["prompt"] == "hang":
+                self.stop.wait(HANG_SECONDS)
+                return
+            time.sleep(WORD_DELAY)
+        self._line({"done": True, "prompt_eval_count": 3, "prompt_eval_duration": 1000})
+
+    def _line(self, data):
+        try:
+            self.wfile.write((json.dumps(data) + "\n").encode())
+            self.wfile.flush()
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def backend():
+    SlowOllama.stop.clear()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    sync = OllamaBackend(base_url=f"http://127.0.0.1:{server.server_address[1]}")
+    yield async_backend(sync)
+
+    SlowOllama.stop.set()
+    server.shutdown()
+    server.server_close()
+
+
+def test_streams_overlap_in_one_thread(backend):
+    """Several requests stream concurrently without a thread per stream."""
+    assert isinstance(backend, AsyncOllamaBackend)
+
+    async def collect():
+        return "".join([chunk async for chunk in backend.generate("hi")])
+
+    async def main():
+        try:
+            return await asyncio.gather(*(collect() for _ in range(3)))
+        finally:
+            await backend.aclose()
+
+    start = time.perf_counter()
+    results = asyncio.run(main())
+    elapsed = time.perf_counter() - start
+
+    assert results == ["one two three"] * 3
+    assert elapsed < 3 * 3 * WORD_DELAY
+    assert backend.last_response["done"]
+
+
+def test_hung_stream_is_cancelled(backend):
+    async def main():
+        chunks = []
+
+        async def consume():
+            async for chunk in backend.generate("hang"):
+                chunks.append(chunk)
+
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await backend.aclose()
+        return chunks
+
+    start = time.perf_counter()
+    assert asyncio.run(main()) == ["one "]
+    assert time.perf_counter() - start < HANG_SECONDS / 2
+
+
+def test_sync_adapter(backend):
+    """CodeAgent's blocking interface works on top of the async backend."""
+    sync = SyncBackend(backend)
+    assert "".join(sync.generate("hi")) == "one two three"
+    assert sync.last_response["prompt_eval_count"] == 3
+    assert sync.context_window == backend.backend.context_window
+
+    # Closing the iterator cancels the hung request on the event loop
+    stream = sync.generate("hang")
+    assert next(stream) == "one "
+    start = time.perf_counter()
+    stream.close()
+    assert time.perf_counter() - start < 1
+
+
+def test_client_opt_in(monkeypatch):
+    monkeypatch.setenv("KP_ASYNC", "1")
+    client = UnifiedLLMClient(backend="ollama")
+    assert isinstance(client.backend.primary, SyncBackend)
+    assert client.backend.name == "ollama"
@@ -2,7 +2,9 @@
 
 import pytest
 from pathlib import Path
-from kp_codeagent.utils import is_binary_file, should_ignore_file, count_tokens
+from kp_codeagent.utils import (
+    is_binary_file, should_ignore_file, count_tokens, get_io_workers, parallel_map
+)
 
 
 def test_count_tokens():
@@ -10,7 +12,11 @@ def test_count_tokens():
     text = "Hello world"
     tokens = count_tokens(text)
     assert tokens > 0
-    assert tokens == len(text) // 4
+    assert count_tokens("") == 0
+
+    # Code costs more tokens per character than prose
+    code = "if (x[0] != y[1]) { return {'a': 1}; }"
+    assert count_tokens(code) > len(code) // 4
 
 
 def test_should_ignore_file():
@@ -36,3 +42,22 @@ def test_binary_file_detection(tmp_path):
     binary_file = tmp_path / "test.bin"
     binary_file.write_bytes(b'\x00\x01\x02\x03')
     assert is_binary_file(binary_file)
+
+
+def test_parallel_map_keeps_order():
+    """Test that the I/O pool returns results in input order."""
+    items = list(range(1000))
+    assert parallel_map(lambda x: x * 2, items, max_workers=8) == [x * 2 for x in items]
+    assert parallel_map(lambda x: x, [], max_workers=8) == []
+    assert parallel_map(lambda x: x + 1, [1], max_workers=1) == [2]
+
+
+def test_io_workers_from_env(monkeypatch):
+    """Test I/O concurrency configuration."""
+    monkeypatch.setenv("KP_IO_WORKERS", "3")
+    assert get_io_workers() == 3
+    assert get_io_workers(5) == 5
+    assert get_io_workers(0) == 1
+
+    monkeypatch.setenv("KP_IO_WORKERS", "many")
+    assert get_io_workers() > 1
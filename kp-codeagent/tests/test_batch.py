@@ -0,0 +1,128 @@
+"""Tests for the batch task runner."""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from kp_codeagent.batch import BatchRunner, load_tasks, parse_concurrency
+
+REQUEST_SECONDS = 0.2
+
+
+class FileWritingOllama(BaseHTTPRequestHandler):
+    """Answers "create <name>" tasks with a code block for <name>.py."""
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        time.sleep(REQUEST_SECONDS)
+        with cls.lock:
+            cls.active -= 1
+
+        name = re.findall(r"create ([\w./]+)", payload["prompt"])[-1]
+        answer = f"```python:{name}.py\nNAME = {name!r}\n```\n"
+        body = "".join(json.dumps(o) + "\n" for o in [
+            {"response": answer, "done": False},
+            {"done": True, "prompt_eval_count": 10, "prompt_eval_duration": 1000},
+        ]).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    FileWritingOllama.active = FileWritingOllama.peak = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FileWritingOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OLLAMA_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setenv("KP_FAILOVER", "0")
+    (tmp_path / "existing.py").write_text("NAME = 'old'\n")
+
+    yield tmp_path
+    server.shutdown()
+    server.server_close()
+
+
+def runner(**kwargs):
+    return BatchRunner(backend="ollama", model="codellama:7b", use_cache=False, **kwargs)
+
+
+def test_load_tasks(tmp_path):
+    path = tmp_path / "tasks.jsonl"
+    path.write_text('"add docstrings"\n\n# comment\n{"id": "hints", "task": "add type hints"}\n')
+    assert load_tasks(path) == [
+        {"task": "add docstrings", "id": "1"},
+        {"id": "hints", "task": "add type hints"},
+    ]
+
+    path.write_text('{"id": "x"}\n')
+    with pytest.raises(ValueError, match="tasks.jsonl:1"):
+        load_tasks(path)
+
+    assert parse_concurrency(["groq=4"]) == {"ollama": 1, "groq": 4}
+    with pytest.raises(ValueError):
+        parse_concurrency(["groq"])
+
+
+def test_tasks_run_concurrently_per_backend_limit(project):
+    tasks = [{"id": name, "task": f"create {name}"} for name in ("a", "b", "c", "d")]
+    batch = runner(jobs=4, concurrency={"ollama": 2}, apply="all")
+    batch.prepare()
+    results = batch.run(tasks, project / "results.jsonl")
+
+    # Two requests (plan and implementation) per task, at most two at a time
+    assert FileWritingOllama.peak == 2
+    assert {r["status"] for r in results} == {"ok"}
+    for name in "abcd":
+        assert (project / f"{name}.py").read_text() == f"NAME = {name!r}"
+
+    lines = [json.loads(line) for line in (project / "results.jsonl").read_text().splitlines()]
+    assert sorted(line["id"] for line in lines) == ["a", "b", "c", "d"]
+    timings = lines[0]["timings"]
+    assert set(timings) >= {"context", "queued", "plan", "implementation", "apply", "total"}
+    assert timings["plan"] >= REQUEST_SECONDS
+
+
+def test_apply_policies(project):
+    tasks = [
+        {"id": "new", "task": "create fresh"},
+        {"id": "old", "task": "create existing"},
+        {"id": "outside", "task": "create ../outside"},
+    ]
+
+    batch = runner(apply="new")
+    batch.prepare()
+    results = {r["id"]: r for r in batch.run(tasks, project / "results.jsonl")}
+
+    assert results["new"]["files"][0]["action"] == "created"
+    assert results["old"]["files"][0]["action"] == "proposed"
+    assert (project / "existing.py").read_text() == "NAME = 'old'\n"
+    assert results["outside"]["files"][0]["action"] == "rejected"
+    assert results["outside"]["status"] == "partial"
+    assert not (project.parent / "outside.py").exists()
+
+    # With "none" nothing is written, whatever the response contains
+    batch = runner(apply="none")
+    batch.prepare()
+    result, = batch.run([{"id": "dry", "task": "create dry"}], project / "results.jsonl")
+    assert result["files"][0]["action"] == "proposed"
+    assert not (project / "dry.py").exists()
@@ -0,0 +1,67 @@
+"""Tests for bounded file reads and the context-building memory ceiling."""
+
+import tracemalloc
+
+from kp_codeagent.context_builder import ContextBuilder
+from kp_codeagent.file_handler import FileHandler
+from kp_codeagent.utils import MAX_READ_BYTES, read_bounded
+
+HUGE_BYTES = 48 * 1024 * 1024
+# Independent of HUGE_BYTES: a few bounded reads plus indexes and chunking
+MEMORY_CEILING = 16 * 1024 * 1024
+
+
+def make_huge_files(root):
+    row = b"INSERT INTO orders (id, status) VALUES (1, 'shipped');\n"
+    with open(root / "orders_dump.sql", "wb") as f:
+        block = row * 4096
+        for _ in range(HUGE_BYTES // len(block)):
+            f.write(block)
+
+    # Minified bundle: a single line
+    with open(root / "orders.min.js", "wb") as f:
+        f.write(b"var orders=[")
+        block = b"{id:1,status:'shipped'}," * 4096
+        for _ in range(HUGE_BYTES // len(block)):
+            f.write(block)
+        f.write(b"];")
+
+
+def test_read_bounded_stops_at_budget(tmp_path):
+    path = tmp_path / "lines.txt"
+    path.write_text("".join(f"line {i}\n" for i in range(1000)))
+
+    head = read_bounded(path, max_lines=10)
+    assert head.text.count("\n") == 10
+    assert head.truncated and head.size == path.stat().st_size
+
+    head = read_bounded(path, max_bytes=25)
+    assert len(head.text) == 25 and head.truncated
+
+    whole = read_bounded(path)
+    assert not whole.truncated and whole.text == path.read_text()
+
+
+def test_context_building_memory_ceiling(tmp_path, monkeypatch):
+    """Peak memory stays far below the size of the files in the project."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "orders.py").write_text(
+        "def ship_orders(orders):\n    return [o for o in orders]\n"
+    )
+    make_huge_files(tmp_path)
+
+    builder = ContextBuilder(max_tokens=4000)
+    tracemalloc.start()
+    try:
+        _, snippets = builder.build_context("ship the orders and update their status")
+        content = builder.get_file_content(tmp_path / "orders.min.js")
+        handler_content = FileHandler().read_file(tmp_path / "orders_dump.sql")
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert "orders_dump.sql" in snippets
+    assert "bytes in total" in snippets
+    assert len(content) < MAX_READ_BYTES + 100
+    assert handler_content is None  # too large to edit safely
+    assert peak < MEMORY_CEILING
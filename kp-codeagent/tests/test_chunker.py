@@ -0,0 +1,61 @@
+"""Tests for chunk splitting and knapsack packing."""
+
+from kp_codeagent.chunker import MAX_CHUNK_LINES, pack, render_chunks, split_chunks
+
+
+def big_class(methods: int) -> str:
+    body = "".join(
+        f"    def method_{i}(self):\n" + "".join(f"        x_{j} = {j}\n" for j in range(8)) + "\n"
+        for i in range(methods)
+    )
+    return f"import os\n\n\nclass Big:\n    \"\"\"Doc.\"\"\"\n\n{body}\ndef tail():\n    return 1\n"
+
+
+def test_python_chunks_follow_definitions():
+    """Large classes split into header and methods; chunks never overlap."""
+    source = big_class(10)
+    chunks = split_chunks(source, ".py")
+
+    names = [(chunk.kind, chunk.name) for chunk in chunks]
+    assert names[0] == ("block", "")
+    assert ("block", "Big") in names
+    assert ("method", "Big.method_3") in names
+    assert names[-1] == ("function", "tail")
+
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous.end < chunk.start
+
+
+def test_other_files_split_at_blank_lines():
+    """Non-code files become paragraph blocks, with long ones windowed."""
+    text = "a\nb\n\n" * 15 + "".join(f"line {i}\n" for i in range(MAX_CHUNK_LINES + 5))
+    chunks = split_chunks(text, ".md")
+
+    assert all(chunk.kind == "block" for chunk in chunks)
+    assert all(chunk.end - chunk.start < MAX_CHUNK_LINES for chunk in chunks)
+    assert chunks[-1].end == len(text.splitlines())
+
+
+def test_pack_beats_greedy_and_respects_capacity():
+    """The packer finds the best combination, not the densest-first one."""
+    values = [6.0, 5.0, 5.0]
+    weights = [60, 50, 50]
+    assert pack(values, weights, 100) == [1, 2]
+    assert pack(values, weights, 49) == []
+    assert pack([1.0, 0.0], [10, 1], 100) == [0]
+
+
+def test_render_marks_elided_regions():
+    """Skipped code becomes a marker; skipped blank lines are kept as is."""
+    source = big_class(8)
+    lines = source.splitlines(keepends=True)
+    chunks = split_chunks(source, ".py")
+    method = next(chunk for chunk in chunks if chunk.name == "Big.method_1")
+
+    rendered = render_chunks("big.py", lines, [method])
+    assert rendered.startswith("# File: big.py (excerpts)\n")
+    assert f"... (lines 1-{method.start - 1} omitted)" in rendered
+    assert "def method_1" in rendered
+    assert "def method_0" not in rendered
+
+    assert render_chunks("big.py", lines, chunks) == "# File: big.py\n" + source
@@ -0,0 +1,132 @@
+"""Tests for prompt reuse: Ollama context continuation and shared prompt prefixes."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from kp_codeagent.agent import CodeAgent
+from kp_codeagent.llm_client import OpenAIBackend
+
+
+class RecordingOllama(BaseHTTPRequestHandler):
+    """Fake /api/generate that returns a context and prompt eval timings."""
+    protocol_version = "HTTP/1.1"
+    payloads = []
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.payloads.append(payload)
+
+        evaluated = len(payload["prompt"] + payload.get("system", "")) // 4
+        context = payload.get("context", []) + list(range(evaluated + 50))
+        body = "".join(json.dumps(o) + "\n" for o in [
+            {"response": "1. Write the code\n", "done": False},
+            {"done": True, "context": context, "prompt_eval_count": evaluated,
+             "prompt_eval_duration": evaluated * 10_000_000},
+        ]).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    RecordingOllama.payloads = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RecordingOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OLLAMA_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setenv("KP_NUM_CTX", "16384")
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+    yield CodeAgent(backend="ollama", model="codellama:7b", use_cache=False)
+    server.shutdown()
+    server.server_close()
+
+
+def test_implementation_continues_plan_context(agent):
+    context = {
+        "file_tree": "Project Root: app/\n" + "".join(f"├── module_{i}.py\n" for i in range(300)),
+        "code_snippets": "# File: main.py\nprint('hello')\n",
+    }
+
+    agent.plan_solution("add a greeting", context)
+    agent.execute_plan("add a greeting", context, "plan")
+
+    plan_call, implementation_call = RecordingOllama.payloads
+    assert plan_call["keep_alive"] == implementation_call["keep_alive"]
+    assert plan_call["options"] == implementation_call["options"]
+
+    # Only the delta is sent: no system prompt, no project context
+    assert "print('hello')" in plan_call["prompt"]
+    assert "system" not in implementation_call
+    assert "module_1.py" not in implementation_call["prompt"]
+    assert "print('hello')" not in implementation_call["prompt"]
+    assert len(implementation_call["context"]) > len(plan_call["prompt"]) // 4
+
+    calls = [stats["call"] for stats in agent.prefill_stats]
+    assert calls == ["plan", "implementation"]
+    assert agent.prefill_saved() > 0
+
+
+def test_full_prompt_when_continuation_does_not_fit(agent, monkeypatch):
+    context = {"file_tree": "Project Root: app/", "code_snippets": "x = 1\n"}
+    monkeypatch.setattr(agent.client.backend.primary, "num_ctx", 4096)
+
+    agent.plan_solution("add a greeting", context)
+    agent._plan_context = list(range(4000))
+    agent.execute_plan("add a greeting", context, "plan")
+
+    plan_call, implementation_call = RecordingOllama.payloads
+    assert "context" not in implementation_call
+    assert implementation_call["system"] == agent.system_prompt
+    assert agent.prefill_saved() is None
+
+    # Both prompts start with the same project context, the task comes last
+    snippets_end = plan_call["prompt"].index("x = 1\n") + len("x = 1\n")
+    assert implementation_call["prompt"][:snippets_end] == plan_call["prompt"][:snippets_end]
+    assert plan_call["prompt"].index("add a greeting") > snippets_end
+
+
+def test_cached_prompt_tokens_are_reported():
+    """OpenAI-style usage in the final stream chunk becomes last_response."""
+    def chunk(content=None, usage=None):
+        choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content else []
+        return SimpleNamespace(choices=choices, usage=usage)
+
+    usage = SimpleNamespace(
+        prompt_tokens=2048, completion_tokens=10,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=1920)
+    )
+    backend = OpenAIBackend.__new__(OpenAIBackend)
+    backend.model = "gpt-4o"
+    backend.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=lambda **kwargs: iter([chunk("Hello"), chunk(" world"), chunk(usage=usage)])
+    )))
+
+    assert "".join(backend.generate("hi")) == "Hello world"
+    assert backend.last_response == {
+        "prompt_tokens": 2048, "completion_tokens": 10, "cached_tokens": 1920
+    }
+
+
+def test_modify_refuses_files_larger_than_the_prompt(agent, tmp_path, monkeypatch):
+    """The answer replaces the whole file, so it is never cut to fit."""
+    monkeypatch.setenv("KP_MAX_CONTEXT_TOKENS", "50")
+    source = "".join(f"def handler_{i}():\n    return {i}\n\n" for i in range(100))
+    target = tmp_path / "handlers.py"
+    target.write_text(source)
+
+    assert agent.modify_file_interactive(target, "rename the handlers") is False
+    assert RecordingOllama.payloads == []
+    assert target.read_text() == source
@@ -0,0 +1,163 @@
+"""Tests for the warm daemon and the run/modify hand-off to it."""
+
+import io
+import os
+import threading
+import time
+
+import pytest
+from click.testing import CliRunner
+
+from kp_codeagent import daemon
+from kp_codeagent.cli import cli
+from kp_codeagent.mock_server import DEFAULT_IMPLEMENTATION, DEFAULT_PLAN, MockLLMServer
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    root = tmp_path / "project"
+    root.mkdir()
+    (root / "main.py").write_text("def main():\n    pass\n")
+    monkeypatch.chdir(root)
+    monkeypatch.setenv("KP_DAEMON_DIR", str(tmp_path / "sockets"))
+    monkeypatch.setenv("KP_FAILOVER", "0")
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    return root
+
+
+@pytest.fixture
+def served(project, monkeypatch):
+    requests = []
+
+    def script(prompt):
+        requests.append(time.perf_counter())
+        return DEFAULT_PLAN if "detailed implementation plan" in prompt else DEFAULT_IMPLEMENTATION
+
+    with MockLLMServer(script=script, tokens_per_second=0) as server:
+        monkeypatch.setenv("OLLAMA_URL", server.url)
+        warm = daemon.Daemon(backend="ollama", model="codellama:7b")
+        ready = threading.Event()
+        thread = threading.Thread(
+            target=warm.serve_forever, kwargs={"ready": ready.set}, daemon=True
+        )
+        thread.start()
+        assert ready.wait(5)
+        yield warm, requests
+        assert daemon.request({"command": "stop"}) == {"exit": 0}
+        thread.join(5)
+    assert not warm.path.exists()
+
+
+def run_task(task, no_cache=True):
+    questions = []
+    output = io.StringIO()
+    reply = daemon.request(
+        {
+            "command": "run", "task": task,
+            "options": {"backend": "ollama", "model": "codellama:7b", "no_cache": no_cache}
+        },
+        stdout=output,
+        confirm=lambda prompt, default: questions.append(prompt) or True
+    )
+    return reply, output.getvalue(), questions
+
+
+def test_no_daemon_means_local(project):
+    assert daemon.request({"command": "ping"}) is None
+
+
+def test_shared_socket_dir_is_refused(project, tmp_path, capsys):
+    sockets = tmp_path / "sockets"
+    sockets.mkdir(mode=0o755)
+    sockets.chmod(0o755)
+
+    with pytest.raises(RuntimeError, match="private"):
+        daemon.Daemon()._bind()
+    assert daemon.request({"command": "ping"}) is None
+    assert "Not using the daemon" in capsys.readouterr().err
+
+
+def test_daemon_of_another_user_is_refused(served, monkeypatch, capsys):
+    real_peer_uid = daemon._peer_uid
+    monkeypatch.setattr(daemon, "_peer_uid", lambda sock, path: os.getuid() + 1)
+    assert daemon.request({"command": "ping"}) is None
+    assert "another user" in capsys.readouterr().err
+
+    monkeypatch.setattr(daemon, "_peer_uid", real_peer_uid)
+    assert daemon.request({"command": "ping"})["exit"] == 0
+
+
+def test_daemon_runs_tasks_warm(served, project):
+    warm, requests = served
+
+    reply, output, questions = run_task("add a greet function")
+    assert reply == {"exit": 0}
+    assert "def greet" in (project / "greeting.py").read_text()
+    assert "greeting.py" in output and questions
+
+    # Warm: the project is indexed and the backend checked, so the model
+    # is asked almost at once
+    (project / "greeting.py").unlink()
+    requests.clear()
+    start = time.perf_counter()
+    reply, _, _ = run_task("add a greet function again")
+    assert reply == {"exit": 0}
+    assert requests[0] - start < 0.25
+    assert daemon.request({"command": "ping"})["tasks"] == 2
+
+
+def test_cached_tasks_on_separate_connections(served, project):
+    """Each task runs on its own thread; the shared response cache follows."""
+    warm, requests = served
+
+    reply, _, _ = run_task("add a greet function", no_cache=False)
+    assert reply == {"exit": 0}
+    asked = len(requests)
+
+    (project / "greeting.py").unlink()
+    reply, output, _ = run_task("add a greet function", no_cache=False)
+    assert reply == {"exit": 0}, output
+    # The plan was replayed from the cache
+    assert len(requests) - asked < asked
+    assert (project / "greeting.py").exists()
+
+
+def test_cli_hands_run_to_the_daemon(served, project):
+    warm, _ = served
+
+    result = CliRunner().invoke(cli, ["--no-cache", "run", "add a greet function"],
+                                input="y\ny\ny\n")
+    assert result.exit_code == 0, result.output
+    assert warm.tasks == 1
+    assert (project / "greeting.py").exists()
+
+    # --no-daemon stays in this process
+    (project / "greeting.py").unlink()
+    result = CliRunner().invoke(cli, ["--no-daemon", "--no-cache", "--backend", "ollama",
+                                      "--model", "codellama:7b", "run", "add a greet function"],
+                                input="y\ny\ny\n")
+    assert result.exit_code == 0, result.output
+    assert warm.tasks == 1
+
+
+def test_tasks_with_other_settings_run_locally(served, project, monkeypatch):
+    warm, _ = served
+
+    monkeypatch.setenv("KP_MAX_RETRIES", "1")
+    reply, output, _ = run_task("add a greet function")
+    assert reply["local"] and output == ""
+
+    result = CliRunner().invoke(cli, ["--no-cache", "--backend", "ollama",
+                                      "--model", "codellama:7b", "run", "add a greet function"],
+                                input="y\ny\ny\n")
+    assert result.exit_code == 0, result.output
+    assert warm.tasks == 0
+    assert (project / "greeting.py").exists()
+
+    # The client's language is sent with the task, so it does not count
+    monkeypatch.delenv("KP_MAX_RETRIES")
+    monkeypatch.setenv("KP_LANG", "es")
+    (project / "greeting.py").unlink()
+    assert run_task("add a greet function")[0] == {"exit": 0}
+    assert warm.tasks == 1
@@ -0,0 +1,85 @@
+"""Tests for the persistent file index."""
+
+import os
+from pathlib import Path
+from kp_codeagent.file_index import FileIndex
+
+
+def make_project(root: Path):
+    (root / "src").mkdir()
+    (root / "src" / "app.py").write_text("print('hi')\n")
+    (root / "docs").mkdir()
+    (root / "docs" / "guide.md").write_text("# Guide\n")
+    (root / "__pycache__").mkdir()
+    (root / "__pycache__" / "app.cpython-311.pyc").write_bytes(b"\x00")
+
+
+def test_index_persists_and_reuses_unchanged_dirs(tmp_path):
+    """A second refresh only rescans directories whose mtime changed."""
+    make_project(tmp_path)
+
+    index = FileIndex(tmp_path)
+    stats = index.update()
+    assert stats["scanned_dirs"] == 3
+    assert index.index_path.exists()
+
+    files = sorted(p.relative_to(tmp_path).as_posix() for p, _ in index.iter_files())
+    assert files == ["docs/guide.md", "src/app.py"]
+
+    # Touch a new file in src/ only and move its mtime forward
+    (tmp_path / "src" / "util.py").write_text("x = 1\n")
+    os.utime(tmp_path / "src", ns=(0, os.stat(tmp_path / "src").st_mtime_ns + 10**9))
+
+    reloaded = FileIndex(tmp_path)
+    stats = reloaded.update()
+    assert stats["scanned_dirs"] == 1
+    assert stats["reused_dirs"] == 2
+    assert "util.py" in reloaded.dirs["src"]["files"]
+
+
+def test_index_drops_removed_dirs_and_renders_tree(tmp_path):
+    """Removed directories disappear from the index and the rendered tree."""
+    make_project(tmp_path)
+    index = FileIndex(tmp_path)
+    index.update()
+
+    (tmp_path / "docs" / "guide.md").unlink()
+    (tmp_path / "docs").rmdir()
+
+    stats = index.refresh()
+    assert stats["removed_dirs"] == 1
+
+    tree = index.render_tree()
+    assert "src/" in tree
+    assert "docs/" not in tree
+    assert "__pycache__" not in tree
+
+
+def test_index_status_reports_stale_dirs(tmp_path):
+    """Status compares stored mtimes without rescanning."""
+    make_project(tmp_path)
+    FileIndex(tmp_path).update()
+
+    (tmp_path / "docs" / "new.md").write_text("new\n")
+    os.utime(tmp_path / "docs", ns=(0, os.stat(tmp_path / "docs").st_mtime_ns + 10**9))
+
+    status = FileIndex(tmp_path).status()
+    assert status["exists"]
+    assert status["files"] == 2
+    assert status["stale_dirs"] == 1
+
+
+def test_index_rescans_subtree_when_gitignore_edited(tmp_path):
+    """Editing a nested .gitignore in place reapplies its rules below it."""
+    make_project(tmp_path)
+    (tmp_path / "src" / ".gitignore").write_text("# nothing yet\n")
+    index = FileIndex(tmp_path)
+    index.update()
+    assert "app.py" in index.dirs["src"]["files"]
+
+    src_mtime = os.stat(tmp_path / "src").st_mtime_ns
+    (tmp_path / "src" / ".gitignore").write_text("app.py\n")
+    os.utime(tmp_path / "src", ns=(0, src_mtime))
+
+    index.refresh()
+    assert "app.py" not in index.dirs["src"]["files"]
@@ -0,0 +1,74 @@
+"""Tests for memoized backend health checks."""
+
+import pytest
+import requests
+
+from kp_codeagent import health
+from kp_codeagent.llm_client import UnifiedLLMClient
+from kp_codeagent.ollama_client import OllamaClient
+
+
+class FakeTransport:
+    """Stands in for the shared transport, counting GET /api/tags calls."""
+
+    def __init__(self, refuse=False):
+        self.refuse = refuse
+        self.calls = 0
+
+    def tags(self, timeout):
+        self.calls += 1
+        if self.refuse:
+            raise requests.exceptions.ConnectionError("refused")
+        return {"models": [{"name": "codellama:7b"}]}
+
+
+@pytest.fixture
+def transport(tmp_path, monkeypatch):
+    """A fake Ollama server, in a fresh project dir and process memo."""
+    fake = FakeTransport()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(health, "get_transport", lambda base_url=None: fake)
+    monkeypatch.setattr(health, "_memo", {})
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    return fake
+
+
+def test_startup_makes_one_health_request(transport):
+    """Auto-detection, check_setup and the CLI checks share one /api/tags."""
+    client = UnifiedLLMClient(backend="auto")
+    assert client.backend.name == "ollama"
+    assert client.check_setup() == (True, "Ready")
+
+    ollama = OllamaClient(model="codellama:7b")
+    assert ollama.is_running()
+    assert ollama.is_model_available()
+    assert not OllamaClient(model="missing:1b").is_model_available()
+
+    assert transport.calls == 1
+
+
+def test_results_persist_for_the_ttl(transport, monkeypatch):
+    url = "http://localhost:11434"
+    assert health.ollama_models(url) == ["codellama:7b"]
+
+    # A new process reads the state file instead of probing again
+    monkeypatch.setattr(health, "_memo", {})
+    assert health.ollama_models(url) == ["codellama:7b"]
+    assert transport.calls == 1
+
+    monkeypatch.setenv("KP_HEALTH_TTL", "0")
+    health.ollama_models(url)
+    assert transport.calls == 2
+
+
+def test_failures_are_not_persisted(transport, monkeypatch):
+    transport.refuse = True
+
+    assert not OllamaClient().is_running()
+    assert not OllamaClient().is_model_available()
+    assert transport.calls == 1
+
+    monkeypatch.setattr(health, "_memo", {})
+    assert not OllamaClient().is_running()
+    assert transport.calls == 2
@@ -0,0 +1,65 @@
+"""Tests for the compiled gitignore matcher."""
+
+from pathlib import Path
+from kp_codeagent.ignore import GitIgnoreMatcher, IgnoreRuleSet
+from kp_codeagent.utils import should_ignore_file
+
+
+def matches(patterns, path, is_dir=False):
+    return IgnoreRuleSet(patterns).match(path, path.rsplit('/', 1)[-1], is_dir)
+
+
+def test_literal_patterns_match_whole_names():
+    """A name pattern no longer matches as a substring."""
+    assert matches(["build"], "build", is_dir=True)
+    assert matches(["build"], "src/build", is_dir=True)
+    assert matches(["build"], "rebuild.py") is None
+    assert not should_ignore_file(Path("rebuild.py"), ["build"])
+    assert should_ignore_file(Path("build/out.js"), ["build"])
+
+
+def test_anchoring_and_directory_only():
+    """Leading or inner slashes anchor; a trailing slash only matches directories."""
+    assert matches(["/dist"], "dist", is_dir=True)
+    assert matches(["/dist"], "pkg/dist", is_dir=True) is None
+    assert matches(["docs/api"], "docs/api", is_dir=True)
+    assert matches(["docs/api"], "src/docs/api", is_dir=True) is None
+    assert matches(["logs/"], "logs", is_dir=True)
+    assert matches(["logs/"], "logs") is None
+
+
+def test_globs_and_double_star():
+    """Single stars stop at slashes; double stars cross directories."""
+    assert matches(["*.log"], "a/b/debug.log")
+    assert matches(["src/*.js"], "src/app.js")
+    assert matches(["src/*.js"], "src/lib/app.js") is None
+    assert matches(["**/tmp"], "a/b/tmp", is_dir=True)
+    assert matches(["a/**/z.txt"], "a/z.txt")
+    assert matches(["a/**/z.txt"], "a/b/c/z.txt")
+    assert matches(["out/**"], "out/x/y.o")
+    assert matches(["file[0-9].txt"], "file7.txt")
+    assert matches(["file[!0-9].txt"], "file7.txt") is None
+
+
+def test_negation_uses_last_matching_rule():
+    """Later rules win, so a negation can re-include a file."""
+    assert matches(["*.log", "!keep.log"], "keep.log") is False
+    assert matches(["*.log", "!keep.log"], "other.log") is True
+    assert matches(["!keep.log", "*.log"], "keep.log") is True
+
+
+def test_nested_gitignore_files(tmp_path):
+    """Deeper .gitignore files take precedence and are relative to their directory."""
+    (tmp_path / ".gitignore").write_text("*.tmp\n/generated\n")
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / ".gitignore").write_text("!important.tmp\ncache/\n")
+
+    matcher = GitIgnoreMatcher(tmp_path)
+    assert matcher.match("scratch.tmp", False)
+    assert not matcher.match("pkg/important.tmp", False)
+    assert matcher.match("pkg/other.tmp", False)
+    assert matcher.match("generated", True)
+    assert not matcher.match("pkg/generated", True)
+    assert matcher.match("pkg/cache", True)
+    assert not matcher.match("cache", True)
+    assert matcher.is_ignored("node_modules/left-pad/index.js")
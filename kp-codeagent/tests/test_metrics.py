@@ -0,0 +1,117 @@
+"""Tests for per-run metrics and their JSON / Prometheus export."""
+
+import json
+
+from click.testing import CliRunner
+from rich.prompt import Confirm
+
+from kp_codeagent.cli import cli
+from kp_codeagent.metrics import RunMetrics
+from kp_codeagent.mock_server import MockLLMServer
+
+
+def test_track_stream_records_call():
+    metrics = RunMetrics()
+    usage = {"prompt_eval_count": 42, "eval_count": 3}
+    stream = metrics.track_stream("plan", iter(["a", " b", " c"]), prompt_tokens=40,
+                                  last_response=lambda: usage)
+
+    assert "".join(stream) == "a b c"
+    call, = metrics.llm_calls
+    assert call["call"] == "plan" and call["status"] == "ok"
+    assert call["prompt_tokens"] == 42 and call["output_tokens"] == 3
+    assert call["ttft"] is not None and call["duration"] >= call["ttft"]
+
+    # A stream that fails still leaves a record, with the estimate given
+    def failing():
+        yield "x"
+        raise RuntimeError("dropped")
+
+    try:
+        list(metrics.track_stream("implementation", failing(), prompt_tokens=7))
+    except RuntimeError:
+        pass
+    assert metrics.llm_calls[-1]["status"] == "error"
+    assert metrics.llm_calls[-1]["prompt_tokens"] == 7
+
+
+def test_prometheus_text_escapes_labels():
+    metrics = RunMetrics()
+    metrics.info["model"] = 'odd"model'
+    with metrics.phase("plan"):
+        pass
+    metrics.finish("success")
+
+    text = metrics.prometheus_text()
+    assert "# TYPE kp_codeagent_phase_duration_seconds gauge" in text
+    assert 'kp_codeagent_phase_duration_seconds{model="odd\\"model",phase="plan"}' in text
+    assert 'status="success"' in text
+
+
+def test_run_exports_metrics(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("KP_FAILOVER", "0")
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(Confirm, "ask", classmethod(lambda cls, *args, **kwargs: True))
+    (tmp_path / "main.py").write_text("def main():\n    pass\n")
+
+    with MockLLMServer(ttft=0.1, tokens_per_second=500) as server:
+        monkeypatch.setenv("OLLAMA_URL", server.url)
+        result = CliRunner().invoke(cli, [
+            "--backend", "ollama", "--model", "codellama:7b", "--no-cache",
+            "--metrics-out", "out/metrics.json", "--prometheus-out", "out/kp.prom",
+            "run", "add a greet function",
+        ])
+
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "greeting.py").exists()
+
+    data = json.loads((tmp_path / "out" / "metrics.json").read_text())
+    assert data["status"] == "success"
+    assert data["backend"] == "ollama" and data["model"] == "codellama:7b"
+    assert set(data["phases"]) >= {
+        "setup_check", "analyze_context", "plan", "implementation", "apply"
+    }
+    assert set(data["context"]) >= {
+        "walk", "search", "read_and_score", "ignore_matching", "token_counting"
+    }
+    assert data["context"]["paths_matched"] > 0
+
+    calls = {call["call"]: call for call in data["llm_calls"]}
+    assert set(calls) == {"plan", "implementation"}
+    assert calls["plan"]["ttft"] >= 0.1
+    assert calls["plan"]["output_tokens"] > 0 and calls["plan"]["tokens_per_second"]
+
+    prom = (tmp_path / "out" / "kp.prom").read_text()
+    labels = 'backend="ollama",model="codellama:7b",call="plan"'
+    assert f"kp_codeagent_llm_ttft_seconds{{{labels}}}" in prom
+    assert not list((tmp_path / "out").glob(".*.tmp"))
+
+
+def test_failed_modify_still_exports_metrics(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("KP_FAILOVER", "0")
+    monkeypatch.setenv("KP_MAX_RETRIES", "0")
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    (tmp_path / "main.py").write_text("def main():\n    pass\n")
+
+    def broken(prompt):
+        raise ConnectionResetError("model crashed")
+
+    with MockLLMServer(script=broken) as server:
+        monkeypatch.setenv("OLLAMA_URL", server.url)
+        result = CliRunner().invoke(cli, [
+            "--no-cache", "--no-daemon", "--metrics-out", "metrics.json",
+            "modify", "main.py", "add a docstring",
+        ])
+
+    assert result.exit_code == 1
+    assert "✗ Error" in result.output
+    assert (tmp_path / "main.py").read_text() == "def main():\n    pass\n"
+
+    data = json.loads((tmp_path / "metrics.json").read_text())
+    assert data["command"] == "modify" and data["status"] == "error"
+    assert "setup_check" in data["phases"]
+    assert [call["status"] for call in data["llm_calls"]] == ["error"]
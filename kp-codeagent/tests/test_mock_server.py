@@ -0,0 +1,55 @@
+"""Tests for the bundled mock LLM server."""
+
+import time
+
+import pytest
+
+from kp_codeagent.llm_client import GroqBackend, OllamaBackend
+from kp_codeagent.mock_server import DEFAULT_IMPLEMENTATION, MockLLMServer, split_tokens
+
+
+@pytest.fixture
+def server():
+    with MockLLMServer(ttft=0.2, tokens_per_second=200) as server:
+        yield server
+
+
+def test_split_tokens():
+    text = "def f():\n    return 1\n"
+    assert "".join(split_tokens(text)) == text
+    assert split_tokens("a  b") == ["a", "  b"]
+
+
+def test_ollama_protocol(server):
+    backend = OllamaBackend(base_url=server.url)
+    assert backend.is_available()
+
+    stream = backend.generate("write the code")
+    start = time.perf_counter()
+    first = next(stream)
+    ttft = time.perf_counter() - start
+    text = first + "".join(stream)
+
+    assert text == DEFAULT_IMPLEMENTATION
+    assert 0.2 <= ttft < 1
+    assert backend.last_response["eval_count"] == len(split_tokens(text))
+    assert backend.last_response["context"]
+
+
+def test_openai_compatible_protocol(server, monkeypatch):
+    pytest.importorskip("groq")
+    monkeypatch.setenv("GROQ_BASE_URL", server.url)
+    monkeypatch.setenv("KP_RATE_LIMIT", "0")
+
+    backend = GroqBackend(api_key="gsk_mock")
+    text = "".join(backend.generate("make an implementation plan", system="be brief"))
+
+    assert text.startswith("1. Create")
+    assert server.requests[-1]["path"] == "/openai/v1/chat/completions"
+    assert backend.last_response["completion_tokens"] == len(split_tokens(text))
+
+
+def test_scripted_answers():
+    with MockLLMServer(script=lambda prompt: prompt.upper()) as server:
+        backend = OllamaBackend(base_url=server.url)
+        assert "".join(backend.generate("echo me")) == "ECHO ME"
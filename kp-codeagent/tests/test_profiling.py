@@ -0,0 +1,77 @@
+"""Tests for --profile span tracing and the cProfile dump."""
+
+import json
+import pstats
+import threading
+
+from click.testing import CliRunner
+from rich.prompt import Confirm
+
+from kp_codeagent import profiling
+from kp_codeagent.cli import cli
+from kp_codeagent.mock_server import MockLLMServer
+from kp_codeagent.profiling import Profiler, span, trace_stream
+
+
+def test_spans_are_no_ops_without_a_profiler():
+    with span("anything", path="x") as args:
+        assert args is None
+    stream = iter(["a"])
+    assert trace_stream("llm", stream) is stream
+
+
+def test_profiler_records_nested_spans_per_thread(tmp_path):
+    trace_path = tmp_path / "trace.json"
+    with Profiler(trace_path):
+        with span("outer", "test", step=1) as args:
+            args["result"] = "ok"
+            with span("inner", "test"):
+                pass
+
+            def read():
+                with span("worker", "test"):
+                    pass
+
+            worker = threading.Thread(target=read, name="io-1")
+            worker.start()
+            worker.join()
+        assert list(trace_stream("stream", iter(["a", "b"]))) == ["a", "b"]
+    assert profiling._tracer is None
+
+    events = json.loads(trace_path.read_text())["traceEvents"]
+    spans = {e["name"]: e for e in events if e["ph"] == "X"}
+    outer, inner = spans["outer"], spans["inner"]
+    assert outer["args"] == {"step": 1, "result": "ok"}
+    assert outer["ts"] <= inner["ts"] and inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+    assert spans["stream"]["args"]["chunks"] == 2
+    assert any(e["name"] == "first token" for e in events)
+    threads = {e["args"]["name"] for e in events if e["name"] == "thread_name"}
+    assert {"io-1", "MainThread"} <= threads
+
+
+def test_profile_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("KP_FAILOVER", "0")
+    monkeypatch.delenv("GROQ_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(Confirm, "ask", classmethod(lambda cls, *args, **kwargs: True))
+    (tmp_path / "main.py").write_text("def main():\n    pass\n")
+
+    with MockLLMServer(tokens_per_second=0) as server:
+        monkeypatch.setenv("OLLAMA_URL", server.url)
+        result = CliRunner().invoke(cli, [
+            "--backend", "ollama", "--model", "codellama:7b", "--no-cache",
+            "--profile", "trace.json", "--profile-cpu", "run.prof",
+            "run", "add a greet function",
+        ])
+
+    assert result.exit_code == 0, result.output
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    names = {e["name"] for e in events}
+    assert {"analyze_context", "context.walk", "index.update", "read", "plan",
+            "llm.generate", "first token", "apply", "confirm", "write"} <= names
+    llm = [e for e in events if e["name"] == "llm.generate"]
+    assert len(llm) == 2 and llm[0]["args"]["backend"] == "ollama"
+
+    stats = pstats.Stats(str(tmp_path / "run.prof"))
+    assert any(func[2] == "build_context" for func in stats.stats)
@@ -0,0 +1,119 @@
+"""Tests for the shared token-bucket rate limiter."""
+
+import multiprocessing
+from types import SimpleNamespace
+
+from kp_codeagent.llm_client import GroqBackend
+from kp_codeagent.rate_limit import RateLimiter
+
+
+class FakeClock:
+    """Clock whose sleeps advance time instantly."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def limiter(tmp_path, clock, **kwargs):
+    return RateLimiter("gsk_shared", state_dir=tmp_path, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_unknown_limits_do_not_wait(tmp_path):
+    clock = FakeClock()
+    assert limiter(tmp_path, clock).acquire(50_000) == 0
+
+
+def test_limits_are_learned_from_headers(tmp_path):
+    clock = FakeClock()
+    first = limiter(tmp_path, clock)
+    first.observe({
+        "x-ratelimit-limit-requests": "30",
+        "x-ratelimit-remaining-requests": "29",
+        "x-ratelimit-limit-tokens": "6000",
+        "x-ratelimit-remaining-tokens": "1000",
+    })
+
+    # Another process using the key sees the same buckets
+    second = limiter(tmp_path, clock)
+    assert second.limit("tokens") == 6000
+    assert second.acquire(1000) == 0
+
+    # The bucket is empty: the next request is queued until 3000 tokens refill
+    assert second.acquire(3000) == 30.0
+    assert clock.sleeps == [30.0]
+
+
+def test_requests_per_minute(tmp_path):
+    clock = FakeClock()
+    limit = limiter(tmp_path, clock, rpm=2)
+    limit.acquire()
+    limit.acquire()
+    assert limit.acquire() == 30.0
+    assert limit.waited == 30.0
+
+
+def test_usage_and_retry_after(tmp_path):
+    clock = FakeClock()
+    limit = limiter(tmp_path, clock, tpm=1000)
+
+    # The estimate was low: the real usage empties the bucket
+    limit.acquire(100)
+    limit.settle(100, 1000)
+    assert limit.acquire(60) == 60 * 60 / 1000
+
+    limit.penalize(20)
+    start = clock.now
+    limit.acquire(0)
+    assert clock.now - start >= 20
+
+
+def _take(args):
+    state_dir, count = args
+    # Time stands still, so nothing refills while the processes race
+    limit = RateLimiter("gsk_shared", rpm=1000, state_dir=state_dir, clock=lambda: 1000.0)
+    for _ in range(count):
+        limit.acquire()
+
+
+def test_processes_share_one_bucket(tmp_path):
+    with multiprocessing.get_context("spawn").Pool(3) as pool:
+        pool.map(_take, [(str(tmp_path), 20)] * 3)
+
+    # 60 requests were taken from the bucket, none lost to a race
+    limit = RateLimiter("gsk_shared", rpm=1000, state_dir=tmp_path, clock=lambda: 1000.0)
+    with limit._state() as state:
+        assert state["requests"] == 1000 - 60
+
+
+def test_groq_backend_feeds_the_limiter(tmp_path):
+    clock = FakeClock()
+    headers = {"x-ratelimit-limit-tokens": "6000", "x-ratelimit-remaining-tokens": "5000"}
+
+    class Stream:
+        response = SimpleNamespace(headers=headers)
+
+        def __iter__(self):
+            usage = SimpleNamespace(prompt_tokens=900, completion_tokens=100)
+            delta = SimpleNamespace(content="ok")
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+            yield SimpleNamespace(choices=[], usage=None, x_groq=SimpleNamespace(usage=usage))
+
+    backend = GroqBackend.__new__(GroqBackend)
+    backend.model = "llama-3.3-70b-versatile"
+    backend.rate_limiter = limiter(tmp_path, clock)
+    backend.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=lambda **kwargs: Stream()
+    )))
+
+    assert "".join(backend.generate("hello")) == "ok"
+    with backend.rate_limiter._state() as state:
+        # 5000 remaining, minus what the response used beyond the estimate
+        assert 4000 <= state["tokens"] < 4010
@@ -0,0 +1,46 @@
+"""Tests for the buffered stream renderer."""
+
+import io
+
+from rich.console import Console
+from kp_codeagent.render import StreamRenderer
+
+
+def test_terminal_output_is_batched_into_frames():
+    """Many chunks become a few writes, and brackets are not markup."""
+    out = io.StringIO()
+    console = Console(file=out, force_terminal=True, color_system=None)
+    renderer = StreamRenderer(console, max_fps=1)
+
+    chunks = ["items", "[bold]", "[i]"] + [" tok"] * 500
+    result = renderer.stream(iter(chunks))
+
+    assert result == "".join(chunks)
+    assert renderer.frames <= 2
+    assert out.getvalue() == "".join(chunks)
+
+
+def test_plain_output_bypasses_rich():
+    """Without a terminal, text is written to the file untouched."""
+    out = io.StringIO()
+    renderer = StreamRenderer(Console(file=out, force_terminal=False))
+    assert renderer.plain
+
+    renderer.stream(["def f():\n", "    return a[0]\n"])
+    assert out.getvalue() == "def f():\n    return a[0]\n"
+
+
+def test_partial_stream_is_flushed_on_error():
+    """Text received before a failure still reaches the screen."""
+    out = io.StringIO()
+    renderer = StreamRenderer(Console(file=out, force_terminal=False), max_fps=1)
+
+    def failing():
+        yield "partial "
+        raise KeyboardInterrupt
+
+    try:
+        renderer.stream(failing())
+    except KeyboardInterrupt:
+        pass
+    assert out.getvalue() == "partial "
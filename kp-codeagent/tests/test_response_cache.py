@@ -0,0 +1,102 @@
+"""Tests for the persistent response cache."""
+
+import pytest
+
+from kp_codeagent.errors import LLMError
+from kp_codeagent.llm_client import LLMBackend, UnifiedLLMClient
+from kp_codeagent.response_cache import ResponseCache
+from kp_codeagent.router import Router
+
+
+class FakeBackend(LLMBackend):
+    name = "fake"
+    model = "fake-model"
+
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+        self.calls = 0
+
+    def is_available(self):
+        return True
+
+    def generate(self, prompt, system=None, temperature=0.7, timeout=120):
+        self.calls += 1
+        yield from self.chunks
+        if self.error:
+            raise self.error
+
+
+def make_client(tmp_path, chunks, error=None):
+    client = UnifiedLLMClient.__new__(UnifiedLLMClient)
+    client.backend = FakeBackend(chunks, error)
+    client.cache = ResponseCache(tmp_path)
+    return client
+
+
+def test_identical_request_is_replayed(tmp_path):
+    """A repeated request is served from disk, as a stream, with no backend call."""
+    chunks = ["def add(a, b):\n", "    return a + b\n"]
+    client = make_client(tmp_path, chunks)
+
+    first = "".join(client.generate("write add", system="sys", temperature=0))
+    second = list(client.generate("write add", system="sys", temperature=0))
+
+    assert first == "".join(second) == "".join(chunks)
+    assert len(second) == 2
+    assert client.backend.calls == 1
+    assert (client.cache.hits, client.cache.misses) == (1, 1)
+
+    # Any change to the request is a different entry
+    "".join(client.generate("write add", system="sys", temperature=0.5))
+    assert client.backend.calls == 2
+
+    # The cache persists across processes
+    reopened = ResponseCache(tmp_path)
+    key = reopened.key("fake", "fake-model", "sys", "write add", 0)
+    assert reopened.get(key) == first
+
+
+def test_failover_answers_are_stored_under_the_backend_that_gave_them(tmp_path):
+    down = FakeBackend([], LLMError("bad key", "fake", kind="auth"))
+    fallback = FakeBackend(["from the fallback"])
+    fallback.name, fallback.model = "other", "other-model"
+    client = make_client(tmp_path, [])
+    client.backend = Router([down, fallback], sleep=lambda delay: None)
+
+    assert "".join(client.generate("task", temperature=0)) == "from the fallback"
+    assert client.cache.get(client.cache.key("fake", "fake-model", None, "task", 0)) is None
+    assert client.cache.get(client.cache.key("other", "other-model", None, "task", 0))
+
+    # Asking the primary again goes to the backends, not to the cache
+    "".join(client.generate("task", temperature=0))
+    assert fallback.calls == 2
+
+
+def test_failed_or_abandoned_streams_are_not_stored(tmp_path):
+    client = make_client(tmp_path, ["partial"], LLMError("timed out", "fake", kind="timeout"))
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            "".join(client.generate("task"))
+    assert client.backend.calls == 2
+
+    client = make_client(tmp_path, ["one ", "two ", "three"])
+    stream = client.generate("other task")
+    next(stream)
+    stream.close()
+    assert client.cache.status()["entries"] == 0
+
+
+def test_lru_eviction_and_ttl(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=250)
+    for name in "abc":
+        cache.put(name, name * 100)
+        cache.get("a")  # keep "a" recently used
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.status()["bytes"] <= 250
+
+    expired = ResponseCache(tmp_path, ttl=-1)
+    assert expired.get("a") is None
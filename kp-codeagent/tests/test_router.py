@@ -0,0 +1,162 @@
+"""Tests for error classification, retries, failover and hedged requests."""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from kp_codeagent.errors import LLMError, classify_error
+from kp_codeagent.llm_client import LLMBackend
+from kp_codeagent.router import MAX_BACKOFF, Router
+
+
+class ScriptedBackend(LLMBackend):
+    """Plays one scripted outcome per call: a list of chunks or an exception."""
+
+    def __init__(self, name, *outcomes, delay=0.0, available=True):
+        self.name = name
+        self.model = f"{name}-model"
+        self.outcomes = list(outcomes)
+        self.delay = delay
+        self.available = available
+        self.calls = 0
+        self.closed = threading.Event()
+
+    def is_available(self):
+        return self.available
+
+    def generate(self, prompt, system=None, temperature=0.7, timeout=120):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        try:
+            for item in outcome:
+                if self.delay:
+                    threading.Event().wait(self.delay)
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.closed.set()
+
+
+def rate_limited():
+    return LLMError("slow down", "a", kind="rate_limit", retryable=True, retry_after=1.5)
+
+
+def router(*backends, **kwargs):
+    delays = []
+    kwargs.setdefault("max_retries", 2)
+    return Router(list(backends), sleep=delays.append, **kwargs), delays
+
+
+def test_classify_error():
+    # SDK errors carry the HTTP response, whatever their class is called
+    response = SimpleNamespace(status_code=429, headers={"retry-after": "3"})
+    sdk_error = type("APIStatusError", (Exception,), {"response": response})("quota")
+    error = classify_error(sdk_error, "groq")
+    assert (error.kind, error.retryable, error.retry_after) == ("rate_limit", True, 3.0)
+    assert str(error) == "groq: quota"
+
+    response = SimpleNamespace(status_code=401, headers={})
+    auth_error = type("AuthenticationError", (Exception,), {"response": response})("bad key")
+    assert classify_error(auth_error, "groq").kind == "auth"
+
+    assert classify_error(type("ReadTimeout", (Exception,), {})(), "ollama").kind == "timeout"
+    assert classify_error(ConnectionRefusedError(), "ollama").retryable
+    assert not classify_error(ValueError("bad"), "ollama").retryable
+
+
+def test_retries_with_backoff_then_succeeds():
+    backend = ScriptedBackend("a", [rate_limited()], [rate_limited()], ["ok"])
+    client, delays = router(backend)
+
+    assert "".join(client.generate("hi")) == "ok"
+    assert backend.calls == 3
+    assert client.stats["retries"] == 2
+    # Retry-After is a floor under the jittered backoff
+    assert all(delay >= 1.5 for delay in delays)
+
+
+def test_fails_over_to_next_available_backend():
+    primary = ScriptedBackend("a", [LLMError("down", "a", kind="server", retryable=True)])
+    offline = ScriptedBackend("b", ["never"], available=False)
+    fallback = ScriptedBackend("c", ["from ", "c"])
+    client, delays = router(primary, offline, fallback)
+
+    assert "".join(client.generate("hi")) == "from c"
+    assert primary.calls == 3 and offline.calls == 0
+    assert client.stats["failovers"] == 1
+    assert client._answered is fallback
+
+
+def test_long_retry_after_fails_over_instead_of_waiting():
+    quota = LLMError("quota", "a", kind="rate_limit", retryable=True, retry_after=3600)
+    primary = ScriptedBackend("a", [quota])
+    fallback = ScriptedBackend("b", ["ok"])
+    client, delays = router(primary, fallback)
+
+    assert "".join(client.generate("hi")) == "ok"
+    assert primary.calls == 1 and delays == []
+    assert client.backoff_delay(0, quota) == MAX_BACKOFF
+
+    # With nowhere to fail over to, the error is raised at once
+    client, delays = router(ScriptedBackend("a", [quota]))
+    with pytest.raises(LLMError, match="quota"):
+        "".join(client.generate("hi"))
+    assert delays == []
+
+
+def test_permanent_errors_are_not_retried():
+    primary = ScriptedBackend("a", [LLMError("bad key", "a", kind="auth")])
+    client, delays = router(primary)
+
+    with pytest.raises(LLMError, match="bad key"):
+        "".join(client.generate("hi"))
+    assert primary.calls == 1 and delays == []
+
+
+def test_no_retry_after_output_started():
+    reset = LLMError("reset", "a", kind="connection", retryable=True)
+    primary = ScriptedBackend("a", ["half", reset])
+    fallback = ScriptedBackend("b", ["whole"])
+    client, _ = router(primary, fallback)
+
+    chunks = []
+    with pytest.raises(LLMError, match="reset"):
+        for chunk in client.generate("hi"):
+            chunks.append(chunk)
+    assert chunks == ["half"]
+    assert primary.calls == 1 and fallback.calls == 0
+
+
+def test_context_requests_stay_on_primary():
+    primary = ScriptedBackend("a", [LLMError("down", "a", kind="server", retryable=True)])
+    fallback = ScriptedBackend("b", ["whole"])
+    client, _ = router(primary, fallback, max_retries=0)
+
+    primary.generate = lambda *args, context=None: ScriptedBackend.generate(primary, *args)
+    with pytest.raises(LLMError):
+        "".join(client.generate("hi", context=[1, 2, 3]))
+    assert fallback.calls == 0
+
+
+def test_slow_first_token_is_hedged():
+    slow = ScriptedBackend("a", ["slow"], delay=2)
+    fast = ScriptedBackend("b", ["fast ", "answer"])
+    client, _ = router(slow, fast, hedge_after=0.1)
+
+    assert "".join(client.generate("hi")) == "fast answer"
+    assert client.stats == {"retries": 0, "failovers": 0, "hedges": 1, "hedge_wins": 1}
+    assert client._answered is fast
+    # The losing request is abandoned as soon as it produces anything
+    assert slow.closed.wait(5)
+
+
+def test_fast_primary_is_not_hedged():
+    primary = ScriptedBackend("a", ["quick"])
+    hedge = ScriptedBackend("b", ["unused"])
+    client, _ = router(primary, hedge, hedge_after=1)
+
+    assert "".join(client.generate("hi")) == "quick"
+    assert hedge.calls == 0
+    assert client.stats["hedges"] == 0
@@ -0,0 +1,62 @@
+"""Tests for the BM25 content search index."""
+
+import os
+from kp_codeagent.search_index import SearchIndex, query_terms, split_identifier, tokenize
+
+
+def test_identifiers_are_split():
+    """camelCase and snake_case identifiers index their parts and the whole name."""
+    assert split_identifier("parseHTTPResponse") == ["parse", "http", "response"]
+    assert split_identifier("user_service") == ["user", "service"]
+
+    terms = list(tokenize("def load_user_config(): return UserService()"))
+    assert "load_user_config" in terms
+    assert "userservice" in terms
+    assert "config" in terms
+
+
+def test_spanish_query_is_expanded():
+    """Spanish task words match English code and accents are folded."""
+    terms = query_terms("agrega validación al archivo de usuarios")
+    assert "user" in terms
+    assert "file" in terms
+    assert "agrega" not in terms
+
+
+def test_bm25_ranks_by_content(tmp_path):
+    """A file whose contents mention the task outranks unrelated files."""
+    (tmp_path / "auth.py").write_text("def validate_password(pw):\n    return len(pw) > 8\n")
+    (tmp_path / "main.py").write_text("print('hello')\n")
+    (tmp_path / "billing.py").write_text("def compute_invoice_total(items):\n    pass\n")
+
+    index = SearchIndex(tmp_path)
+    stats = index.update(sorted(tmp_path.glob("*.py")))
+    assert stats["indexed"] == 3
+
+    results = index.search("add a check to the password validation")
+    assert results[0][0].name == "auth.py"
+
+    results = index.search("calcular total de la factura invoice")
+    assert results[0][0].name == "billing.py"
+
+
+def test_update_only_rereads_changed_files(tmp_path):
+    """Unchanged files are skipped and deleted files are dropped."""
+    a = tmp_path / "a.py"
+    b = tmp_path / "b.py"
+    a.write_text("alpha = 1\n")
+    b.write_text("beta = 2\n")
+
+    index = SearchIndex(tmp_path)
+    index.update([a, b])
+
+    b.write_text("gamma_value = 3\n")
+    os.utime(b, ns=(0, os.stat(b).st_mtime_ns + 10**9))
+    stats = index.update([a, b])
+    assert stats["indexed"] == 1
+    assert index.search("gamma")[0][0].name == "b.py"
+    assert index.search("beta") == []
+
+    stats = index.update([a])
+    assert stats["removed"] == 1
+    assert index.search("gamma") == []
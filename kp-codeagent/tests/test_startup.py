@@ -0,0 +1,54 @@
+"""Cold-start budget for the CLI: commands that need no model stay light."""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# Seconds from the first kp_codeagent import to the command's exit, in a
+# fresh interpreter; generous, as the point is to catch eager SDK imports
+BUDGETS = {"--help": 0.5, "check": 0.8}
+
+# Never needed to show help or to check Ollama
+HEAVY_MODULES = [
+    "groq", "openai", "rich.markdown", "kp_codeagent.agent", "kp_codeagent.context_builder"
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from kp_codeagent.cli import cli
+try:
+    cli(sys.argv[1:])
+except SystemExit:
+    pass
+elapsed = time.perf_counter() - start
+sys.stderr.write(json.dumps({"seconds": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def cold_start(tmp_path, *args):
+    env = dict(os.environ, HOME=str(tmp_path), OLLAMA_URL="http://127.0.0.1:9")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get("PYTHONPATH")]))
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE, *args],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60
+    )
+    return json.loads(proc.stderr.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("command", list(BUDGETS))
+def test_cold_start_budget(tmp_path, command):
+    # The first run may compile bytecode; time the second
+    cold_start(tmp_path, command)
+    result = cold_start(tmp_path, command)
+
+    assert not [name for name in HEAVY_MODULES if name in result["modules"]]
+    if command == "--help":
+        assert "requests" not in result["modules"]
+    assert result["seconds"] < BUDGETS[command]
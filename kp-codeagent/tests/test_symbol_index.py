@@ -0,0 +1,127 @@
+"""Tests for the multi-language symbol index."""
+
+import os
+from kp_codeagent import symbol_index
+from kp_codeagent.context_builder import ContextBuilder
+from kp_codeagent.symbol_index import SymbolIndex, parse_symbols, task_identifiers
+
+PY_SOURCE = '''import os
+
+
+def parse_config(path):
+    return {}
+
+
+class UserService:
+    @staticmethod
+    def find(user_id):
+        return None
+
+    async def save(self, user):
+        pass
+'''
+
+
+def spans(symbols):
+    return {(s.qualname, s.kind): (s.start, s.end) for s in symbols}
+
+
+def test_python_definitions_use_ast():
+    result = spans(parse_symbols(PY_SOURCE, ".py"))
+    assert result[("parse_config", "function")] == (4, 5)
+    assert result[("UserService", "class")] == (8, 14)
+    assert result[("UserService.find", "method")] == (9, 11)
+    assert result[("UserService.save", "method")] == (13, 14)
+
+
+def test_brace_languages_use_regex_parsers():
+    ts = (
+        "export class Cart {\n"
+        "  private items: Item[] = [];\n"
+        "  addItem(item: Item): void {\n"
+        "    if (item) { this.items.push(item); }\n"
+        "  }\n"
+        "}\n"
+        "export const total = (cart: Cart) => {\n"
+        "  return 0;\n"
+        "};\n"
+    )
+    result = spans(parse_symbols(ts, ".ts"))
+    assert result[("Cart", "class")] == (1, 6)
+    assert result[("Cart.addItem", "method")] == (3, 5)
+    assert result[("total", "function")] == (7, 9)
+
+    go = (
+        "type Server struct {\n\taddr string\n}\n\n"
+        "func (s *Server) Start() error {\n\treturn nil\n}\n"
+    )
+    result = spans(parse_symbols(go, ".go"))
+    assert result[("Server", "class")] == (1, 3)
+    assert result[("Start", "method")] == (5, 7)
+
+    rust = (
+        "struct Point { x: i32 }\n\n"
+        "impl Point {\n    pub fn norm(&self) -> i32 {\n        self.x\n    }\n}\n"
+    )
+    result = spans(parse_symbols(rust, ".rs"))
+    assert result[("Point.norm", "method")] == (4, 6)
+
+    java = (
+        "public class OrderService {\n"
+        "    public static List<Order> loadOrders(String id) {\n"
+        "        return null;\n"
+        "    }\n"
+        "}\n"
+    )
+    result = spans(parse_symbols(java, ".java"))
+    assert result[("OrderService", "class")] == (1, 5)
+    assert result[("OrderService.loadOrders", "method")] == (2, 4)
+
+
+def test_task_identifiers():
+    names = task_identifiers("make parse_config() faster and call UserService.find from main")
+    assert names == ["parse_config", "UserService.find"]
+
+
+def test_update_parses_only_changed_content(tmp_path):
+    a = tmp_path / "a.py"
+    b = tmp_path / "b.py"
+    a.write_text(PY_SOURCE)
+    b.write_text("def helper():\n    pass\n")
+
+    index = SymbolIndex(tmp_path)
+    assert index.update([a, b])["parsed"] == 2
+
+    b.write_text("def helper():\n    return 1\n")
+    os.utime(b, ns=(0, os.stat(b).st_mtime_ns + 10**9))
+    assert index.update([a, b])["parsed"] == 1
+
+    # Identical content under a new path reuses the cached parse
+    c = tmp_path / "c.py"
+    c.write_text(PY_SOURCE)
+    assert index.update([a, b, c])["parsed"] == 0
+    assert len(index.find(["parse_config"])) == 2
+
+
+def test_update_drops_files_grown_past_the_parse_limit(tmp_path, monkeypatch):
+    a = tmp_path / "a.py"
+    a.write_text(PY_SOURCE)
+    index = SymbolIndex(tmp_path)
+    index.update([a])
+    assert index.find(["parse_config"])
+
+    monkeypatch.setattr(symbol_index, "MAX_PARSE_BYTES", 16)
+    assert index.update([a])["removed"] == 1
+    assert index.find(["parse_config"]) == []
+
+
+def test_build_context_pulls_exact_definitions(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "services.py").write_text(PY_SOURCE + "\n\ndef unrelated():\n    pass\n")
+
+    _, snippets = ContextBuilder().build_context("add caching to UserService.find")
+    assert "(excerpts)" in snippets
+    assert "class UserService" in snippets
+    assert "def find(user_id)" in snippets
+    assert "def unrelated" not in snippets
+    assert "omitted)" in snippets
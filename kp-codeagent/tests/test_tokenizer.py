@@ -0,0 +1,100 @@
+"""Tests for token counting and prompt budgets."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from kp_codeagent.context_builder import ContextBuilder
+from kp_codeagent.llm_client import OllamaBackend
+from kp_codeagent.tokenizer import (
+    EstimatingTokenizer, context_window, estimator_family, get_tokenizer
+)
+
+
+def test_counts_are_memoized_by_content():
+    """Counting the same text twice only tokenizes it once."""
+    tokenizer = EstimatingTokenizer("bpe")
+    text = "def parse_config(path):\n    return load(path)\n"
+
+    first = tokenizer.count(text)
+    assert tokenizer.count(text) == first
+    assert (tokenizer.misses, tokenizer.hits) == (1, 1)
+
+    tokenizer.count(text + "\n")
+    assert tokenizer.misses == 2
+
+
+def test_shared_memo_is_thread_safe():
+    """Threads sharing a small memo keep it consistent while it evicts."""
+    tokenizer = EstimatingTokenizer("bpe", cache_size=8)
+    texts = [f"line {i % 32}\n" for i in range(4000)]
+
+    with ThreadPoolExecutor(8) as pool:
+        counts = list(pool.map(tokenizer.count, texts))
+
+    assert counts == [tokenizer.count(text) for text in texts]
+    assert tokenizer.hits + tokenizer.misses == 2 * len(texts)
+    assert len(tokenizer._cache) <= 8
+    assert tokenizer.seconds > 0
+
+
+def test_families_differ_on_digits_and_indentation():
+    """SentencePiece models spend more tokens on numbers and indentation."""
+    text = "        value = 1234567890\n"
+    assert EstimatingTokenizer("sentencepiece").count(text) > EstimatingTokenizer("bpe").count(text)
+
+    assert estimator_family("codellama:7b") == "sentencepiece"
+    assert estimator_family("llama-3.3-70b-versatile") == "bpe"
+    assert estimator_family("gpt-4o") == "bpe"
+
+
+def test_truncate_fits_budget_at_line_boundary():
+    """Truncated text fits the budget and keeps whole lines."""
+    tokenizer = get_tokenizer("codellama:7b")
+    text = "".join(f"line_{i} = compute({i})\n" for i in range(200))
+
+    cut = tokenizer.truncate(text, 100)
+    assert tokenizer.count(cut) <= 100
+    assert cut.endswith("\n...")
+    assert text.startswith(cut[:-len("\n...")])
+    assert tokenizer.truncate("short", 100) == "short"
+
+
+def test_context_windows(monkeypatch):
+    """Windows come from the model name; Ollama is capped by num_ctx."""
+    assert context_window("gpt-4o-mini") == 128000
+    assert context_window("llama-3.3-70b-versatile") == 131072
+    assert context_window("unknown-model") == 8192
+
+    monkeypatch.setenv("KP_NUM_CTX", "2048")
+    assert OllamaBackend(model="codellama:13b").context_window == 2048
+    assert OllamaBackend(model="codellama:13b", num_ctx=65536).context_window == 16384
+
+
+def test_context_fits_without_recounting_per_dropped_chunk(tmp_path, monkeypatch):
+    """Excerpts are trimmed to the budget without re-counting the whole context per chunk."""
+    monkeypatch.chdir(tmp_path)
+    for i in range(30):
+        (tmp_path / f"orders_{i}.py").write_text("".join(
+            f"def ship_orders_{j}(orders):\n    return [o for o in orders if o.ship]\n\n\n"
+            for j in range(6)
+        ))
+
+    class Recording(EstimatingTokenizer):
+        contexts = 0
+
+        def count(self, text):
+            if text.count("# File:") > 1:
+                Recording.contexts += 1
+            return super().count(text)
+
+    # Start from every chunk, far over the budget
+    monkeypatch.setattr(
+        "kp_codeagent.context_builder.pack",
+        lambda values, weights, capacity: list(range(len(values)))
+    )
+    tokenizer = Recording("bpe")
+    builder = ContextBuilder(max_tokens=1500, tokenizer=tokenizer)
+    file_tree, snippets = builder.build_context("ship the orders")
+
+    assert snippets.count("# File:") > 1
+    assert tokenizer.count(snippets) <= 1500 - tokenizer.count(file_tree)
+    assert Recording.contexts <= 4
@@ -0,0 +1,77 @@
+"""Tests for the shared keep-alive Ollama transport."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from kp_codeagent.errors import LLMError
+from kp_codeagent.llm_client import OllamaBackend
+from kp_codeagent.ollama_client import OllamaClient
+from kp_codeagent.transport import OllamaTransport, get_transport, ollama_url
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._send([{"models": [{"name": "codellama:7b"}]}])
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if payload["model"] != "codellama:7b":
+            self._send([{"error": f"model '{payload['model']}' not found"}])
+            return
+        words = ["def ", "main", "():\n", "    pass\n"]
+        self._send([{"response": w, "done": False} for w in words] + [{"done": True}])
+
+    def _send(self, objects):
+        body = "".join(json.dumps(o) + "\n" for o in objects).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllama)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_requests_reuse_one_connection(server_url):
+    """Tag listings and whole generations share a single keep-alive connection."""
+    transport = OllamaTransport(server_url)
+    backend = OllamaBackend(model="codellama:7b")
+    backend.transport = transport
+
+    for _ in range(3):
+        assert transport.tags(timeout=2)["models"][0]["name"] == "codellama:7b"
+        assert "".join(backend.generate("hi")) == "def main():\n    pass\n"
+
+    assert transport.stats() == {"requests": 6, "connections": 1, "reused": 5}
+
+
+def test_clients_share_the_transport(server_url, monkeypatch):
+    monkeypatch.setenv("OLLAMA_URL", server_url + "/")
+    assert ollama_url() == server_url
+
+    client = OllamaClient()
+    backend = OllamaBackend()
+    assert client.transport is backend.transport is get_transport(server_url)
+    assert "".join(client.generate("hi")) == "def main():\n    pass\n"
+
+
+def test_client_errors_are_not_model_output(server_url):
+    """OllamaClient raises the backend's errors instead of yielding them as text."""
+    client = OllamaClient(server_url, model="missing:1b")
+    with pytest.raises(LLMError, match="not found"):
+        client.generate_full("hi")
@@ -0,0 +1,48 @@
+"""Tests for the single-pass tree walker."""
+
+from pathlib import Path
+from kp_codeagent.file_index import FileIndex
+from kp_codeagent.ignore import GitIgnoreMatcher
+from kp_codeagent.walker import disk_listing, walk
+
+
+def make_project(root: Path):
+    (root / "src" / "pkg" / "deep").mkdir(parents=True)
+    (root / "src" / "app.py").write_text("print('hi')\n")
+    (root / "src" / "pkg" / "deep" / "core.py").write_text("x = 1\n")
+    (root / "README.md").write_text("# Readme\n")
+    (root / "node_modules").mkdir()
+    (root / "node_modules" / "lib.js").write_text("//\n")
+
+
+def test_walk_collects_tree_files_and_stats(tmp_path):
+    """One pass yields the tree, every file and per-directory stats."""
+    make_project(tmp_path)
+    scan = walk(tmp_path, disk_listing(tmp_path, GitIgnoreMatcher(tmp_path)), max_depth=2)
+
+    assert scan.tree.splitlines() == [
+        f"Project Root: {tmp_path.name}/",
+        "├── src/",
+        "│   ├── pkg/",
+        "│   └── app.py",
+        "└── README.md",
+    ]
+
+    # Files below max_depth are still candidates
+    files = [path.relative_to(tmp_path).as_posix() for path, _ in scan.files]
+    assert files == ["README.md", "src/app.py", "src/pkg/deep/core.py"]
+
+    assert scan.dirs["src"].files == 1
+    assert scan.dirs["src"].dirs == 1
+    assert scan.dirs["src/pkg/deep"].bytes == len("x = 1\n")
+    assert "node_modules" not in scan.dirs
+
+
+def test_index_walk_matches_disk_walk(tmp_path):
+    """Walking the stored index gives the same result as walking the disk."""
+    make_project(tmp_path)
+    index = FileIndex(tmp_path)
+    index.refresh()
+
+    from_disk = walk(tmp_path, disk_listing(tmp_path, GitIgnoreMatcher(tmp_path)))
+    assert index.walk() == from_disk
@@ -0,0 +1,146 @@
+"""Tests for the filesystem watcher that keeps the context indexes fresh."""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from kp_codeagent import search_index
+from kp_codeagent.context_builder import ContextBuilder
+from kp_codeagent.file_index import FileIndex
+from kp_codeagent.watcher import (
+    IN_Q_OVERFLOW, ChangeSet, InotifyWatcher, Watcher, inotify_available
+)
+
+needs_inotify = pytest.mark.skipif(not inotify_available(), reason="inotify is Linux-only")
+
+
+def make_project(root: Path):
+    (root / "src").mkdir()
+    (root / "src" / "app.py").write_text("def main():\n    print('hi')\n")
+    (root / "docs").mkdir()
+    (root / "docs" / "guide.md").write_text("# Guide\n")
+
+
+def test_change_set_collapses_into_subtrees():
+    changes = ChangeSet(max_pending=3)
+    changes.add_file("src/.gitignore")
+    assert changes.dirs == {"src"}
+
+    for rel in ("src/a.py", "lib/b.py"):
+        changes.add_file(rel)
+    assert changes.subtrees == {"src", "lib"} and not changes.files and not changes.dirs
+
+    # Already covered by a subtree rescan
+    changes.add_file("src/deep/c.py")
+    assert len(changes) == 2
+
+
+def test_refresh_relists_only_the_given_dirs(tmp_path):
+    make_project(tmp_path)
+    index = FileIndex(tmp_path)
+    index.refresh()
+
+    # Relisted even if the mtime did not move within the clock tick
+    (tmp_path / "src" / "util.py").write_text("x = 1\n")
+    stats = index.refresh(["src"])
+    assert stats["scanned_dirs"] == 1 and stats["reused_dirs"] == 0
+    assert "util.py" in index.dirs["src"]["files"]
+
+    (tmp_path / "src" / "app.py").write_text("def main():\n    return 0\n")
+    assert index.update_files(["src/app.py", "src/missing.py"]) == 1
+    assert index.dirs["src"]["files"]["app.py"][0] == len("def main():\n    return 0\n")
+
+    (tmp_path / "docs" / "guide.md").unlink()
+    (tmp_path / "docs").rmdir()
+    assert index.refresh([""])["removed_dirs"] == 1
+    assert sorted(index.files_under(["src"])) == [
+        tmp_path / "src" / "app.py", tmp_path / "src" / "util.py"
+    ]
+
+
+@needs_inotify
+def test_builder_follows_changes(tmp_path, monkeypatch):
+    make_project(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    builder = ContextBuilder()
+    watcher = InotifyWatcher(tmp_path, debounce=0.05)
+    builder.watch(watcher)
+    try:
+        (tmp_path / "src" / "billing.py").write_text(
+            "def compute_invoice(order):\n    return order\n"
+        )
+        (tmp_path / "src" / "app.py").write_text("def main():\n    refund_payment()\n")
+        (tmp_path / "src" / "app.cpython-311.pyc").write_bytes(b"\x00")
+
+        changes = watcher.take(timeout=5)
+        assert "src" in changes.dirs and "src/app.py" in changes.files
+
+        stats = []
+        real_stat = search_index.safe_stat
+        monkeypatch.setattr(
+            search_index, "safe_stat", lambda path: stats.append(path) or real_stat(path)
+        )
+        builder.apply_changes(changes)
+
+        # Only the new and the edited file were stat'ed, not the whole tree
+        assert sorted(path.name for path in stats) == ["app.py", "billing.py"]
+        assert [path.name for path in builder.find_relevant_files("refund")][:1] == ["app.py"]
+        symbols = builder.find_symbols("fix compute_invoice")
+        assert [path.name for path, _ in symbols] == ["billing.py"]
+        assert "app.cpython-311.pyc" not in builder.build_file_tree()
+
+        # A new directory is watched once indexed
+        (tmp_path / "src" / "pkg").mkdir()
+        builder.apply_changes(watcher.take(timeout=5))
+        (tmp_path / "src" / "pkg" / "mod.py").write_text("x = 1\n")
+        changes = watcher.take(timeout=5)
+        assert "src/pkg" in changes.dirs
+        builder.apply_changes(changes)
+        assert "mod.py" in builder.build_file_tree()
+    finally:
+        watcher.stop()
+
+
+@pytest.mark.parametrize("backend", ["poll", pytest.param("inotify", marks=needs_inotify)])
+def test_unwatched_dirs_are_swept(tmp_path, backend):
+    make_project(tmp_path)
+    index = FileIndex(tmp_path)
+    index.refresh()
+    if backend == "poll":
+        watcher = Watcher(tmp_path, debounce=0.01, interval=0.05)
+    else:
+        # Over budget: only the root is watched
+        watcher = InotifyWatcher(tmp_path, debounce=0.01, interval=0.05, max_watches=1)
+    watcher.sync(index.dirs)
+    watcher.start()
+    try:
+        status = watcher.status()
+        assert (status["watched"], status["polled"]) == ((0, 3) if backend == "poll" else (1, 2))
+
+        (tmp_path / "src" / "app.py").write_text("def main():\n    return 'edited'\n")
+        changes = watcher.take(timeout=5)
+        assert changes.files == {"src/app.py"}
+    finally:
+        watcher.stop()
+
+
+@needs_inotify
+def test_overflow_checks_the_whole_tree(tmp_path, monkeypatch):
+    make_project(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    builder = ContextBuilder()
+    watcher = InotifyWatcher(tmp_path)
+    builder.watch(watcher)
+    try:
+        with watcher._ready:
+            watcher._event(-1, IN_Q_OVERFLOW, "")
+        changes = watcher.take(flush=True)
+        assert changes.overflow
+
+        stats = builder.apply_changes(changes)
+        assert stats["scanned_dirs"] + stats["reused_dirs"] == 3
+        assert builder._fresh == {"search", "symbols"}
+    finally:
+        watcher.stop()
+    assert os.listdir(tmp_path / ".kp-codeagent")